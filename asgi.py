@@ -0,0 +1,17 @@
+"""
+ASGI config for collect project.
+
+It exposes the ASGI callable as a module-level variable named ``application``; under ASGI, async views (waiting for new
+run data, async measurements API) don't hold a worker thread while they wait.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'collect.settings.default')
+
+application = get_asgi_application()
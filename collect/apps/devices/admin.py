@@ -31,6 +31,7 @@ class DeviceAdmin(admin.ModelAdmin):
         'name',
         'token',
         'columns',
+        'use_segments',
         'date_added',
     )
     readonly_fields = (
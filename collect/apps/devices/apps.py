@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class DevicesConfig(AppConfig):
+    name = 'devices'
+
+    def ready(self):
+        from . import signals
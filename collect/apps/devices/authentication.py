@@ -3,30 +3,54 @@
 API key can be specified in:
     API-KEY HTTP header or
     api-key data parameter
+
+Authenticated devices are cached, see `cache.py`; `get_device` is also used by API views that don't use DRF
 """
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 
 from . import const
+from .cache import api_key_cache
 from .models import Device
 
 
+def get_device(api_key):
+    """Get device with the given API key.
+
+    Parameters:
+        api_key: str
+
+    Returns: Device or None
+        None if the API key is incorrect
+    """
+    if len(api_key) != const.DEVICE_API_KEY_LEN:
+        return None
+
+    device = api_key_cache.get(api_key)
+    if device is not None:
+        return device
+
+    generation = api_key_cache.generation
+    token = api_key[:const.DEVICE_TOKEN_LEN]
+    for d in Device.objects.filter(token=token):
+        if d.is_matching_api_key(api_key):
+            api_key_cache.set(api_key, d, generation)
+            return d
+
+    return None
+
+
 class ApiKeyAuthentication(BaseAuthentication):
 
     def authenticate(self, request):
         api_key = request.META.get('HTTP_API_KEY')
         if api_key is None:
-            api_key = request.data.get('api-key')
+            api_key = request.data.get('api-key') if isinstance(request.data, dict) else None
             if api_key is None:
                 raise AuthenticationFailed('Missing API key')
 
-        if len(api_key) != const.DEVICE_API_KEY_LEN:
+        device = get_device(api_key)
+        if device is None:
             raise AuthenticationFailed('Incorrect API key')
 
-        token = api_key[:const.DEVICE_TOKEN_LEN]
-        for d in Device.objects.filter(token=token):
-            if d.is_matching_api_key(api_key):
-                return d, None
-
-        raise AuthenticationFailed('Incorrect API key')
-
+        return device, None
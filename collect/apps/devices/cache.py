@@ -0,0 +1,176 @@
+"""Cache of devices authenticated by their API keys.
+
+Devices are kept in a process-local LRU and, if DEVICE_AUTH_CACHE['CACHE_ALIAS'] is set, in the given django cache
+shared between processes. Entries expire after DEVICE_AUTH_CACHE['TTL'] seconds; they are also invalidated when
+the device is saved or deleted, but only in the local LRU of the process that saved/deleted the device (and in the
+shared cache), so TTL is an upper bound on how long other processes can use a stale device.
+"""
+import copy
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import const
+
+
+logger = logging.getLogger(__name__)
+
+
+class ApiKeyCache:
+
+    def __init__(self, max_size, ttl, cache_alias=None, stats_log_interval=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.cache_alias = cache_alias
+        self.stats_log_interval = stats_log_interval
+
+        self._entries = OrderedDict()  # api_key -> (expiry time, device)
+        self._lock = threading.Lock()
+        self._generation = 0
+
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    @property
+    def generation(self):
+        """Number of invalidations so far; see `set`."""
+        return self._generation
+
+    def get(self, api_key):
+        """Get device with the given API key.
+
+        Parameters:
+            api_key: str
+
+        Returns: Device or None
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(api_key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[api_key]
+                entry = None
+
+            if entry is not None:
+                self._entries.move_to_end(api_key)
+                self.hits += 1
+                device = entry[1]
+            else:
+                device = None
+
+        if device is None and self.cache_alias is not None:
+            device = self._get_shared(api_key)
+            if device is not None:
+                self.shared_hits += 1
+                self._set_local(api_key, device, now)
+
+        if device is None:
+            self.misses += 1
+
+        self._log_stats()
+
+        # Each request gets its own copy so that e.g. cached properties are not shared
+        return copy.copy(device) if device is not None else None
+
+    def set(self, api_key, device, generation):
+        """Cache device with the given API key.
+
+        Parameters:
+            api_key: str
+            device: Device
+            generation: int
+                Value of `generation` before the device was read from the database; if any device has been
+                invalidated since then, the device is not cached as it might be stale
+        """
+        with self._lock:
+            if generation != self._generation:
+                return
+
+        device = copy.copy(device)
+        self._set_local(api_key, device, time.monotonic())
+
+        if self.cache_alias is not None:
+            self._set_shared(api_key, device)
+
+    def invalidate(self, device, previous_token=None):
+        """Remove all entries of the given device.
+
+        Parameters:
+            device: Device
+            previous_token: str or None
+                Token of the device before its API key was changed; its entries are removed from the shared cache too
+        """
+        with self._lock:
+            self._generation += 1
+            for api_key in [k for k, (_, d) in self._entries.items() if d.pk == device.pk]:
+                del self._entries[api_key]
+
+        if self.cache_alias is not None:
+            tokens = {device.token, previous_token} - {None}
+            caches[self.cache_alias].delete_many([self._get_shared_key(token) for token in tokens])
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+        }
+
+    def _set_local(self, api_key, device, now):
+        with self._lock:
+            self._entries[api_key] = (now + self.ttl, device)
+            self._entries.move_to_end(api_key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def _get_shared_key(token):
+        return f'device-auth:{token}'
+
+    @staticmethod
+    def _get_digest(api_key):
+        # Plain API keys are not stored in the shared cache
+        return hashlib.blake2b(api_key.encode(), digest_size=16).hexdigest()
+
+    def _get_shared(self, api_key):
+        # All devices with the same token are stored under one key, so that they can be invalidated without knowing their API keys
+        devices = caches[self.cache_alias].get(self._get_shared_key(api_key[:const.DEVICE_TOKEN_LEN]))
+        if not devices:
+            return None
+        return devices.get(self._get_digest(api_key))
+
+    def _set_shared(self, api_key, device):
+        cache = caches[self.cache_alias]
+        key = self._get_shared_key(device.token)
+
+        devices = cache.get(key) or {}
+        devices[self._get_digest(api_key)] = device
+        cache.set(key, devices, self.ttl)
+
+    def _log_stats(self):
+        if not self.stats_log_interval:
+            return
+
+        if (self.hits + self.shared_hits + self.misses) % self.stats_log_interval == 0:
+            logger.info('Device authentication cache: %s', self.stats())
+
+
+api_key_cache = ApiKeyCache(
+    max_size=settings.DEVICE_AUTH_CACHE['MAX_SIZE'],
+    ttl=settings.DEVICE_AUTH_CACHE['TTL'],
+    cache_alias=settings.DEVICE_AUTH_CACHE['CACHE_ALIAS'],
+    stats_log_interval=settings.DEVICE_AUTH_CACHE['STATS_LOG_INTERVAL'],
+)
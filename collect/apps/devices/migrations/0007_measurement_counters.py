@@ -0,0 +1,33 @@
+# Generated by Django 3.2.16 on 2026-10-18 17:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0006_alter_device_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='device',
+            name='first_measurement_date',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='device',
+            name='last_measurement_date',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='device',
+            name='num_measurements',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='device',
+            name='num_unassigned_measurements',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-18 17:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0007_measurement_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='device',
+            name='use_segments',
+            field=models.BooleanField(default=False),
+        ),
+    ]
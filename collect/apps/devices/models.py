@@ -20,6 +20,16 @@ class Device(models.Model):
     salt = models.CharField(max_length=const.DEVICE_SALT_LEN)
     api_key_hash = models.CharField(max_length=64)
     date_added = models.DateTimeField(auto_now_add=True)
+    # Pack measurements of closed time windows into segments, see measurements.segments
+    use_segments = models.BooleanField(default=False)
+
+    # Denormalised counters, see measurements.functions
+    num_measurements = models.IntegerField(default=0, editable=False)
+    num_unassigned_measurements = models.IntegerField(default=0, editable=False)
+    first_measurement_date = models.DateTimeField(null=True, editable=False)
+    last_measurement_date = models.DateTimeField(null=True, editable=False)
+
+    COUNTER_FIELDS = ('num_measurements', 'num_unassigned_measurements', 'first_measurement_date', 'last_measurement_date')
 
     class Meta:
         indexes = [
@@ -39,18 +49,10 @@ class Device(models.Model):
     def num_runs(self):
         return self.run_set.count()
 
-    @cached_property
-    def num_measurements(self):
-        return self.measurement_set.count()
-
     @cached_property
     def unassigned_measurements(self):
         return self.measurement_set.filter(run__isnull=True)
 
-    @cached_property
-    def num_unassigned_measurements(self):
-        return self.unassigned_measurements.count()
-
     @property
     def has_plot(self):
         return not self.has_map
@@ -63,9 +65,7 @@ class Device(models.Model):
         if not self.num_measurements:
             return ''
 
-        qs = self.measurement_set.order_by('date_added')
-        first, last = qs[0], qs.reverse()[0]
-        first_dt, last_dt = first.date_added, last.date_added + timedelta(minutes=1)
+        first_dt, last_dt = self.first_measurement_date, self.last_measurement_date + timedelta(minutes=1)
 
         return f'{first_dt.astimezone(settings.LOCAL_TIMEZONE):%Y-%m-%d %H:%M} &mdash; {last_dt.astimezone(settings.LOCAL_TIMEZONE):%Y-%m-%d %H:%M}'
 
@@ -86,6 +86,10 @@ class Device(models.Model):
 
             self.sequence_id = last_seq_id + 1
 
+        elif kwargs.get('update_fields') is None:
+            # Counters are changed only by queryset updates, so that saving an instance loaded before new measurements were added doesn't overwrite them
+            kwargs['update_fields'] = [f.name for f in self._meta.concrete_fields if not f.primary_key and f.name not in self.COUNTER_FIELDS]
+
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -0,0 +1,25 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache import api_key_cache
+from .models import Device
+
+
+def _is_updating_counters_only(update_fields):
+    return update_fields is not None and set(update_fields) <= set(Device.COUNTER_FIELDS)
+
+
+@receiver(pre_save, sender=Device)
+def remember_previous_token(sender, instance, update_fields=None, **kwargs):
+    # The token changes with the API key; entries cached under the previous one have to be invalidated as well
+    if instance.pk is not None and (update_fields is None or 'token' in update_fields):
+        instance._previous_token = Device.objects.filter(pk=instance.pk).values_list('token', flat=True).first()
+
+
+@receiver(post_save, sender=Device)
+@receiver(post_delete, sender=Device)
+def invalidate_api_key_cache(sender, instance, update_fields=None, **kwargs):
+    # Columns or API key might have changed
+    if _is_updating_counters_only(update_fields):
+        return
+    api_key_cache.invalidate(instance, instance.__dict__.pop('_previous_token', None))
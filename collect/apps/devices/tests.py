@@ -0,0 +1,134 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from .authentication import get_device
+from .cache import ApiKeyCache, api_key_cache
+from .functions import calculate_hash
+from .models import Device
+
+
+API_KEY = 'abcdefghijklmnopqrstuvwxyz0123'
+OTHER_API_KEY = 'ZYXWVUtsrqponmlkjihgfedcba3210'
+
+
+def create_device(user, api_key=API_KEY):
+    salt = 's' * 10
+    return Device.objects.create(
+        user=user,
+        name='device',
+        columns=['a', 'b'],
+        token=api_key[:6],
+        salt=salt,
+        api_key_hash=calculate_hash(api_key, salt),
+    )
+
+
+class ApiKeyCacheTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('user', password='password')
+        cls.device = create_device(cls.user)
+
+    def setUp(self):
+        self.cache = ApiKeyCache(max_size=2, ttl=60)
+
+    def test_get(self):
+        self.assertIsNone(self.cache.get(API_KEY))
+        self.cache.set(API_KEY, self.device, self.cache.generation)
+
+        device = self.cache.get(API_KEY)
+        self.assertEqual(device.pk, self.device.pk)
+        self.assertIsNot(device, self.device)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    @mock.patch('devices.cache.time.monotonic')
+    def test_ttl(self, monotonic):
+        monotonic.return_value = 1000.
+        self.cache.set(API_KEY, self.device, self.cache.generation)
+
+        monotonic.return_value = 1059.
+        self.assertIsNotNone(self.cache.get(API_KEY))
+
+        monotonic.return_value = 1060.
+        self.assertIsNone(self.cache.get(API_KEY))
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+    def test_max_size(self):
+        for idx in range(3):
+            self.cache.set(f'{idx}{API_KEY[1:]}', self.device, self.cache.generation)
+
+        self.assertIsNone(self.cache.get(f'0{API_KEY[1:]}'))
+        self.assertIsNotNone(self.cache.get(f'2{API_KEY[1:]}'))
+
+    def test_invalidate(self):
+        other_device = create_device(self.user, OTHER_API_KEY)
+        self.cache.set(API_KEY, self.device, self.cache.generation)
+        self.cache.set(OTHER_API_KEY, other_device, self.cache.generation)
+
+        self.cache.invalidate(self.device)
+
+        self.assertIsNone(self.cache.get(API_KEY))
+        self.assertIsNotNone(self.cache.get(OTHER_API_KEY))
+
+    def test_stale_generation(self):
+        # The device was read from the database before another one was invalidated
+        generation = self.cache.generation
+        self.cache.invalidate(self.device)
+        self.cache.set(API_KEY, self.device, generation)
+
+        self.assertIsNone(self.cache.get(API_KEY))
+
+    def test_shared_previous_token(self):
+        caches['default'].clear()
+        cache = ApiKeyCache(max_size=2, ttl=60, cache_alias='default')
+        cache.set(API_KEY, self.device, cache.generation)
+
+        previous_token = self.device.token
+        self.device.token = OTHER_API_KEY[:6]
+        cache.invalidate(self.device, previous_token)
+        cache.clear()
+
+        self.assertIsNone(cache.get(API_KEY))
+
+
+class ApiKeyCacheSignalsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('user', password='password')
+
+    def setUp(self):
+        api_key_cache.clear()
+        self.device = create_device(self.user)
+
+    def test_save_invalidates(self):
+        self.assertEqual(get_device(API_KEY).columns, ['a', 'b'])
+
+        self.device.columns = ['a', 'b', 'c']
+        self.device.save()
+
+        self.assertEqual(get_device(API_KEY).columns, ['a', 'b', 'c'])
+
+    def test_delete_invalidates(self):
+        self.assertIsNotNone(get_device(API_KEY))
+
+        self.device.delete()
+
+        self.assertIsNone(get_device(API_KEY))
+
+    def test_saving_counters_doesnt_invalidate(self):
+        self.assertIsNotNone(get_device(API_KEY))
+        generation = api_key_cache.generation
+
+        self.device.num_measurements = 1
+        with CaptureQueriesContext(connection) as queries:
+            self.device.save(update_fields=['num_measurements'])
+
+        self.assertFalse([q for q in queries.captured_queries if q['sql'].startswith('SELECT')])
+        self.assertEqual(api_key_cache.generation, generation)
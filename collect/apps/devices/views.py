@@ -1,20 +1,26 @@
+import itertools
 import random
 import string
 from abc import ABC, abstractmethod
+from datetime import datetime, time
 
 from django.conf import settings
 from django.contrib import messages
-from django.core.exceptions import PermissionDenied
-from django.core.paginator import Paginator
+from django.core.exceptions import PermissionDenied, SuspiciousOperation
 from django.db import transaction
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse_lazy
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.utils.safestring import mark_safe
 from django.views import View
 from django.views.generic import TemplateView, CreateView, DetailView
 
 import runs.views
+from lib.pagination import KeysetPaginator, get_pagination_parameters
+from measurements.segments import count_packed_measurements, iter_measurements_in_bbox
+from runs import polylines
 from runs.functions import time_to_next_display
 
 from . import const
@@ -36,17 +42,24 @@ def get_runs_context_data(device):
     }
 
 
-def get_unassigned_measurements_context_data(device, page):
-    measurements = (
-        device
-        .unassigned_measurements
-        .order_by('-date_added')
+def get_unassigned_measurements_context_data(device, page, **kwargs):
+    """Get unassigned measurements table data.
+
+    Parameters:
+        device: Device
+        page: int
+        kwargs:
+            Cursor parameters of `KeysetPaginator.get_page`
+    """
+    # Measurements packed into segments aren't listed
+    measurements_paginator = KeysetPaginator(
+        device.unassigned_measurements,
+        settings.MEASUREMENTS_PAGINATE_BY,
+        device.num_unassigned_measurements - count_packed_measurements(device, unassigned=True),
     )
+    measurements_page = measurements_paginator.get_page(page, **kwargs)
 
-    measurements_paginator = Paginator(measurements, settings.MEASUREMENTS_PAGINATE_BY)
-    measurements_page = measurements_paginator.get_page(page)
-
-    if not measurements_paginator.count:
+    if not measurements_page:
         return {
             'measurements_page': measurements_page,
             'measurements_l': [],
@@ -55,22 +68,10 @@ def get_unassigned_measurements_context_data(device, page):
             },
         }
 
-    # Index of the first/last record in the `measurements` queryset
-    idx1, idx2 = measurements_page.start_index() - 1, measurements_page.end_index() - 1
-    if page == 1:
-        s_idx, e_idx = idx1 + 1, idx2 + 1
-    else:
-        s_idx, e_idx = idx1, idx2 + 1
-
     time_to_next = [
-        time_to_next_display(next_.date_added, this.date_added)
-        for this, next_ in zip(
-            measurements[s_idx:e_idx],
-            measurements[s_idx-1:e_idx-1],
-        )
+        time_to_next_display(next_.date_added, this.date_added) if next_ is not None else '-'
+        for this, next_ in zip(measurements_page, measurements_page.next_objects)
     ]
-    if page == 1:
-        time_to_next.insert(0, '-')
 
     return {
         'measurements_page': measurements_page,
@@ -111,13 +112,18 @@ class DeviceDeleteDeviceView(View):
         with transaction.atomic():
             device = self.object = self.get_object()
 
-            # Delete measurements
-            num_measurements_deleted, _ = (
-                device
-                .measurement_set
-                .all()
-                .delete()
-            )
+            # Delete measurements; bounded by the measurement dates, so that only partitions of the measurements table
+            # containing them are scanned (see measurements.partitioning); any others are deleted with the device
+            num_measurements_deleted = 0
+            if device.num_measurements:
+                num_measurements_deleted, _ = (
+                    device
+                    .measurement_set
+                    .filter(date_added__gte=device.first_measurement_date, date_added__lte=device.last_measurement_date)
+                    .delete()
+                )
+            num_measurements_deleted += count_packed_measurements(device)
+            device.segment_set.all().delete()
 
             # Delete runs
             num_runs_deleted, _ = (
@@ -135,6 +141,51 @@ class DeviceDeleteDeviceView(View):
         return redirect(self.success_url)
 
 
+class DeviceMeasurementsInBboxView(View):
+    """Measurements of a device with a map whose positions are in the given bounding box and time window.
+
+    Parameters:
+        bbox: 'south,west,north,east' in degrees
+        date_from, date_to: ISO 8601 dates or dates with times (local time if without an offset); optional
+    """
+
+    def get_object(self):
+        return get_object_or_404(Device.objects, user=self.request.user, sequence_id=self.kwargs['d_sid'])
+
+    @staticmethod
+    def _parse_date(value):
+        if value is None:
+            return None
+        date = parse_datetime(value)
+        if date is None and (day := parse_date(value)) is not None:
+            date = datetime.combine(day, time())
+        if date is None:
+            raise ValueError(f'Invalid date: {value}')
+        return date if timezone.is_aware(date) else timezone.make_aware(date, settings.LOCAL_TIMEZONE)
+
+    def get(self, request, *args, **kwargs):
+        device = self.get_object()
+        if not device.has_map:
+            raise SuspiciousOperation('Device has no map')
+
+        try:
+            bbox = polylines.parse_bbox(request.GET['bbox'])
+            date_from = self._parse_date(request.GET.get('date_from'))
+            date_to = self._parse_date(request.GET.get('date_to'))
+        except (KeyError, ValueError):
+            raise SuspiciousOperation('Invalid bbox or dates')
+
+        # One more measurement than returned is fetched to tell whether the results are truncated
+        max_measurements = settings.MAP_MAX_BBOX_MEASUREMENTS
+        rows = list(itertools.islice(iter_measurements_in_bbox(device, bbox, date_from, date_to), max_measurements + 1))
+
+        return JsonResponse({
+            'columns': device.columns,
+            'measurements': [(date_added.isoformat(), data) for date_added, data in rows[:max_measurements]],
+            'truncated': len(rows) > max_measurements,
+        })
+
+
 class PaginationUnassignedMeasurementsView(TemplateView):
     template_name = 'devices/device_unassigned_measurements.html'
 
@@ -149,7 +200,7 @@ class PaginationUnassignedMeasurementsView(TemplateView):
         context = super().get_context_data(**kwargs)
         context['device'] = device
 
-        m_context = get_unassigned_measurements_context_data(device, page)
+        m_context = get_unassigned_measurements_context_data(device, page, **get_pagination_parameters(self.request))
         context.update(m_context)
 
         return context
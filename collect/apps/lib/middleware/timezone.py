@@ -1,18 +1,18 @@
 from django.conf import settings
 from django.utils import timezone
+from django.utils.deprecation import MiddlewareMixin
 
 
-class TimezoneMiddleware:
+class TimezoneMiddleware(MiddlewareMixin):
+    """Activate the local timezone, except for API requests.
+
+    Based on MiddlewareMixin, which supports both sync and async requests, so that async views don't have to run in
+    a thread under ASGI.
+    """
     _exclude_paths = [
         '/api/measurements/',
     ]
 
-    def __init__(self, get_response):
-        self.get_response = get_response
-
-    def __call__(self, request):
-        return self.get_response(request)
-
     @classmethod
     def process_view(cls, request, view_func, *args, **kwargs):
         for ep in cls._exclude_paths:
@@ -0,0 +1,175 @@
+"""Keyset pagination of measurements.
+
+Pages are ordered by (date_added, id) descending. Instead of OFFSET, neighbouring pages are fetched relative to
+a cursor, i.e. (date_added, id) of the first/last row of the current page, so that deep pages don't scan the
+preceding rows. The total number of rows is given by the caller (see the denormalised counters of devices and runs),
+so page numbers and display indices are approximate while rows are being added.
+"""
+import math
+from datetime import datetime, timedelta, timezone
+
+from django.core.exceptions import SuspiciousOperation
+from django.db.models import Q
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def encode_cursor(date_added, pk):
+    """
+    Parameters:
+        date_added: aware datetime
+        pk: int
+
+    Returns: str
+    """
+    return f'{(date_added - EPOCH) // timedelta(microseconds=1)}_{pk}'
+
+
+def decode_cursor(cursor):
+    """
+    Parameters:
+        cursor: str
+            Created by `encode_cursor`
+
+    Returns: tuple
+        date_added: aware datetime
+        pk: int
+    """
+    try:
+        date_us, pk = map(int, cursor.split('_'))
+    except ValueError:
+        raise SuspiciousOperation(f'Invalid cursor: {cursor}')
+    return EPOCH + timedelta(microseconds=date_us), pk
+
+
+def get_pagination_parameters(request):
+    """Get cursor parameters of `KeysetPaginator.get_page` from the request query parameters.
+
+    Returns: dict
+    """
+    return {
+        'after': request.GET.get('after'),
+        'before': request.GET.get('before'),
+        'last': 'last' in request.GET,
+    }
+
+
+class KeysetPage:
+
+    def __init__(self, paginator, number, object_list, next_objects, has_previous, has_next):
+        self.paginator = paginator
+        self.number = number
+        self.object_list = object_list
+        # Row following (i.e. newer than) each row of `object_list`; None for the newest row
+        self.next_objects = next_objects
+        self._has_previous = has_previous
+        self._has_next = has_next
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_next(self):
+        return self._has_next
+
+    def previous_page_number(self):
+        return max(self.number - 1, 1)
+
+    def next_page_number(self):
+        return self.number + 1
+
+    @property
+    def previous_cursor(self):
+        return encode_cursor(self.object_list[0].date_added, self.object_list[0].pk) if self.object_list else None
+
+    @property
+    def next_cursor(self):
+        return encode_cursor(self.object_list[-1].date_added, self.object_list[-1].pk) if self.object_list else None
+
+
+class KeysetPaginator:
+
+    def __init__(self, queryset, per_page, count):
+        """
+        Parameters:
+            queryset: QuerySet
+                Unordered queryset of objects with `date_added`
+            per_page: int
+            count: int
+                Number of objects
+        """
+        self.queryset = queryset
+        self.per_page = per_page
+        self.count = count
+
+    @property
+    def num_pages(self):
+        return max(math.ceil(self.count / self.per_page), 1)
+
+    def get_page(self, page, after=None, before=None, last=False):
+        """Get page using a single query.
+
+        Parameters:
+            page: int
+                Page number; used for display only, unless no cursor is given
+            after: str or None
+                Cursor of the last row of the previous page
+            before: str or None
+                Cursor of the first row of the next page
+            last: bool
+                Get the last page
+
+        Returns: KeysetPage
+        """
+        desc = self.queryset.order_by('-date_added', '-id')
+        asc = self.queryset.order_by('date_added', 'id')
+
+        if after is not None:
+            # Cursor row is fetched as the row following the first row of the page
+            date_added, pk = decode_cursor(after)
+            rows = list(desc.filter(Q(date_added__lt=date_added) | Q(date_added=date_added, id__lte=pk))[:self.per_page+2])
+            if rows and rows[0].pk == pk:
+                next_, rows = rows[0], rows[1:]
+            else:
+                next_ = None
+            object_list = rows[:self.per_page]
+            has_previous, has_next = True, len(rows) > self.per_page
+
+        elif before is not None or last:
+            if last:
+                page = self.num_pages
+                num_rows = self.count - (page - 1) * self.per_page or self.per_page
+                rows = list(asc[:num_rows+1])
+            else:
+                date_added, pk = decode_cursor(before)
+                num_rows = self.per_page
+                rows = list(asc.filter(Q(date_added__gt=date_added) | Q(date_added=date_added, id__gt=pk))[:num_rows+1])
+                if len(rows) < num_rows:
+                    # Less than a page of newer rows left; show the first page instead
+                    return self.get_page(1)
+            rows.reverse()
+            next_ = rows[0] if len(rows) > num_rows else None
+            object_list = rows[-num_rows:] if rows else []
+            has_previous, has_next = next_ is not None, not last
+            if not has_previous:
+                page = 1
+
+        else:
+            # No cursor, e.g. the first page
+            start = (page - 1) * self.per_page
+            rows = list(desc[max(start-1, 0):start+self.per_page+1])
+            next_ = rows.pop(0) if start > 0 and rows else None
+            object_list = rows[:self.per_page]
+            has_previous, has_next = start > 0, len(rows) > self.per_page
+
+        next_objects = [next_] + object_list[:-1] if object_list else []
+        return KeysetPage(self, max(page, 1), object_list, next_objects, has_previous, has_next)
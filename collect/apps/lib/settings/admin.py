@@ -9,6 +9,7 @@ ordering = {
     'Devices': 1,
     'Runs': 2,
     'Measurements': 3,
+    'Rollups': 4,
 }
 
 
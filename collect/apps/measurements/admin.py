@@ -28,7 +28,7 @@ class MeasurementAdmin(admin.ModelAdmin):
     get_user.short_description = 'User'
 
     def formfield_for_dbfield(self, db_field, **kwargs):
-        if db_field.name == 'data':
+        if db_field.name == 'data_json':
             return db_field.formfield(widget=forms.TextInput(attrs={'size': 50}))
         return super().formfield_for_dbfield(db_field, **kwargs)
 
@@ -45,6 +45,6 @@ class MeasurementInline(admin.TabularInline):
     extra = 0
 
     def formfield_for_dbfield(self, db_field, **kwargs):
-        if db_field.name == 'data':
+        if db_field.name == 'data_json':
             return db_field.formfield(widget=forms.TextInput(attrs={'size': 50}))
         return super().formfield_for_dbfield(db_field, **kwargs)
@@ -0,0 +1,140 @@
+"""Parsers of measurement requests more compact than JSON, selected by the request's Content-Type.
+
+    application/msgpack: MessagePack object with the same structure as the JSON request; requires msgpack
+    application/cbor: CBOR object with the same structure as the JSON request; requires cbor2
+    application/octet-stream: values of the measurement(s) as little-endian float64, or float32 if the content type is
+        'application/octet-stream; format=float32', one measurement after another; NaN for a missing value. The number
+        of values of a measurement is the number of the device's columns, so the API key has to be given in the API-KEY
+        header. Measurements in this format are valid by construction, so views save them without validation
+
+NaN values of MessagePack and CBOR requests are missing values, as in the binary format. Parsers whose dependencies are
+missing aren't used, see `get_parser_classes`.
+"""
+import array
+import math
+import sys
+
+from django.http.multipartparser import parse_header
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.settings import api_settings
+
+from measurements.ingest import shorten_float32
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+
+class ParsedMeasurements(dict):
+    """Request data with values of measurements that don't need validation.
+
+    'data' is a list of values of a single measurement, or a list of them in batch views.
+    """
+
+
+def _replace_nan(value):
+    if isinstance(value, float):
+        if math.isnan(value):
+            return None
+        if math.isinf(value):
+            raise ParseError('Infinite value')
+        return value
+    if isinstance(value, list):
+        return [_replace_nan(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _replace_nan(v) for k, v in value.items()}
+    return value
+
+
+def _check_object(data):
+    if not isinstance(data, dict):
+        raise ParseError('Expected an object')
+    return _replace_nan(data)
+
+
+class MessagePackParser(BaseParser):
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            data = msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, TypeError) as e:
+            raise ParseError(f'MessagePack parse error - {e}')
+        return _check_object(data)
+
+
+class CborParser(BaseParser):
+    media_type = 'application/cbor'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            data = cbor2.loads(stream.read())
+        except (ValueError, TypeError) as e:
+            raise ParseError(f'CBOR parse error - {e}')
+        return _check_object(data)
+
+
+class BinaryMeasurementsParser(BaseParser):
+    media_type = 'application/octet-stream'
+
+    # 'format' parameter of the content type -> array type code
+    formats = {
+        'float64': 'd',
+        'float32': 'f',
+    }
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request, view = parser_context['request'], parser_context['view']
+
+        format_ = parse_header(media_type.encode())[1].get('format', b'float64').decode()
+        if format_ not in self.formats:
+            raise ParseError(f'Unknown format: {format_}')
+
+        # The device is needed to parse the request, so it can't be authenticated by the api-key parameter
+        if 'HTTP_API_KEY' not in request.META:
+            raise ParseError('API key has to be given in the API-KEY header')
+        num_columns = len(request.user.columns)
+
+        values = array.array(self.formats[format_])
+        body = stream.read() if stream is not None else b''
+        if len(body) % (values.itemsize * num_columns):
+            raise ParseError(f'Expected a multiple of {num_columns} {format_} values')
+        values.frombytes(body)
+        if sys.byteorder == 'big':
+            values.byteswap()
+
+        values = [
+            None if math.isnan(v) else v
+            for v in (map(shorten_float32, values) if format_ == 'float32' else values)
+        ]
+        if not all(v is None or math.isfinite(v) for v in values):
+            raise ParseError('Infinite value')
+
+        rows = [values[idx:idx+num_columns] for idx in range(0, len(values), num_columns)]
+        if getattr(view, 'many', False):
+            return ParsedMeasurements(data=rows)
+
+        if len(rows) != 1:
+            raise ParseError(f'Expected {num_columns} values')
+        return ParsedMeasurements(data=rows[0])
+
+
+def get_parser_classes():
+    """Get parsers of measurement requests: the default ones and those of this module whose dependencies are installed.
+
+    Returns: list of parser classes
+    """
+    parser_classes = list(api_settings.DEFAULT_PARSER_CLASSES)
+    if msgpack is not None:
+        parser_classes.append(MessagePackParser)
+    if cbor2 is not None:
+        parser_classes.append(CborParser)
+    parser_classes.append(BinaryMeasurementsParser)
+    return parser_classes
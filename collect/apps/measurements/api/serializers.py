@@ -1,44 +1,152 @@
-from django.db import transaction
-from django.db.models import Q
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import is_naive, make_aware, now
 from rest_framework import serializers
 
+from measurements.buffer import measurement_buffer
+from measurements.functions import save_measurements
 from measurements.models import Measurement
 
 
+def build_measurements(device, rows, dates=None):
+    """Create (unsaved) measurements of the given device.
+
+    Parameters:
+        device: Device
+        rows: list of list
+            Validated data of the measurements
+        dates: list of (aware datetime or None) or None
+            Times of the measurements given by the device; the current time if None
+
+    Returns: list of Measurement
+    """
+    measurements = [
+        Measurement(
+            device=device,
+            data=data,
+        )
+        for data in rows
+    ]
+
+    if dates is not None:
+        for m, date_added in zip(measurements, dates):
+            if date_added is not None:
+                m.date_added = date_added
+
+    return measurements
+
+
+def create_measurements(device, rows, dates=None):
+    """Create and save measurements of the given device.
+
+    Parameters:
+        See `build_measurements`
+
+    Returns: list of Measurement
+    """
+    measurements = build_measurements(device, rows, dates)
+
+    # Measurements are saved later if the write-behind buffer is enabled
+    if settings.MEASUREMENTS_BUFFER['ENABLED']:
+        measurement_buffer.add(device, measurements)
+        return measurements
+
+    return save_measurements(device, measurements)
+
+
+class TimestampField(serializers.Field):
+    """Time of a measurement given by the device: seconds since the unix epoch, or an ISO 8601 date (UTC unless it has
+    an offset). Times ahead of the server's clock by more than MEASUREMENTS_MAX_CLOCK_SKEW are rejected, so that they
+    don't end up after the measurements that follow them."""
+    default_error_messages = {
+        'invalid': 'Expected seconds since the unix epoch or an ISO 8601 date',
+        'future': 'Date is in the future',
+    }
+
+    def to_internal_value(self, value):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            try:
+                dt = datetime.fromtimestamp(value, timezone.utc)
+            except (OverflowError, OSError, ValueError):
+                self.fail('invalid')
+        elif isinstance(value, str):
+            try:
+                dt = parse_datetime(value)
+            except ValueError:
+                dt = None
+            if dt is None:
+                self.fail('invalid')
+            if is_naive(dt):
+                dt = make_aware(dt, timezone.utc)
+        else:
+            self.fail('invalid')
+
+        if dt > now() + timedelta(seconds=settings.MEASUREMENTS_MAX_CLOCK_SKEW):
+            self.fail('future')
+        return dt
+
+    def to_representation(self, value):
+        return value.isoformat()
+
+
+class MeasurementListSerializer(serializers.ListSerializer):
+
+    def create(self, validated_data):
+        rows = [item['data'] for item in validated_data]
+        dates = [item.get('date_added') for item in validated_data]
+        return create_measurements(self.context['device'], rows, dates)
+
+
 class MeasurementSerializer(serializers.ModelSerializer):
+    data = serializers.JSONField()
+    time = TimestampField(source='date_added', required=False)
 
     class Meta:
         model = Measurement
         fields = (
             'data',
+            'time',
         )
+        list_serializer_class = MeasurementListSerializer
 
     def validate_data(self, value):
         device = self.context['device']
+        if not isinstance(value, list):
+            raise serializers.ValidationError('Expected a list of values')
         if len(value) != len(device.columns):
             raise serializers.ValidationError('Expected {} columns; got {}'.format(len(device.columns), len(value)))
+        if settings.MEASUREMENTS_STORAGE == 'packed' and not all(v is None or (isinstance(v, (int, float)) and not isinstance(v, bool)) for v in value):
+            raise serializers.ValidationError('Expected numbers')
         return value
 
     def create(self, validated_data):
-        device = self.context['device']
+        return create_measurements(self.context['device'], [validated_data['data']], [validated_data.get('date_added')])[0]
+
+
+def get_batch_items(data):
+    """Get items of MeasurementSerializer(many=True) from data of a batch request.
+
+    Parameters:
+        data: dict or any other parsed request body
+            'data': list of measurement values
+            'time': list of times of the measurements (see `TimestampField`; null for the current time), optional
+
+    Returns: list of dict
+
+    Raises:
+        serializers.ValidationError: if the lists are invalid
+    """
+    if not isinstance(data, dict):
+        raise serializers.ValidationError({'non_field_errors': ['Expected an object with a list of measurements']})
 
-        # Save measurement
-        with transaction.atomic():
-            obj = Measurement.objects.create(
-                device=device,
-                run=None,
-                data=validated_data['data'],
-            )
-
-            # Set run that this measurement belongs to (might not exist)
-            run = device.run_set.filter(
-                Q(date_from__lte=obj.date_added) & (
-                    Q(date_to=None) | Q(date_to__gt=obj.date_added)
-                )
-            ).first()
-            if run:
-                obj.run = run
-                obj.save()
-
-        return obj
+    rows, times = data.get('data'), data.get('time')
+    if not isinstance(rows, list):
+        raise serializers.ValidationError({'data': ['Expected a list of measurements']})
+    if times is None:
+        return [{'data': row} for row in rows]
 
+    if not isinstance(times, list) or len(times) != len(rows):
+        raise serializers.ValidationError({'time': ['Expected a list of times of the measurements']})
+    return [{'data': row} if time is None else {'data': row, 'time': time} for row, time in zip(rows, times)]
@@ -5,5 +5,8 @@ from . import views
 
 urlpatterns = [
     path('', views.MeasurementView.as_view()),
+    path('batch/', views.MeasurementBatchView.as_view()),
+    path('async/', views.measurement_async_view),
+    path('async/batch/', views.measurement_batch_async_view),
 ]
 
@@ -1,10 +1,21 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponseNotAllowed, JsonResponse
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from devices.authentication import ApiKeyAuthentication
+from devices.authentication import ApiKeyAuthentication, get_device
+from measurements.batcher import measurement_batcher
+from measurements.buffer import measurement_buffer
+from measurements.functions import save_measurements
 
-from .serializers import MeasurementSerializer
+from .parsers import ParsedMeasurements, get_parser_classes
+from .serializers import MeasurementSerializer, build_measurements, create_measurements, get_batch_items
 
 
 class MeasurementView(APIView):
@@ -12,12 +23,23 @@ class MeasurementView(APIView):
     Sample request:
     curl -X POST https://(server)/api/measurements/ -H 'API-KEY: (api-key)' -H "Content-Type: application/json" -d '{"data": [3233.0]}'
     requests.post('https://(server)/api/measurements/', headers={'API-KEY': '(api-key)'}, json={'data': [223.]})
+    requests.post('https://(server)/api/measurements/', headers={'API-KEY': '(api-key)'}, json={'data': [223.], 'time': 1700000000.5})
+    requests.post('https://(server)/api/measurements/', headers={'API-KEY': '(api-key)', 'Content-Type': 'application/octet-stream'}, data=struct.pack('<d', 223.))
+
+    'time' is the time the measurement was taken, see `serializers.TimestampField`; the time of the request if not given
+
+    Besides JSON, requests can be sent in formats of `parsers.py`
     """
     authentication_classes = (
         ApiKeyAuthentication,
     )
+    parser_classes = get_parser_classes()
 
     def post(self, request):
+        if isinstance(request.data, ParsedMeasurements):
+            create_measurements(request.user, [request.data['data']])
+            return Response(data={'status': 'ok'}, status=status.HTTP_201_CREATED)
+
         context = {
             'device': request.user,
         }
@@ -37,3 +59,178 @@ class MeasurementView(APIView):
         }
         return Response(data=data, status=status.HTTP_201_CREATED)
 
+
+class MeasurementBatchView(APIView):
+    """
+    Sample request:
+    curl -X POST https://(server)/api/measurements/batch/ -H 'API-KEY: (api-key)' -H "Content-Type: application/json" -d '{"data": [[3233.0], [3234.0]]}'
+    requests.post('https://(server)/api/measurements/batch/', headers={'API-KEY': '(api-key)'}, json={'data': [[223.], [224.]]})
+    requests.post('https://(server)/api/measurements/batch/', headers={'API-KEY': '(api-key)'}, json={'data': [[223.], [224.]], 'time': [1700000000, 1700000060]})
+
+    The batch is saved only if all the measurements are valid; otherwise errors are returned for each invalid measurement
+    """
+    authentication_classes = (
+        ApiKeyAuthentication,
+    )
+    parser_classes = get_parser_classes()
+    # See parsers.ParsedMeasurements
+    many = True
+
+    def post(self, request):
+        if isinstance(request.data, ParsedMeasurements):
+            return self._post_parsed(request.user, request.data['data'])
+
+        context = {
+            'device': request.user,
+        }
+
+        try:
+            items = get_batch_items(request.data)
+        except ValidationError as e:
+            data = {
+                'status': 'error',
+                'errors': e.detail,
+            }
+            return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = MeasurementSerializer(data=items, many=True, context=context, max_length=settings.MEASUREMENTS_MAX_BATCH_SIZE)
+        if not serializer.is_valid():
+            errors = serializer.errors
+            if isinstance(errors, list):
+                # Only report invalid measurements, indexed by their position in the batch
+                errors = {idx: e for idx, e in enumerate(errors) if e}
+
+            data = {
+                'status': 'error',
+                'errors': errors,
+            }
+            return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+
+        objs = serializer.save()
+
+        data = {
+            'status': 'ok',
+            'num_created': len(objs),
+        }
+        return Response(data=data, status=status.HTTP_201_CREATED)
+
+    @staticmethod
+    def _post_parsed(device, rows):
+        if len(rows) > settings.MEASUREMENTS_MAX_BATCH_SIZE:
+            data = {
+                'status': 'error',
+                'errors': {
+                    'non_field_errors': [f'Ensure this field has no more than {settings.MEASUREMENTS_MAX_BATCH_SIZE} elements.'],
+                },
+            }
+            return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+
+        objs = create_measurements(device, rows)
+
+        data = {
+            'status': 'ok',
+            'num_created': len(objs),
+        }
+        return Response(data=data, status=status.HTTP_201_CREATED)
+
+
+async def _handle_async_request(request, batch):
+    """Authenticate, validate and save measurements of an async API view.
+
+    The request body is read by the ASGI handler before the view is called, so slow clients don't hold a thread; the
+    view itself needs a thread only to look up the device (unless it is cached) and waits for its measurements to be
+    saved in a batch with measurements of concurrent requests, see `measurements.batcher`. Under WSGI, measurements are
+    saved directly.
+
+    Returns: JsonResponse
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+
+    try:
+        body = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'detail': 'JSON parse error'}, status=status.HTTP_400_BAD_REQUEST)
+    if not isinstance(body, dict):
+        return JsonResponse({'detail': 'Expected a JSON object'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # As in ApiKeyAuthentication
+    api_key = request.headers.get('API-KEY', body.get('api-key'))
+    if api_key is None:
+        return JsonResponse({'detail': 'Missing API key'}, status=status.HTTP_403_FORBIDDEN)
+    device = await sync_to_async(get_device)(api_key) if isinstance(api_key, str) else None
+    if device is None:
+        return JsonResponse({'detail': 'Incorrect API key'}, status=status.HTTP_403_FORBIDDEN)
+
+    context = {
+        'device': device,
+    }
+
+    if batch:
+        try:
+            items = get_batch_items(body)
+        except ValidationError as e:
+            data = {
+                'status': 'error',
+                'errors': e.detail,
+            }
+            return JsonResponse(data, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = MeasurementSerializer(data=items, many=True, context=context, max_length=settings.MEASUREMENTS_MAX_BATCH_SIZE)
+    else:
+        serializer = MeasurementSerializer(data=body, context=context)
+
+    if not serializer.is_valid():
+        errors = serializer.errors
+        if isinstance(errors, list):
+            errors = {idx: e for idx, e in enumerate(errors) if e}
+
+        data = {
+            'status': 'error',
+            'errors': errors,
+        }
+        return JsonResponse(data, status=status.HTTP_400_BAD_REQUEST)
+
+    validated_data = serializer.validated_data if batch else [serializer.validated_data]
+    objs = build_measurements(device, [item['data'] for item in validated_data], [item.get('date_added') for item in validated_data])
+
+    if settings.MEASUREMENTS_BUFFER['ENABLED']:
+        # Appending to the buffer may write its journal
+        await sync_to_async(measurement_buffer.add, thread_sensitive=False)(device, objs)
+    elif isinstance(request, ASGIRequest):
+        await measurement_batcher.save(device, objs)
+    else:
+        # Under WSGI the view has its own event loop, so there are no concurrent requests to batch it with
+        await sync_to_async(save_measurements)(device, objs)
+
+    data = {
+        'status': 'ok',
+    }
+    if batch:
+        data['num_created'] = len(objs)
+    return JsonResponse(data, status=status.HTTP_201_CREATED)
+
+
+async def measurement_async_view(request):
+    """Async version of `MeasurementView`, for many concurrent requests when running under ASGI.
+
+    Sample request:
+    curl -X POST https://(server)/api/measurements/async/ -H 'API-KEY: (api-key)' -H "Content-Type: application/json" -d '{"data": [3233.0]}'
+
+    A function as class-based views can't be async in this django version.
+    """
+    return await _handle_async_request(request, batch=False)
+
+
+async def measurement_batch_async_view(request):
+    """Async version of `MeasurementBatchView`.
+
+    Sample request:
+    curl -X POST https://(server)/api/measurements/async/batch/ -H 'API-KEY: (api-key)' -H "Content-Type: application/json" -d '{"data": [[3233.0], [3234.0]]}'
+    """
+    return await _handle_async_request(request, batch=True)
+
+
+# csrf_exempt doesn't support async views in this django version
+measurement_async_view.csrf_exempt = True
+measurement_batch_async_view.csrf_exempt = True
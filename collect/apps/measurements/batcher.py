@@ -0,0 +1,152 @@
+"""Batching of measurements received by async API views.
+
+Async views (see `measurements.api.views.measurement_async_view`) running under ASGI don't save measurements
+themselves: they add them to the batcher of their event loop and wait, without holding a thread, until the batch is saved. The first measurements
+of a batch start a task which waits until MEASUREMENTS_ASYNC_BATCH['MAX_SIZE'] measurements are added or
+MEASUREMENTS_ASYNC_BATCH['MAX_DELAY'] milliseconds pass, and then saves the whole batch by `save_measurements` in
+a single transaction in a worker thread, with a savepoint per device. If saving measurements of a device fails, its
+requests are saved one by one, so that only the requests that caused the error fail. Unlike with the write-behind
+buffer (see `measurements.buffer`), views respond only after their measurements are saved.
+
+Under WSGI, each request of an async view runs in its own event loop, so there would be nothing to batch it with;
+these views save measurements directly instead.
+"""
+import asyncio
+import threading
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .functions import save_measurements
+
+
+class _Batch:
+    """Measurements waiting to be saved in an event loop."""
+
+    def __init__(self):
+        self.pending = []  # [(device, list of Measurement, future)]
+        self.size = 0
+        # Created by the first measurements of a batch, so that the batch doesn't reference its loop once it's empty
+        self.full = None
+        self.tasks = set()  # Running flushes, referenced so that they aren't garbage collected
+
+
+class AsyncMeasurementBatcher:
+
+    def __init__(self, max_size, max_delay):
+        self.max_size = max_size
+        self.max_delay = max_delay / 1000  # s
+
+        # Event loops don't share batches (there is a new loop e.g. for each async view of a WSGI server, possibly
+        # running concurrently in several threads)
+        self._batches = weakref.WeakKeyDictionary()  # loop -> _Batch
+        self._lock = threading.Lock()
+
+    async def save(self, device, measurements):
+        """Save new measurements of the given device together with measurements of concurrent requests of the same
+        event loop.
+
+        Parameters:
+            device: Device
+            measurements: list of Measurement
+                With `date_added` set
+
+        Returns: list of Measurement
+
+        Raises:
+            Exception raised while saving the batch
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            batch = self._batches.get(loop)
+            if batch is None:
+                batch = self._batches[loop] = _Batch()
+
+        future = loop.create_future()
+        batch.pending.append((device, measurements, future))
+        batch.size += len(measurements)
+
+        if len(batch.pending) == 1:
+            batch.full = asyncio.Event()
+            task = loop.create_task(self._flush_later(batch))
+            batch.tasks.add(task)
+            task.add_done_callback(batch.tasks.discard)
+        if batch.size >= self.max_size:
+            batch.full.set()
+
+        return await future
+
+    async def _flush_later(self, batch):
+        try:
+            await asyncio.wait_for(batch.full.wait(), self.max_delay)
+        except asyncio.TimeoutError:
+            pass
+
+        pending = batch.pending
+        batch.pending, batch.size, batch.full = [], 0, None
+
+        try:
+            # Not thread-sensitive, so that batches don't wait for each other or for requests of the event loop
+            errors = await sync_to_async(self._save, thread_sensitive=False)(pending)
+        except Exception as e:
+            errors = [e] * len(pending)
+
+        for (_, measurements, future), error in zip(pending, errors):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                # Measurements are saved in place
+                future.set_result(measurements)
+
+    @classmethod
+    def _save(cls, pending):
+        """
+        Returns: list of (Exception or None)
+            Error of each request of `pending`
+        """
+        by_device = {}
+        for idx, (device, _, _) in enumerate(pending):
+            by_device.setdefault(device.pk, []).append(idx)
+
+        errors = [None] * len(pending)
+        close_old_connections()
+        try:
+            with transaction.atomic():
+                for indices in by_device.values():
+                    device = pending[indices[0]][0]
+                    error = cls._save_in_savepoint(device, [m for idx in indices for m in pending[idx][1]])
+                    if error is None:
+                        continue
+                    if len(indices) == 1:
+                        errors[indices[0]] = error
+                        continue
+
+                    # Find the requests that caused the error
+                    for idx in indices:
+                        errors[idx] = cls._save_in_savepoint(device, pending[idx][1])
+        finally:
+            close_old_connections()
+
+        return errors
+
+    @staticmethod
+    def _save_in_savepoint(device, measurements):
+        try:
+            with transaction.atomic():
+                save_measurements(device, measurements)
+        except Exception as e:
+            # Measurements may have got ids of the rolled back rows
+            for m in measurements:
+                m.pk, m._state.adding = None, True
+            return e
+        return None
+
+
+measurement_batcher = AsyncMeasurementBatcher(
+    max_size=settings.MEASUREMENTS_ASYNC_BATCH['MAX_SIZE'],
+    max_delay=settings.MEASUREMENTS_ASYNC_BATCH['MAX_DELAY'],
+)
@@ -0,0 +1,317 @@
+"""Write-behind buffer of measurements received by the API.
+
+If MEASUREMENTS_BUFFER['ENABLED'] is set, validated measurements are appended to a process-local buffer instead of
+being saved one request at a time; a background thread saves them by `save_measurements` in a single transaction,
+with a savepoint per device, when MAX_SIZE measurements are buffered or the oldest one has waited MAX_DELAY
+milliseconds. If saving measurements of a device fails, they are logged and dropped, and measurements of other devices
+are saved. Measurements get their `date_added` when they are received, not when they are saved.
+
+Buffered measurements are lost if the process exits abnormally, unless JOURNAL_DIR is set: then each measurement is
+also appended to a journal file of the process (fsync'd before the API responds if FSYNC is set), which is removed
+once its measurements are saved. Journals of processes that exited without saving them are replayed by the background
+thread of the first buffer started afterwards; a process holds a lock on its journal, so journals of running processes
+are left alone. Journals that can't be replayed are renamed to `*.failed` and have to be handled manually. A crash
+between saving measurements and removing their journal makes them saved twice.
+"""
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+from devices.models import Device
+
+from .functions import save_measurements
+from .models import Measurement
+
+
+logger = logging.getLogger(__name__)
+
+
+class Journal:
+    """Append-only file of buffered measurements, one JSON object per line."""
+
+    def __init__(self, directory, fsync):
+        self.directory = directory
+        self.fsync = fsync
+        self._seq = 0
+        self._file = None
+
+    def open(self):
+        self._seq += 1
+        path = os.path.join(self.directory, f'journal-{os.getpid()}-{self._seq}.jsonl')
+        self._file = open(path, 'a', encoding='utf-8')
+        fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def append(self, measurements):
+        """
+        Parameters:
+            measurements: list of Measurement
+        """
+        self._file.write(''.join(
+            json.dumps({'device_id': m.device_id, 'date_added': m.date_added.isoformat(), 'data': m.data}) + '\n'
+            for m in measurements
+        ))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def rotate(self):
+        """Start a new journal file.
+
+        Returns: file object
+            The previous journal, still locked; see `remove`
+        """
+        previous = self._file
+        self.open()
+        return previous
+
+    @staticmethod
+    def remove(f):
+        os.remove(f.name)
+        f.close()
+
+    @staticmethod
+    def set_aside(f):
+        """Rename a journal that can't be replayed, so that it isn't replayed again."""
+        os.rename(f.name, f'{f.name}.failed')
+        f.close()
+
+    def iter_orphaned(self):
+        """Iterate over journals of processes that exited, locking each of them.
+
+        Returns: iterator of file objects
+            See `read`
+        """
+        own_prefix = os.path.join(self.directory, f'journal-{os.getpid()}-')
+        for path in sorted(glob.glob(os.path.join(self.directory, 'journal-*.jsonl'))):
+            # Journals of this process are removed by flushes
+            if path.startswith(own_prefix):
+                continue
+            try:
+                f = open(path, 'r+', encoding='utf-8')
+            except FileNotFoundError:
+                continue
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                f.close()
+                continue
+            yield f
+
+    @staticmethod
+    def read(f):
+        """Read measurements of a journal.
+
+        Parameters:
+            f: file object
+
+        Returns: list of Measurement
+
+        Raises:
+            KeyError, TypeError, ValueError: if the journal is invalid
+        """
+        measurements = []
+        for line in f:
+            try:
+                item = json.loads(line)
+            except ValueError:
+                # Last line of a journal of a process that crashed while writing it
+                continue
+            measurements.append(Measurement(
+                device_id=item['device_id'],
+                date_added=datetime.fromisoformat(item['date_added']),
+                data=item['data'],
+            ))
+        return measurements
+
+
+class MeasurementBuffer:
+
+    def __init__(self, max_size, max_delay, journal_dir=None, fsync=True, stats_log_interval=None):
+        self.max_size = max_size
+        self.max_delay = max_delay / 1000  # s
+        self.journal = Journal(journal_dir, fsync) if journal_dir is not None else None
+        self.stats_log_interval = stats_log_interval
+
+        self._measurements = []
+        self._devices = {}  # device id -> Device
+        self._first_time = None  # time.monotonic() of the oldest buffered measurement
+        self._condition = threading.Condition()
+        self._thread = None
+
+        # Flush latency: time between receiving the oldest measurement of a flush and committing it
+        self.num_flushes = 0
+        self.num_saved = 0
+        self.total_latency = 0.  # s
+        self.max_latency = 0.  # s
+        self.total_duration = 0.  # s
+
+    def add(self, device, measurements):
+        """Buffer new measurements of the given device.
+
+        Parameters:
+            device: Device
+            measurements: list of Measurement
+                With `date_added` set
+        """
+        self._start()
+
+        with self._condition:
+            if self.journal is not None:
+                self.journal.append(measurements)
+
+            if not self._measurements:
+                self._first_time = time.monotonic()
+            self._measurements.extend(measurements)
+            self._devices[device.pk] = device
+
+            if len(self._measurements) >= self.max_size:
+                self._condition.notify()
+
+    def flush(self):
+        """Save all buffered measurements.
+
+        Returns: int
+            Number of measurements saved
+        """
+        with self._condition:
+            measurements, devices, first_time = self._measurements, self._devices, self._first_time
+            self._measurements, self._devices, self._first_time = [], {}, None
+            journal_file = self.journal.rotate() if self.journal is not None and measurements else None
+
+        if not measurements:
+            return 0
+
+        start = time.monotonic()
+        num_saved = self._save(measurements, devices)
+        end = time.monotonic()
+
+        if journal_file is not None:
+            self.journal.remove(journal_file)
+
+        self._add_stats(num_saved, end - first_time, end - start)
+        return num_saved
+
+    def stats(self):
+        return {
+            'size': len(self._measurements),
+            'flushes': self.num_flushes,
+            'saved': self.num_saved,
+            'avg_latency_ms': round(self.total_latency / self.num_flushes * 1000, 1) if self.num_flushes else None,
+            'max_latency_ms': round(self.max_latency * 1000, 1),
+            'avg_flush_ms': round(self.total_duration / self.num_flushes * 1000, 1) if self.num_flushes else None,
+        }
+
+    @staticmethod
+    def _save(measurements, devices):
+        by_device = {}
+        for m in measurements:
+            by_device.setdefault(m.device_id, []).append(m)
+
+        # Devices of replayed measurements aren't known
+        missing = set(by_device) - set(devices)
+        if missing:
+            devices = {**devices, **Device.objects.in_bulk(missing)}
+
+        num_saved = 0
+        with transaction.atomic():
+            for device_id, device_measurements in by_device.items():
+                device = devices.get(device_id)
+                if device is None:
+                    logger.warning('Measurement buffer: device %s deleted; %d measurements dropped', device_id, len(device_measurements))
+                    continue
+
+                # A savepoint per device, so that invalid measurements of one device don't fail the whole flush
+                try:
+                    with transaction.atomic():
+                        save_measurements(device, device_measurements)
+                except Exception:
+                    logger.exception('Measurement buffer: saving measurements of device %s failed; %d measurements dropped', device_id, len(device_measurements))
+                else:
+                    num_saved += len(device_measurements)
+
+        return num_saved
+
+    def _add_stats(self, num_saved, latency, duration):
+        self.num_flushes += 1
+        self.num_saved += num_saved
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        self.total_duration += duration
+
+        if self.stats_log_interval and self.num_flushes % self.stats_log_interval == 0:
+            logger.info('Measurement buffer: %s', self.stats())
+
+    def _start(self):
+        if self._thread is not None:
+            return
+
+        with self._condition:
+            if self._thread is not None:
+                return
+
+            if self.journal is not None:
+                self.journal.open()
+
+            self._thread = threading.Thread(target=self._run, name='measurement-buffer', daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def _replay(self):
+        for f in self.journal.iter_orphaned():
+            try:
+                close_old_connections()
+                measurements = self.journal.read(f)
+                logger.info('Measurement buffer: replaying %d measurements from %s', len(measurements), f.name)
+                self._save(measurements, {})
+            except Exception:
+                logger.exception('Measurement buffer: replaying %s failed; renamed to *.failed', f.name)
+                self.journal.set_aside(f)
+                connection.close()
+            else:
+                self.journal.remove(f)
+
+    def _run(self):
+        # Journals are replayed here rather than in `add`, so that replaying them doesn't delay or fail requests
+        if self.journal is not None:
+            try:
+                self._replay()
+            except Exception:
+                logger.exception('Measurement buffer: replaying journals failed')
+
+        while True:
+            with self._condition:
+                while True:
+                    if self._first_time is not None:
+                        wait = self._first_time + self.max_delay - time.monotonic()
+                        if len(self._measurements) >= self.max_size or wait <= 0:
+                            break
+                    else:
+                        wait = None
+                    self._condition.wait(wait)
+
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception:
+                # Measurements of the failed flush are lost, unless they are kept in a journal, which is replayed after
+                # the process exits
+                logger.exception('Measurement buffer: flush failed')
+                connection.close()
+
+
+measurement_buffer = MeasurementBuffer(
+    max_size=settings.MEASUREMENTS_BUFFER['MAX_SIZE'],
+    max_delay=settings.MEASUREMENTS_BUFFER['MAX_DELAY'],
+    journal_dir=settings.MEASUREMENTS_BUFFER['JOURNAL_DIR'],
+    fsync=settings.MEASUREMENTS_BUFFER['FSYNC'],
+    stats_log_interval=settings.MEASUREMENTS_BUFFER['STATS_LOG_INTERVAL'],
+)
@@ -0,0 +1,268 @@
+import math
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, DateTimeField, F, Max, Min, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest, Least, Now
+
+from devices.models import Device
+from runs.models import Run
+
+from . import storage
+from .models import Measurement
+from .signals import measurements_created
+
+
+def assign_runs(device, measurements):
+    """Set runs of the given (not yet saved) measurements using a single query.
+
+    Parameters:
+        device: Device
+        measurements: list of Measurement
+            Measurements of `device` with `date_added` set
+
+    Returns: list of Measurement
+    """
+    if not measurements:
+        return measurements
+
+    dates = [m.date_added for m in measurements]
+    date_from, date_to = min(dates), max(dates)
+
+    runs = list(
+        device
+        .run_set
+        .filter(
+            Q(date_from__lte=date_to) & (
+                Q(date_to=None) | Q(date_to__gt=date_from)
+            )
+        )
+        .order_by('date_from')
+    )
+
+    for m in measurements:
+        m.run = next(
+            (r for r in runs if r.date_from <= m.date_added and (r.date_to is None or m.date_added < r.date_to)),
+            None,
+        )
+
+    return measurements
+
+
+def to_number(value):
+    """Convert a value of a measurement to float; values of measurements stored as json can be of any type.
+
+    Parameters:
+        value: any JSON value
+
+    Returns: float or None
+        None if the value is missing, not a number or not finite
+    """
+    try:
+        value = float(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+def get_position(device, data):
+    """Get the position of a measurement of a device with a map.
+
+    Parameters:
+        device: Device
+        data: list
+
+    Returns: tuple
+        lat, lon: float or None
+            Both None unless both values are finite numbers within the ranges of latitude and longitude
+    """
+    lat, lon = data[device.columns.index('lat')], data[device.columns.index('lon')]
+    is_number = lambda value: isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+    if not (is_number(lat) and is_number(lon) and -90 <= lat <= 90 and -180 <= lon <= 180):
+        return None, None
+    return float(lat), float(lon)
+
+
+def set_positions(device, measurements):
+    """Copy positions of the given (not yet saved) measurements of a device with a map into their `lat`/`lon` fields.
+
+    Parameters:
+        device: Device
+        measurements: list of Measurement
+
+    Returns: list of Measurement
+    """
+    if device.has_map:
+        for m in measurements:
+            m.lat, m.lon = get_position(device, m.data)
+
+    return measurements
+
+
+def save_measurements(device, measurements):
+    """Save new measurements of the given device.
+
+    Runs and positions of the measurements are set before saving, so that each measurement is written only once.
+    Measurements, counters and receivers of `measurements_created` (e.g. rollups) are updated in a single transaction,
+    so that counters don't drift from the saved measurements if any of them fails.
+
+    Parameters:
+        device: Device
+        measurements: list of Measurement
+
+    Returns: list of Measurement
+    """
+    assign_runs(device, measurements)
+    set_positions(device, measurements)
+
+    with transaction.atomic():
+        if len(measurements) == 1:
+            measurements[0].save()
+        else:
+            measurements = Measurement.objects.bulk_create(measurements)
+
+        add_to_counters(device, measurements)
+
+        measurements_created.send(sender=Measurement, device=device, measurements=measurements)
+
+    return measurements
+
+
+def iter_data(queryset, fields=()):
+    """Iterate over measurements without creating model instances.
+
+    Parameters:
+        queryset: QuerySet of Measurement
+        fields: tuple of str
+            Additional fields to return before `date_added`
+
+    Returns: iterator of tuple
+        *fields
+        date_added: aware datetime
+        data: list of float
+    """
+    rows = (
+        queryset
+        .values_list(*fields, 'date_added', *storage.DATA_FIELDS)
+        .iterator(chunk_size=settings.MEASUREMENTS_CHUNK_SIZE)
+    )
+    num_fields = len(fields) + 1
+    return (
+        (*row[:num_fields], storage.decode(*row[num_fields:]))
+        for row in rows
+    )
+
+
+def add_to_counters(device, measurements):
+    """Update denormalised counters and measurement dates of the device and runs of the given new measurements.
+
+    Measurements with device-supplied timestamps may be older than the last measurement of their run; such late
+    measurements also change the run's version (see `runs.cache`), which tells pages showing the run that rows were
+    added before the ones they have.
+
+    Parameters:
+        device: Device
+        measurements: list of Measurement
+    """
+    if not measurements:
+        return
+
+    # run_id -> [number of measurements, first date, last date]
+    runs = {}
+    for m in measurements:
+        run = runs.get(m.run_id)
+        if run is None:
+            runs[m.run_id] = [1, m.date_added, m.date_added]
+        else:
+            run[0] += 1
+            run[1] = min(run[1], m.date_added)
+            run[2] = max(run[2], m.date_added)
+
+    for run_id, (num, first_dt, last_dt) in runs.items():
+        if run_id is not None:
+            is_late = Q(last_measurement_date__gt=first_dt)
+            Run.objects.filter(pk=run_id).update(
+                **_get_counter_updates(num, first_dt, last_dt),
+                version=F('version') + Case(When(is_late, then=Value(1)), default=Value(0)),
+                date_modified=Case(When(is_late, then=Now()), default=F('date_modified')),
+            )
+
+    first_dt = min(first_dt for _, first_dt, _ in runs.values())
+    last_dt = max(last_dt for _, _, last_dt in runs.values())
+    Device.objects.filter(pk=device.pk).update(
+        num_unassigned_measurements=F('num_unassigned_measurements') + runs.get(None, [0])[0],
+        **_get_counter_updates(len(measurements), first_dt, last_dt),
+    )
+
+
+def _get_counter_updates(num, first_dt, last_dt):
+    first_dt, last_dt = Value(first_dt, output_field=DateTimeField()), Value(last_dt, output_field=DateTimeField())
+    return {
+        'num_measurements': F('num_measurements') + num,
+        'first_measurement_date': Least(Coalesce('first_measurement_date', first_dt), first_dt),
+        'last_measurement_date': Greatest(Coalesce('last_measurement_date', last_dt), last_dt),
+    }
+
+
+def change_counters(obj, **kwargs):
+    """Change denormalised counters of the given device or run by the given numbers.
+
+    Parameters:
+        obj: Device or Run
+        kwargs:
+            Counter name -> change
+    """
+    type(obj).objects.filter(pk=obj.pk).update(**{name: F(name) + change for name, change in kwargs.items()})
+
+
+def refresh_measurement_dates(obj):
+    """Set first/last measurement dates of the given device or run after some of its measurements were removed.
+
+    Parameters:
+        obj: Device or Run
+    """
+    qs = obj.measurement_set.order_by('date_added').values_list('date_added', flat=True)
+    dates = obj.segment_set.aggregate(first_date=Min('first_date'), last_date=Max('last_date'))
+    first_dates = [dt for dt in (qs.first(), dates['first_date']) if dt is not None]
+    last_dates = [dt for dt in (qs.last(), dates['last_date']) if dt is not None]
+    type(obj).objects.filter(pk=obj.pk).update(
+        first_measurement_date=min(first_dates, default=None),
+        last_measurement_date=max(last_dates, default=None),
+    )
+
+
+def reconcile_counters(obj):
+    """Recalculate denormalised counters and measurement dates of the given device or run.
+
+    Parameters:
+        obj: Device or Run
+
+    Returns: bool
+        Whether any value changed
+    """
+    counters = obj.measurement_set.aggregate(
+        num_measurements=Count('id'),
+        first_measurement_date=Min('date_added'),
+        last_measurement_date=Max('date_added'),
+    )
+    if isinstance(obj, Device):
+        counters['num_unassigned_measurements'] = obj.unassigned_measurements.count()
+
+    # Measurements packed into segments
+    packed = obj.segment_set.aggregate(num=Sum('count'), first_date=Min('first_date'), last_date=Max('last_date'))
+    if packed['num']:
+        counters['num_measurements'] += packed['num']
+        counters['first_measurement_date'] = min(filter(None, [counters['first_measurement_date'], packed['first_date']]))
+        counters['last_measurement_date'] = max(filter(None, [counters['last_measurement_date'], packed['last_date']]))
+        if isinstance(obj, Device):
+            counters['num_unassigned_measurements'] += obj.segment_set.filter(run__isnull=True).aggregate(num=Sum('count'))['num'] or 0
+
+    obj.refresh_from_db(fields=counters.keys())
+    if all(getattr(obj, name) == value for name, value in counters.items()):
+        return False
+
+    type(obj).objects.filter(pk=obj.pk).update(**counters)
+    for name, value in counters.items():
+        setattr(obj, name, value)
+
+    return True
@@ -0,0 +1,190 @@
+"""Compact protocol of the ingest server (`manage.py ingest_server`), for devices for which HTTP requests are too costly.
+
+A message is the device's API key followed by a byte giving the format of the measurements:
+    b' ': text; values separated by spaces or commas, measurements separated by ';', '-' or 'nan' for a missing value;
+        over TCP, the message ends with a newline, e.g.
+        b'(api-key) 21.5 1013.2;21.6 -\n'
+    b'f' or b'd': binary; number of values as little-endian uint16 followed by the values as little-endian float32 or
+        float64, NaN for a missing value, e.g.
+        b'(api-key)f' + struct.pack('<H2f', 2, 21.5, 1013.2)
+The number of values (of each ';'-separated part of text messages) has to be a multiple of the number of the device's
+columns; each consecutive group of them is a separate measurement. float32 values are converted to the shortest decimal
+that rounds to them, e.g. 1013.2 rather than 1013.2000122070312.
+
+Over UDP, each datagram is a single message and no response is sent. Over TCP, a connection can carry any number of
+messages, and the server responds to each of them, in order, with b'ok\n' or b'error (description)\n'.
+"""
+import asyncio
+import math
+import re
+import struct
+
+from devices import const
+
+
+HEADER_LEN = const.DEVICE_API_KEY_LEN + 1
+
+TEXT = ord(' ')
+
+# format byte -> struct format of a value
+BINARY_FORMATS = {
+    ord('f'): 'f',
+    ord('d'): 'd',
+}
+
+COUNT_FORMAT = '<H'
+COUNT_LEN = struct.calcsize(COUNT_FORMAT)
+
+_separator_re = re.compile(r'[\s,]+')
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def _to_value(value):
+    if math.isnan(value):
+        return None
+    if math.isinf(value):
+        raise ProtocolError('Infinite value')
+    return value
+
+
+def _parse_text(payload):
+    try:
+        text = payload.decode('ascii')
+    except UnicodeDecodeError:
+        raise ProtocolError('Non-ASCII text') from None
+
+    groups = []
+    for group in text.strip().split(';'):
+        values = []
+        for token in _separator_re.split(group.strip()):
+            if not token:
+                continue
+            if token == '-':
+                values.append(None)
+                continue
+            try:
+                values.append(_to_value(float(token)))
+            except ValueError:
+                raise ProtocolError(f'Invalid value: {token[:20]}') from None
+        # Skip empty parts, e.g. after a trailing ';'
+        if values:
+            groups.append(values)
+    return groups
+
+
+def shorten_float32(value):
+    """Get the shortest decimal that rounds to the given float32 value."""
+    for precision in range(6, 10):
+        shortened = float(f'{value:.{precision}g}')
+        if struct.unpack('<f', struct.pack('<f', shortened))[0] == value:
+            return shortened
+    return value
+
+
+def _parse_binary(format_, payload):
+    if len(payload) < COUNT_LEN:
+        raise ProtocolError('Missing number of values')
+
+    count, = struct.unpack_from(COUNT_FORMAT, payload)
+    values_format = f'<{count}{format_}'
+    if len(payload) != COUNT_LEN + struct.calcsize(values_format):
+        raise ProtocolError(f'Expected {count} values')
+
+    values = [_to_value(v) for v in struct.unpack_from(values_format, payload, COUNT_LEN)]
+    if format_ == 'f':
+        values = [shorten_float32(v) if v is not None else None for v in values]
+    return [values]
+
+
+def parse_message(message):
+    """Parse a message.
+
+    Parameters:
+        message: bytes
+
+    Returns: tuple
+        api_key: str
+        groups: list of list of float or None
+            Values of the message; in text messages, separate groups of values of each ';'-separated part
+
+    Raises:
+        ProtocolError: if the message is invalid
+    """
+    if len(message) < HEADER_LEN:
+        raise ProtocolError('Message too short')
+
+    try:
+        api_key = message[:const.DEVICE_API_KEY_LEN].decode('ascii')
+    except UnicodeDecodeError:
+        raise ProtocolError('Incorrect API key') from None
+
+    format_byte, payload = message[const.DEVICE_API_KEY_LEN], message[HEADER_LEN:]
+    if format_byte == TEXT:
+        groups = _parse_text(payload)
+    elif format_byte in BINARY_FORMATS:
+        groups = _parse_binary(BINARY_FORMATS[format_byte], payload)
+    else:
+        raise ProtocolError('Unknown format')
+
+    return api_key, groups
+
+
+async def read_message(reader):
+    """Read a message from a TCP connection.
+
+    Parameters:
+        reader: asyncio.StreamReader
+
+    Returns: bytes or None
+        None if the connection was closed before the message
+
+    Raises:
+        ProtocolError: if the message can't be delimited, in which case the rest of the stream can't be read
+        asyncio.IncompleteReadError: if the connection was closed in the middle of the message
+    """
+    header = await reader.read(1)
+    if not header:
+        return None
+    header += await reader.readexactly(HEADER_LEN - 1)
+
+    format_byte = header[-1]
+    if format_byte == TEXT:
+        try:
+            payload = await reader.readuntil(b'\n')
+        except asyncio.LimitOverrunError:
+            raise ProtocolError('Message too long') from None
+    elif format_byte in BINARY_FORMATS:
+        count_bytes = await reader.readexactly(COUNT_LEN)
+        count, = struct.unpack(COUNT_FORMAT, count_bytes)
+        payload = count_bytes + await reader.readexactly(count * struct.calcsize(BINARY_FORMATS[format_byte]))
+    else:
+        raise ProtocolError('Unknown format')
+
+    return header + payload
+
+
+def to_measurements(groups, num_columns):
+    """Split values of a message into measurements.
+
+    Parameters:
+        groups: list of list of float or None
+            See `parse_message`
+        num_columns: int
+
+    Returns: list of list of float or None
+
+    Raises:
+        ProtocolError: if the number of values of a group isn't a positive multiple of `num_columns`
+    """
+    if not groups:
+        raise ProtocolError('No values')
+
+    measurements = []
+    for values in groups:
+        if not values or len(values) % num_columns:
+            raise ProtocolError(f'Expected a multiple of {num_columns} values; got {len(values)}')
+        measurements.extend(values[idx:idx+num_columns] for idx in range(0, len(values), num_columns))
+    return measurements
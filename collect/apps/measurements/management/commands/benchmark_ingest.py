@@ -0,0 +1,99 @@
+import random
+import string
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from devices.models import Device
+from measurements.api.serializers import MeasurementSerializer
+from measurements.models import Measurement
+from runs.models import Run
+
+
+def legacy_create(device, validated_data):
+    """Measurement creation as done before runs were resolved prior to the insert."""
+    with transaction.atomic():
+        obj = Measurement.objects.create(
+            device=device,
+            run=None,
+            data=validated_data['data'],
+        )
+
+        run = device.run_set.filter(
+            Q(date_from__lte=obj.date_added) & (
+                Q(date_to=None) | Q(date_to__gt=obj.date_added)
+            )
+        ).first()
+        if run:
+            obj.run = run
+            obj.save()
+
+    return obj
+
+
+class Command(BaseCommand):
+    help = 'Benchmark ingesting single measurements: SQL statements and time per request. Nothing is saved in the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-n', '--num-requests', type=int, default=1000)
+        parser.add_argument('-c', '--num-columns', type=int, default=4)
+
+    def handle(self, *args, **options):
+        num_requests, num_columns = options['num_requests'], options['num_columns']
+
+        with transaction.atomic():
+            device = self._create_device(num_columns)
+
+            for name, create in (('before', legacy_create), ('after', None)):
+                num_statements = self._count_statements(device, create, num_columns)
+                elapsed = self._time(device, create, num_columns, num_requests)
+
+                self.stdout.write(f'{name:>6}: {num_statements} statements per request; {elapsed / num_requests * 1000:.3f} ms per request')
+
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def _create_device(num_columns):
+        username = 'benchmark-' + ''.join(random.choices(string.ascii_lowercase, k=10))
+        user = get_user_model().objects.create(username=username)
+        device = Device.objects.create(
+            user=user,
+            name='benchmark',
+            columns=[f'c{idx}' for idx in range(num_columns)],
+        )
+        Run.objects.create(
+            device=device,
+            name='benchmark',
+            date_from=timezone.now() - timedelta(days=1),
+        )
+        return device
+
+    @staticmethod
+    def _ingest(device, create, num_columns):
+        data = {
+            'data': [random.random() for _ in range(num_columns)],
+        }
+        serializer = MeasurementSerializer(data=data, context={'device': device})
+        serializer.is_valid(raise_exception=True)
+
+        if create is None:
+            serializer.save()
+        else:
+            create(device, serializer.validated_data)
+
+    def _count_statements(self, device, create, num_columns):
+        with CaptureQueriesContext(connection) as ctx:
+            self._ingest(device, create, num_columns)
+        return len(ctx.captured_queries)
+
+    def _time(self, device, create, num_columns, num_requests):
+        start = time.perf_counter()
+        for _ in range(num_requests):
+            self._ingest(device, create, num_columns)
+        return time.perf_counter() - start
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from devices.authentication import get_device
+from measurements import ingest
+from measurements.batcher import measurement_batcher
+from measurements.models import Measurement
+
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of messages of a TCP connection being saved at once
+MAX_PENDING_MESSAGES = 100
+
+
+def _get_device(api_key):
+    # The connection of the worker thread is reused between lookups, as there are no requests
+    close_old_connections()
+    return get_device(api_key)
+
+
+async def save_message(message):
+    """Save measurements of a message.
+
+    Parameters:
+        message: bytes
+
+    Returns: int
+        Number of measurements saved
+
+    Raises:
+        ingest.ProtocolError: if the message is invalid
+    """
+    api_key, groups = ingest.parse_message(message)
+
+    device = await sync_to_async(_get_device)(api_key)
+    if device is None:
+        raise ingest.ProtocolError('Incorrect API key')
+
+    rows = ingest.to_measurements(groups, len(device.columns))
+    if len(rows) > settings.MEASUREMENTS_MAX_BATCH_SIZE:
+        raise ingest.ProtocolError(f'Expected at most {settings.MEASUREMENTS_MAX_BATCH_SIZE} measurements')
+
+    objs = [
+        Measurement(
+            device=device,
+            data=row,
+        )
+        for row in rows
+    ]
+    await measurement_batcher.save(device, objs)
+    return len(objs)
+
+
+class UdpProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self):
+        self._tasks = set()
+
+    def datagram_received(self, data, addr):
+        task = asyncio.get_running_loop().create_task(self._save(data, addr))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    @staticmethod
+    async def _save(data, addr):
+        try:
+            await save_message(data)
+        except ingest.ProtocolError as e:
+            # Nothing is sent back, so that spoofed datagrams can't be used for amplification
+            logger.debug('Ingest server: invalid message from %s: %s', addr, e)
+        except Exception:
+            logger.exception('Ingest server: saving message from %s failed', addr)
+
+
+async def _send_responses(tasks, writer):
+    connected = True
+    while (task := await tasks.get()) is not None:
+        try:
+            await task
+        except ingest.ProtocolError as e:
+            response = f'error {e}\n'
+        except Exception:
+            logger.exception('Ingest server: saving message failed')
+            response = 'error Internal error\n'
+        else:
+            response = 'ok\n'
+
+        if not connected:
+            # Saving the remaining messages
+            continue
+        try:
+            writer.write(response.encode())
+            await writer.drain()
+        except ConnectionError:
+            connected = False
+
+
+async def handle_tcp_connection(reader, writer):
+    """Save messages of a TCP connection, responding to them in order.
+
+    Messages are read and saved while responses to the previous ones are pending, so that a device doesn't have to
+    wait for a batch to be saved before sending the next message.
+    """
+    tasks = asyncio.Queue(MAX_PENDING_MESSAGES)
+    sender = asyncio.create_task(_send_responses(tasks, writer))
+    try:
+        while True:
+            try:
+                message = await ingest.read_message(reader)
+            except ingest.ProtocolError as e:
+                # The rest of the stream can't be read
+                future = asyncio.get_running_loop().create_future()
+                future.set_exception(e)
+                await tasks.put(future)
+                break
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+
+            if message is None:
+                break
+            await tasks.put(asyncio.create_task(save_message(message)))
+    finally:
+        await tasks.put(None)
+        await sender
+        writer.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Run a server receiving measurements over UDP and TCP in a compact text or binary protocol (see '
+        'measurements.ingest); measurements are saved in batches, see MEASUREMENTS_ASYNC_BATCH'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default=settings.INGEST_SERVER['HOST'])
+        parser.add_argument('--udp-port', type=int, default=settings.INGEST_SERVER['UDP_PORT'], help='0 to disable UDP')
+        parser.add_argument('--tcp-port', type=int, default=settings.INGEST_SERVER['TCP_PORT'], help='0 to disable TCP')
+
+    def handle(self, *args, **options):
+        asyncio.run(self._serve(options['host'], options['udp_port'], options['tcp_port']))
+
+    async def _serve(self, host, udp_port, tcp_port):
+        loop = asyncio.get_running_loop()
+
+        if udp_port:
+            await loop.create_datagram_endpoint(UdpProtocol, local_addr=(host, udp_port))
+            self.stdout.write(f'Listening on {host}:{udp_port}/udp')
+
+        if tcp_port:
+            await asyncio.start_server(handle_tcp_connection, host, tcp_port)
+            self.stdout.write(f'Listening on {host}:{tcp_port}/tcp')
+
+        if not udp_port and not tcp_port:
+            return
+
+        self.stdout.flush()
+        await asyncio.Event().wait()
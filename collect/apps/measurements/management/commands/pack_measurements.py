@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from measurements import storage
+from measurements.models import Measurement
+
+
+class Command(BaseCommand):
+    help = (
+        'Convert values of saved measurements between JSON and packed storage (see MEASUREMENTS_STORAGE); '
+        'on PostgreSQL, run VACUUM FULL on the measurements table afterwards to reclaim the space'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--unpack', action='store_true', help='Convert packed values back to JSON')
+        parser.add_argument('--device-id', type=int, action='append', help='Device id; all devices if not given')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        unpack, batch_size = options['unpack'], options['batch_size']
+
+        qs = Measurement.objects.filter(**{'data_packed__isnull' if unpack else 'data_json__isnull': False})
+        if options['device_id']:
+            qs = qs.filter(device__in=options['device_id'])
+        qs = qs.order_by('pk')
+
+        num_converted, last_pk = 0, 0
+        while True:
+            rows = list(qs.filter(pk__gt=last_pk).values_list('pk', *storage.DATA_FIELDS)[:batch_size])
+            if not rows:
+                break
+
+            measurements = []
+            for pk, data_json, data_packed in rows:
+                values = storage.decode(data_json, data_packed)
+                if unpack:
+                    measurements.append(Measurement(pk=pk, data_json=values, data_packed=None))
+                else:
+                    measurements.append(Measurement(pk=pk, data_json=None, data_packed=storage.pack(values)))
+
+            with transaction.atomic():
+                Measurement.objects.bulk_update(measurements, storage.DATA_FIELDS)
+
+            num_converted += len(rows)
+            last_pk = rows[-1][0]
+            self.stdout.write(f'{num_converted} measurements converted')
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from devices.models import Device
+from measurements.segments import pack_closed_windows, unpack_segments
+
+
+class Command(BaseCommand):
+    help = (
+        'Pack measurements of closed time windows of devices with `use_segments` into segments, and restore '
+        'measurements of devices that no longer use them; should be run periodically, e.g. every MEASUREMENT_SEGMENT_WINDOW'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--device-id', type=int, action='append', help='Device id; all devices if not given')
+
+    def handle(self, *args, **options):
+        devices = Device.objects.order_by('pk')
+        if options['device_id']:
+            devices = devices.filter(pk__in=options['device_id'])
+
+        for device in devices.filter(use_segments=True):
+            num_packed = pack_closed_windows(device)
+            self.stdout.write(f'{device}: {num_packed} measurements packed')
+
+        for device in devices.filter(use_segments=False, segment_set__isnull=False).distinct():
+            num_restored = unpack_segments(device.segment_set.all())
+            self.stdout.write(f'{device}: {num_restored} measurements restored')
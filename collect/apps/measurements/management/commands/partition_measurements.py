@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from measurements import partitioning
+
+
+class Command(BaseCommand):
+    help = (
+        'Convert the measurements table to a partitioned one if needed, create partitions of the following months and '
+        'detach old partitions (see MEASUREMENTS_PARTITIONING); run reconcile_counters after detaching partitions'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--detach-after-months', type=int, help='Overrides MEASUREMENTS_PARTITIONING["DETACH_AFTER_MONTHS"]')
+
+    def handle(self, *args, **options):
+        config = settings.MEASUREMENTS_PARTITIONING
+        if not config['ENABLED']:
+            raise CommandError('Partitioning is disabled in MEASUREMENTS_PARTITIONING')
+        if connection.vendor != 'postgresql':
+            raise CommandError('Partitioning requires PostgreSQL')
+
+        detach_after_months = options['detach_after_months']
+        if detach_after_months is None:
+            detach_after_months = config['DETACH_AFTER_MONTHS']
+
+        now = timezone.now()
+        with transaction.atomic(), connection.cursor() as cursor:
+            if not partitioning.is_partitioned(cursor):
+                partitioning.partition_table(cursor, config['MONTHS_AHEAD'])
+                self.stdout.write('Measurements table converted to a partitioned one')
+
+            created = partitioning.create_partitions(cursor, now, partitioning.get_month_start(now, config['MONTHS_AHEAD']))
+            for name in created:
+                self.stdout.write(f'Partition {name} created')
+
+            if detach_after_months is not None:
+                detached = partitioning.detach_partitions(cursor, partitioning.get_month_start(now, -detach_after_months))
+                for name in detached:
+                    self.stdout.write(f'Partition {name} detached')
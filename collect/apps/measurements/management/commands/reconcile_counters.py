@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from devices.models import Device
+from measurements.functions import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Recalculate denormalised measurement counters and dates of devices and their runs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--device-id', type=int, action='append', help='Device id; all devices if not given')
+
+    def handle(self, *args, **options):
+        devices = Device.objects.order_by('pk')
+        if options['device_id']:
+            devices = devices.filter(pk__in=options['device_id'])
+
+        num_fixed = 0
+        for device in devices:
+            for obj in [device, *device.run_set.order_by('pk')]:
+                if reconcile_counters(obj):
+                    num_fixed += 1
+                    self.stdout.write(f'Fixed counters of {obj}')
+
+        self.stdout.write(f'{num_fixed} devices/runs fixed')
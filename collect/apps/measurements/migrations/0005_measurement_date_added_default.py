@@ -0,0 +1,19 @@
+# Generated by Django 3.2.16 on 2026-10-18 17:33
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('measurements', '0004_measurement_run'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='measurement',
+            name='date_added',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.16 on 2026-10-18 17:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('measurements', '0005_measurement_date_added_default'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='measurement',
+            index=models.Index(fields=['run', 'date_added', 'id'], name='measurement_run_id_1dfacb_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+from django.db.models import Count, Max, Min, Q
+
+
+def populate_counters(apps, schema_editor):
+    Device = apps.get_model('devices', 'Device')
+    Run = apps.get_model('runs', 'Run')
+    Measurement = apps.get_model('measurements', 'Measurement')
+
+    aggregates = {
+        'num_measurements': Count('id'),
+        'first_measurement_date': Min('date_added'),
+        'last_measurement_date': Max('date_added'),
+    }
+
+    for row in Measurement.objects.values('device_id').annotate(num_unassigned_measurements=Count('id', filter=Q(run=None)), **aggregates).order_by():
+        Device.objects.filter(pk=row.pop('device_id')).update(**row)
+
+    for row in Measurement.objects.filter(run__isnull=False).values('run_id').annotate(**aggregates).order_by():
+        Run.objects.filter(pk=row.pop('run_id')).update(**row)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0007_measurement_counters'),
+        ('runs', '0003_measurement_counters'),
+        ('measurements', '0006_measurement_run_date_added_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            populate_counters,
+            migrations.RunPython.noop,
+        ),
+    ]
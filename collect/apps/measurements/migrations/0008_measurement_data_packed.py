@@ -0,0 +1,36 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('measurements', '0007_populate_counters'),
+    ]
+
+    operations = [
+        # Field is renamed, the column isn't
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RenameField(
+                    model_name='measurement',
+                    old_name='data',
+                    new_name='data_json',
+                ),
+                migrations.AlterField(
+                    model_name='measurement',
+                    name='data_json',
+                    field=models.JSONField(db_column='data'),
+                ),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='measurement',
+            name='data_json',
+            field=models.JSONField(db_column='data', null=True),
+        ),
+        migrations.AddField(
+            model_name='measurement',
+            name='data_packed',
+            field=models.BinaryField(null=True),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.16 on 2026-10-18 17:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('runs', '0003_measurement_counters'),
+        ('devices', '0008_device_use_segments'),
+        ('measurements', '0008_measurement_data_packed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Segment',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_date', models.DateTimeField()),
+                ('last_date', models.DateTimeField()),
+                ('count', models.IntegerField()),
+                ('times', models.BinaryField()),
+                ('values', models.BinaryField()),
+                ('device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segment_set', to='devices.device')),
+                ('run', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='segment_set', to='runs.run')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='segment',
+            index=models.Index(fields=['device', 'first_date'], name='measurement_device__e2f1f2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='segment',
+            index=models.Index(fields=['run', 'first_date'], name='measurement_run_id_0011ea_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def _is_enabled(schema_editor):
+    return settings.MEASUREMENTS_PARTITIONING['ENABLED'] and schema_editor.connection.vendor == 'postgresql'
+
+
+def partition_measurements(apps, schema_editor):
+    # Only if enabled; otherwise the table can be converted later by `manage.py partition_measurements`
+    if not _is_enabled(schema_editor):
+        return
+
+    from measurements import partitioning
+
+    with schema_editor.connection.cursor() as cursor:
+        if not partitioning.is_partitioned(cursor):
+            partitioning.partition_table(cursor, settings.MEASUREMENTS_PARTITIONING['MONTHS_AHEAD'])
+
+
+def unpartition_measurements(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    from measurements import partitioning
+
+    with schema_editor.connection.cursor() as cursor:
+        if partitioning.is_partitioned(cursor):
+            partitioning.unpartition_table(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('measurements', '0009_segments'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_measurements, unpartition_measurements),
+    ]
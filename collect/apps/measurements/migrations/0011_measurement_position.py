@@ -0,0 +1,59 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+from measurements import storage
+
+
+def populate_positions(apps, schema_editor):
+    Device = apps.get_model('devices', 'Device')
+    Measurement = apps.get_model('measurements', 'Measurement')
+
+    for device in Device.objects.all():
+        if 'lat' not in device.columns or 'lon' not in device.columns:
+            continue
+        lat_idx, lon_idx = device.columns.index('lat'), device.columns.index('lon')
+
+        qs = Measurement.objects.filter(device=device).values_list('id', *storage.DATA_FIELDS)
+        measurements = []
+        for pk, *data_fields in qs.iterator(chunk_size=settings.MEASUREMENTS_CHUNK_SIZE):
+            data = storage.decode(*data_fields)
+            lat, lon = data[lat_idx], data[lon_idx]
+            if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in (lat, lon)) and -90 <= lat <= 90 and -180 <= lon <= 180:
+                measurements.append(Measurement(pk=pk, lat=lat, lon=lon))
+
+            if len(measurements) >= settings.MEASUREMENTS_CHUNK_SIZE:
+                Measurement.objects.bulk_update(measurements, ['lat', 'lon'])
+                measurements = []
+
+        Measurement.objects.bulk_update(measurements, ['lat', 'lon'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0008_device_use_segments'),
+        ('measurements', '0010_partition_measurements'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='measurement',
+            name='lat',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='measurement',
+            name='lon',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='measurement',
+            index=models.Index(condition=models.Q(('lat__isnull', False)), fields=['device', 'lat', 'lon'], name='measurement_position_idx'),
+        ),
+        migrations.RunPython(
+            populate_positions,
+            migrations.RunPython.noop,
+        ),
+    ]
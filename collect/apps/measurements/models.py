@@ -1,21 +1,49 @@
+from django.conf import settings
 from django.db import models
-from django.db.models import JSONField
+from django.db.models import JSONField, Q
+from django.utils import timezone
 
 from devices.models import Device
+from lib.pagination import encode_cursor
 from runs.models import Run
 
+from . import storage
+
 
 class Measurement(models.Model):
     device = models.ForeignKey(Device, on_delete=models.CASCADE, related_name='measurement_set')
     run = models.ForeignKey(Run, on_delete=models.CASCADE, related_name='measurement_set', null=True, blank=True)
-    date_added = models.DateTimeField(auto_now_add=True)
-    data = JSONField()
+    date_added = models.DateTimeField(default=timezone.now, editable=False)
+    # Values are stored in one of these fields, see `storage`; use `data` to get/set them
+    data_json = JSONField(db_column='data', null=True)
+    data_packed = models.BinaryField(null=True)
+    # Copies of the 'lat'/'lon' values of devices with a map, used to find measurements in an area; see
+    # `functions.set_positions`
+    lat = models.FloatField(null=True, blank=True, editable=False)
+    lon = models.FloatField(null=True, blank=True, editable=False)
 
     class Meta:
         indexes = [
             models.Index(fields=['device', 'date_added']),
+            models.Index(fields=['run', 'date_added', 'id']),
+            models.Index(fields=['device', 'lat', 'lon'], name='measurement_position_idx', condition=Q(lat__isnull=False)),
         ]
 
+    @property
+    def data(self):
+        return storage.decode(self.data_json, self.data_packed)
+
+    @data.setter
+    def data(self, values):
+        if settings.MEASUREMENTS_STORAGE == 'packed':
+            self.data_json, self.data_packed = None, storage.pack(values)
+        else:
+            self.data_json, self.data_packed = values, None
+
+    @property
+    def cursor(self):
+        return encode_cursor(self.date_added, self.pk)
+
     def __str__(self):
         return 'Measurement for device {}, run "{}": {} {}'.format(
             self.device,
@@ -24,3 +52,29 @@ class Measurement(models.Model):
             self.data,
         )
 
+
+class Segment(models.Model):
+    """Measurements of a closed time window of a device that uses segments, packed into a single row; see `segments`."""
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, related_name='segment_set')
+    run = models.ForeignKey(Run, on_delete=models.CASCADE, related_name='segment_set', null=True, blank=True)
+    first_date = models.DateTimeField()
+    last_date = models.DateTimeField()
+    count = models.IntegerField()
+    times = models.BinaryField()
+    values = models.BinaryField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['device', 'first_date']),
+            models.Index(fields=['run', 'first_date']),
+        ]
+
+    def __str__(self):
+        return 'Segment for device {}, run "{}": {} -- {} ({} measurements)'.format(
+            self.device,
+            self.run,
+            self.first_date,
+            self.last_date,
+            self.count,
+        )
+
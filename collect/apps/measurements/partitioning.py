@@ -0,0 +1,164 @@
+"""Range partitioning of the measurements table by month of `date_added` (PostgreSQL only).
+
+The table is converted by `partition_table`, which copies all rows into a new partitioned table with the same columns,
+indexes and foreign keys, so it takes a while and locks the table on large databases. Partitions are named
+`measurements_measurement_pYYYY_MM` (months in UTC); rows outside them go to `measurements_measurement_default`.
+Partitions of future months have to be created in advance, and old ones can be detached to be archived, by
+`manage.py partition_measurements`. The primary key of a partitioned table has to include the partition key, so it
+becomes (id, date_added); ids still come from the same sequence.
+
+Queries that filter by `date_added`, e.g. measurements of a run (see `Run.get_measurement_set`), only scan the
+partitions containing the given dates.
+"""
+import re
+from datetime import datetime, timezone
+
+
+TABLE = 'measurements_measurement'
+DEFAULT_PARTITION = f'{TABLE}_default'
+PARTITION_RE = re.compile(rf'^{TABLE}_p(\d{{4}})_(\d{{2}})$')
+
+
+def get_month_start(dt, num_months=0):
+    """Get the beginning of the month (UTC) of the given date, moved by the given number of months.
+
+    Parameters:
+        dt: aware datetime
+        num_months: int
+
+    Returns: aware datetime
+    """
+    dt = dt.astimezone(timezone.utc)
+    month_idx = dt.year * 12 + dt.month - 1 + num_months
+    return datetime(month_idx // 12, month_idx % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def get_partition_name(month_start):
+    return f'{TABLE}_p{month_start.year:04d}_{month_start.month:02d}'
+
+
+def is_partitioned(cursor):
+    cursor.execute('SELECT relkind FROM pg_class WHERE oid = %s::regclass', [TABLE])
+    return cursor.fetchone()[0] == 'p'
+
+
+def get_partitions(cursor):
+    """Get monthly partitions of the measurements table.
+
+    Returns: dict
+        Partition name -> beginning of its month
+    """
+    cursor.execute(
+        'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = %s::regclass',
+        [TABLE],
+    )
+    partitions = {}
+    for (name,) in cursor.fetchall():
+        if (m := PARTITION_RE.match(name)) is not None:
+            partitions[name] = datetime(int(m.group(1)), int(m.group(2)), 1, tzinfo=timezone.utc)
+    return partitions
+
+
+def create_partitions(cursor, date_from, date_to):
+    """Create missing partitions of the months from `date_from` to `date_to` (inclusive).
+
+    Rows of these months already saved in the default partition are moved to the new partitions.
+
+    Parameters:
+        date_from, date_to: aware datetime
+
+    Returns: list of str
+        Names of the created partitions
+    """
+    existing = get_partitions(cursor)
+    cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [DEFAULT_PARTITION])
+    has_default = cursor.fetchone()[0]
+
+    created = []
+    month_start, last_month_start = get_month_start(date_from), get_month_start(date_to)
+    while month_start <= last_month_start:
+        name, month_end = get_partition_name(month_start), get_month_start(month_start, 1)
+        if name not in existing:
+            cursor.execute(f'CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS)')
+            if has_default:
+                range_sql = 'date_added >= %s AND date_added < %s'
+                cursor.execute(f'INSERT INTO {name} SELECT * FROM {DEFAULT_PARTITION} WHERE {range_sql}', [month_start, month_end])
+                cursor.execute(f'DELETE FROM {DEFAULT_PARTITION} WHERE {range_sql}', [month_start, month_end])
+            cursor.execute(f'ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)', [month_start, month_end])
+            created.append(name)
+
+        month_start = month_end
+
+    return created
+
+
+def detach_partitions(cursor, date_to):
+    """Detach partitions of the months ending before `date_to`; they are kept as standalone tables.
+
+    Parameters:
+        date_to: aware datetime
+
+    Returns: list of str
+        Names of the detached partitions
+    """
+    detached = []
+    for name, month_start in sorted(get_partitions(cursor).items(), key=lambda item: item[1]):
+        if get_month_start(month_start, 1) <= date_to:
+            cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+            detached.append(name)
+    return detached
+
+
+def partition_table(cursor, months_ahead):
+    """Convert the measurements table to a partitioned one.
+
+    Parameters:
+        months_ahead: int
+            Number of partitions created for the months following the current one
+    """
+    def create_initial_partitions():
+        cursor.execute(f'SELECT MIN(date_added) FROM {TABLE}_old')
+        first_date = cursor.fetchone()[0]
+        now = datetime.now(timezone.utc)
+        cursor.execute(f'CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT')
+        create_partitions(cursor, min(first_date or now, now), get_month_start(now, months_ahead))
+
+    _rebuild_table(cursor, 'PARTITION BY RANGE (date_added)', '(id, date_added)', create_initial_partitions)
+
+
+def unpartition_table(cursor):
+    """Convert the partitioned measurements table back to a regular one; detached partitions are left as they are."""
+    _rebuild_table(cursor, '', '(id)', lambda: None)
+
+
+def _rebuild_table(cursor, partition_sql, primary_key_sql, create_partitions_func):
+    old_table = f'{TABLE}_old'
+    cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {old_table}')
+
+    # Definitions of indexes (except the primary key), foreign keys and the id sequence of the old table
+    cursor.execute(
+        """
+        SELECT indexname, indexdef FROM pg_indexes
+        WHERE tablename = %s AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p')
+        """,
+        [old_table, old_table],
+    )
+    indexes = cursor.fetchall()
+    cursor.execute("SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'", [old_table])
+    foreign_keys = cursor.fetchall()
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [old_table])
+    sequence = cursor.fetchone()[0]
+
+    # Copy rows
+    cursor.execute(f'CREATE TABLE {TABLE} (LIKE {old_table} INCLUDING DEFAULTS) {partition_sql}')
+    cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {TABLE}.id')
+    create_partitions_func()
+    cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {old_table}')
+    cursor.execute(f'DROP TABLE {old_table}')
+
+    # Recreate constraints and indexes, with the same names
+    cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY {primary_key_sql}')
+    for name, definition in foreign_keys:
+        cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}')
+    for name, definition in indexes:
+        cursor.execute(re.sub(rf' ON (ONLY )?(\S+\.)?{old_table} ', f' ON {TABLE} ', definition))
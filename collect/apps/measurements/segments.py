@@ -0,0 +1,362 @@
+"""Segments, i.e. measurements of closed time windows packed into single rows.
+
+For devices with `use_segments`, measurements older than the current time window (MEASUREMENT_SEGMENT_WINDOW) are
+periodically moved from `Measurement` rows into `Segment` rows, one per window and run, by `pack_closed_windows`.
+Timestamps are stored as delta-encoded int64 microseconds and values as float64 arrays, column by column (see
+`storage.pack`), both compressed with zlib. The most recent window is kept as raw rows, so ingest isn't affected.
+
+Readers that need all measurements of a device or run use `iter_measurements`, which merges raw rows and segments.
+Packed measurements have no ids, so they aren't listed in measurement tables and can't be deleted one by one.
+"""
+import array
+import heapq
+import itertools
+import sys
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min, Q, Sum
+from django.utils import timezone
+
+from devices.models import Device
+from lib.pagination import EPOCH
+from runs.cache import invalidate_runs
+
+from . import storage
+from .functions import get_position, iter_data, set_positions
+from .models import Measurement, Segment
+
+
+def _to_us(dt):
+    return (dt - EPOCH) // timedelta(microseconds=1)
+
+
+def get_window_start(dt):
+    """Get the beginning of the time window containing the given date.
+
+    Parameters:
+        dt: aware datetime
+
+    Returns: aware datetime
+    """
+    window_us = settings.MEASUREMENT_SEGMENT_WINDOW * 1_000_000
+    return EPOCH + timedelta(microseconds=_to_us(dt) // window_us * window_us)
+
+
+def encode(rows):
+    """
+    Parameters:
+        rows: list of (date_added, data) tuples
+            Ordered by `date_added`
+
+    Returns: tuple
+        times: bytes
+        values: bytes
+    """
+    times = [_to_us(date_added) for date_added, _ in rows]
+    deltas = array.array('q', times[:1] + [b - a for a, b in zip(times, times[1:])])
+    if sys.byteorder == 'big':
+        deltas.byteswap()
+
+    # Values of a column are similar, so they compress better when stored next to each other
+    values = b''.join(storage.pack(column) for column in zip(*(data for _, data in rows)))
+
+    return zlib.compress(deltas.tobytes()), zlib.compress(values)
+
+
+def decode(segment):
+    """
+    Parameters:
+        segment: Segment
+
+    Returns: list of (date_added, data) tuples
+    """
+    deltas = array.array('q')
+    deltas.frombytes(zlib.decompress(segment.times))
+    if sys.byteorder == 'big':
+        deltas.byteswap()
+    dates = [EPOCH + timedelta(microseconds=us) for us in itertools.accumulate(deltas)]
+
+    values = storage.unpack(zlib.decompress(segment.values))
+    count = len(dates)
+    columns = [values[idx:idx+count] for idx in range(0, len(values), count)]
+    data = [list(row) for row in zip(*columns)] if columns else [[] for _ in dates]
+
+    return list(zip(dates, data))
+
+
+def pack_closed_windows(device, date_to=None):
+    """Pack raw measurements of the given device into segments, one per time window and run.
+
+    Windows are processed one at a time; a window that was packed already (e.g. when a measurement arrives after its
+    window was closed) gets another segment.
+
+    Parameters:
+        device: Device
+        date_to: aware datetime or None
+            Pack only windows ending before this date; the beginning of the current window if None
+
+    Returns: int
+        Number of measurements packed
+    """
+    if date_to is None:
+        date_to = get_window_start(timezone.now())
+    date_to = get_window_start(date_to)
+    window = timedelta(seconds=settings.MEASUREMENT_SEGMENT_WINDOW)
+
+    qs = device.measurement_set.filter(date_added__lt=date_to).order_by('date_added', 'id')
+
+    num_packed = 0
+    while (first_date := qs.values_list('date_added', flat=True).first()) is not None:
+        window_start = get_window_start(first_date)
+
+        with transaction.atomic():
+            rows = list(iter_data(
+                qs.filter(date_added__lt=window_start + window).select_for_update(),
+                fields=('id', 'run_id'),
+            ))
+
+            runs = {}
+            for pk, run_id, date_added, data in rows:
+                runs.setdefault(run_id, []).append((date_added, data))
+
+            for run_id, run_rows in runs.items():
+                times, values = encode(run_rows)
+                Segment.objects.create(
+                    device=device,
+                    run_id=run_id,
+                    first_date=run_rows[0][0],
+                    last_date=run_rows[-1][0],
+                    count=len(run_rows),
+                    times=times,
+                    values=values,
+                )
+
+            Measurement.objects.filter(pk__in=[row[0] for row in rows]).delete()
+            invalidate_runs(runs)
+
+        num_packed += len(rows)
+
+    return num_packed
+
+
+def unpack_segments(segments):
+    """Restore measurements of the given segments as raw rows and delete the segments.
+
+    Parameters:
+        segments: QuerySet of Segment
+
+    Returns: int
+        Number of measurements restored
+    """
+    num_restored = 0
+    for pk in segments.order_by('first_date').values_list('pk', flat=True):
+        with transaction.atomic():
+            segment = Segment.objects.select_for_update(of=('self',)).select_related('device').get(pk=pk)
+            measurements = [
+                Measurement(device_id=segment.device_id, run_id=segment.run_id, date_added=date_added, data=data)
+                for date_added, data in decode(segment)
+            ]
+            set_positions(segment.device, measurements)
+            Measurement.objects.bulk_create(measurements, batch_size=settings.MEASUREMENTS_CHUNK_SIZE)
+            segment.delete()
+            invalidate_runs([segment.run_id])
+
+        num_restored += segment.count
+
+    return num_restored
+
+
+def _get_device(obj):
+    return obj if isinstance(obj, Device) else obj.device
+
+
+def _get_measurement_set(obj):
+    return obj.measurement_set.all() if isinstance(obj, Device) else obj.get_measurement_set()
+
+
+def iter_measurements(obj, date_from=None, date_to=None, cursor=None, reverse=False):
+    """Iterate over measurements of the given device or run, both raw and packed, without creating model instances.
+
+    Parameters:
+        obj: Device or Run
+        date_from, date_to: aware datetime or None
+            Beginning (inclusive) and end (exclusive) of the range; None for no limit
+        cursor: (date_added, id) tuple or None
+            Last measurement to return (see `lib.pagination`); packed measurements are returned up to its date
+        reverse: bool
+            Iterate from the newest measurement
+
+    Returns: iterator of tuple
+        date_added: aware datetime
+        data: list of float
+    """
+    qs = _get_measurement_set(obj).order_by(*(['-date_added', '-id'] if reverse else ['date_added', 'id']))
+    if date_from is not None:
+        qs = qs.filter(date_added__gte=date_from)
+    if date_to is not None:
+        qs = qs.filter(date_added__lt=date_to)
+    if cursor is not None:
+        qs = qs.filter(Q(date_added__lt=cursor[0]) | Q(date_added=cursor[0], id__lte=cursor[1]))
+    rows = iter_data(qs)
+
+    if not _get_device(obj).use_segments:
+        return rows
+
+    if cursor is not None:
+        cursor_date_to = cursor[0] + timedelta(microseconds=1)
+        date_to = cursor_date_to if date_to is None else min(date_to, cursor_date_to)
+
+    return heapq.merge(
+        rows,
+        _iter_segment_rows(obj, date_from, date_to, reverse),
+        key=lambda row: row[0],
+        reverse=reverse,
+    )
+
+
+def _get_measurement_set_in_bbox(obj, bbox):
+    south, west, north, east = bbox
+    lon_q = Q(lon__gte=west, lon__lte=east) if west <= east else Q(lon__gte=west) | Q(lon__lte=east)
+
+    qs = _get_measurement_set(obj).filter(lon_q, lat__gte=south, lat__lte=north)
+    if not isinstance(obj, Device):
+        # The position index starts with the device
+        qs = qs.filter(device_id=obj.device_id)
+    return qs
+
+
+def _is_in_bbox(device, data, bbox):
+    south, west, north, east = bbox
+    lat, lon = get_position(device, data)
+    if lat is None or not south <= lat <= north:
+        return False
+    return west <= lon <= east if west <= east else (lon >= west or lon <= east)
+
+
+def iter_measurements_in_bbox(obj, bbox, date_from=None, date_to=None):
+    """Iterate over measurements of the given device or run with a map whose positions are in the given bounding box.
+
+    Raw measurements are found using the index of their `lat`/`lon` fields; packed measurements are decoded and filtered
+    by their values.
+
+    Parameters:
+        obj: Device or Run
+        bbox: (south, west, north, east) tuple
+            Degrees; boxes crossing the antimeridian have west > east
+        date_from, date_to: aware datetime or None
+            See `iter_measurements`
+
+    Returns: iterator of tuple
+        See `iter_measurements`
+    """
+    qs = _get_measurement_set_in_bbox(obj, bbox).order_by('date_added', 'id')
+    if date_from is not None:
+        qs = qs.filter(date_added__gte=date_from)
+    if date_to is not None:
+        qs = qs.filter(date_added__lt=date_to)
+    rows = iter_data(qs)
+
+    device = _get_device(obj)
+    if not device.use_segments:
+        return rows
+
+    segment_rows = (row for row in _iter_segment_rows(obj, date_from, date_to, False) if _is_in_bbox(device, row[1], bbox))
+    return heapq.merge(rows, segment_rows, key=lambda row: row[0])
+
+
+def get_date_span_in_bbox(obj, bbox):
+    """Get dates of the first and the last measurement of the given device or run with a map whose position is in the
+    given bounding box.
+
+    Raw measurements are aggregated using the index of their `lat`/`lon` fields; only segments extending beyond the
+    dates found so far are decoded.
+
+    Parameters:
+        obj: Device or Run
+        bbox: (south, west, north, east) tuple
+            See `iter_measurements_in_bbox`
+
+    Returns: (aware datetime, aware datetime) tuple or None
+        None if there are no measurements in the bounding box
+    """
+    span = _get_measurement_set_in_bbox(obj, bbox).aggregate(first=Min('date_added'), last=Max('date_added'))
+    first, last = span['first'], span['last']
+
+    device = _get_device(obj)
+    if device.use_segments:
+        for segment in obj.segment_set.order_by('first_date').iterator(chunk_size=100):
+            if first is not None and first <= segment.first_date and segment.last_date <= last:
+                continue
+            for date_added, data in decode(segment):
+                if _is_in_bbox(device, data, bbox):
+                    first = date_added if first is None else min(first, date_added)
+                    last = date_added if last is None else max(last, date_added)
+
+    return (first, last) if first is not None else None
+
+
+def _iter_segment_rows(obj, date_from, date_to, reverse):
+    segments = obj.segment_set.order_by('-last_date' if reverse else 'first_date')
+    if date_from is not None:
+        segments = segments.filter(last_date__gte=date_from)
+    if date_to is not None:
+        segments = segments.filter(first_date__lt=date_to)
+
+    # Segments may overlap, so rows are buffered until no later segment can precede them. Heap keys are microseconds,
+    # negated when iterating from the newest measurement
+    sign = -1 if reverse else 1
+    heap, seq = [], itertools.count()
+    for segment in segments.iterator(chunk_size=100):
+        bound = sign * _to_us(segment.last_date if reverse else segment.first_date)
+        while heap and heap[0][0] < bound:
+            yield heapq.heappop(heap)[2:]
+
+        for date_added, data in decode(segment):
+            if (date_from is None or date_added >= date_from) and (date_to is None or date_added < date_to):
+                heapq.heappush(heap, (sign * _to_us(date_added), next(seq), date_added, data))
+
+    while heap:
+        yield heapq.heappop(heap)[2:]
+
+
+def count_measurements(obj, date_to):
+    """Count measurements of the given device or run, both raw and packed, older than the given date.
+
+    Parameters:
+        obj: Device or Run
+        date_to: aware datetime
+
+    Returns: int
+    """
+    num = _get_measurement_set(obj).filter(date_added__lt=date_to).count()
+    if not _get_device(obj).use_segments:
+        return num
+
+    segments = obj.segment_set.filter(first_date__lt=date_to)
+    num += segments.filter(last_date__lt=date_to).aggregate(num=Sum('count'))['num'] or 0
+    for segment in segments.filter(last_date__gte=date_to):
+        num += sum(1 for date_added, _ in decode(segment) if date_added < date_to)
+
+    return num
+
+
+def count_packed_measurements(obj, unassigned=False):
+    """Count measurements of the given device or run packed into segments.
+
+    Parameters:
+        obj: Device or Run
+        unassigned: bool
+            Count only measurements not assigned to any run
+
+    Returns: int
+    """
+    if not _get_device(obj).use_segments:
+        return 0
+
+    segments = obj.segment_set.all()
+    if unassigned:
+        segments = segments.filter(run__isnull=True)
+    return segments.aggregate(num=Sum('count'))['num'] or 0
@@ -0,0 +1,12 @@
+from django.dispatch import Signal
+
+
+# Sent after new measurements are saved (also by bulk_create, which doesn't send post_save signals), within the same
+# transaction, so that data derived from them (e.g. rollups) are saved together with them; side effects that must not
+# happen if the transaction is rolled back should use transaction.on_commit
+# Arguments: device, measurements (list of Measurement)
+measurements_created = Signal()
+
+# Sent after measurements of a device taken within [date_from, date_to] are deleted
+# Arguments: device, date_from, date_to
+measurements_deleted = Signal()
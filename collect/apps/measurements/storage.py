@@ -0,0 +1,51 @@
+"""Storage of measurement values.
+
+Values are stored either as JSON (`Measurement.data_json`) or packed as little-endian float64
+(`Measurement.data_packed`), depending on MEASUREMENTS_STORAGE at the time the measurement was saved, so readers have
+to handle both; see `decode`. Packed values are 8 bytes per column; missing values (None) are stored as NaN, so NaN
+values read back as None.
+"""
+import array
+import math
+import sys
+
+
+STORAGES = ('json', 'packed')
+
+DATA_FIELDS = ('data_json', 'data_packed')
+
+
+def pack(values):
+    """
+    Parameters:
+        values: list of float or None
+
+    Returns: bytes
+    """
+    a = array.array('d', (math.nan if v is None else v for v in values))
+    if sys.byteorder == 'big':
+        a.byteswap()
+    return a.tobytes()
+
+
+def unpack(b):
+    """
+    Parameters:
+        b: bytes or memoryview
+            Created by `pack`
+
+    Returns: list of float or None
+    """
+    a = array.array('d')
+    a.frombytes(b)
+    if sys.byteorder == 'big':
+        a.byteswap()
+    return [None if v != v else v for v in a]
+
+
+def decode(data_json, data_packed):
+    """Get values of a measurement from its DATA_FIELDS.
+
+    Returns: list of float or None
+    """
+    return data_json if data_packed is None else unpack(data_packed)
@@ -0,0 +1,188 @@
+import asyncio
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from devices.functions import calculate_hash
+from devices.models import Device
+
+from .batcher import AsyncMeasurementBatcher
+from .buffer import MeasurementBuffer
+from .functions import save_measurements
+from .models import Measurement
+
+
+API_KEY = 'abcdefghijklmnopqrstuvwxyz0123'
+OTHER_API_KEY = 'ZYXWVUtsrqponmlkjihgfedcba3210'
+
+
+def create_device(user, columns, api_key=API_KEY):
+    salt = 's' * 10
+    return Device.objects.create(
+        user=user,
+        name='device',
+        columns=columns,
+        token=api_key[:6],
+        salt=salt,
+        api_key_hash=calculate_hash(api_key, salt),
+    )
+
+
+class MeasurementBatchViewTest(TestCase):
+    url = '/api/measurements/batch/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('user', password='password')
+        cls.device = create_device(cls.user, ['a', 'b'])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_API_KEY=API_KEY)
+
+    def post(self, data):
+        return self.client.post(self.url, data, format='json')
+
+    def test_valid(self):
+        r = self.post({'data': [[1.5, 2], [3, None]]})
+
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(r.json(), {'status': 'ok', 'num_created': 2})
+        self.assertEqual(sorted(m.data for m in Measurement.objects.filter(device=self.device)), [[1.5, 2], [3, None]])
+        self.device.refresh_from_db()
+        self.assertEqual(self.device.num_measurements, 2)
+
+    def test_non_list_rows(self):
+        r = self.post({'data': [[1, 2], 5, {'a': 1}]})
+
+        self.assertEqual(r.status_code, 400)
+        self.assertEqual(set(r.json()['errors']), {'1', '2'})
+        self.assertFalse(Measurement.objects.exists())
+
+    def test_wrong_number_of_columns(self):
+        r = self.post({'data': [[1, 2], [1, 2, 3]]})
+
+        self.assertEqual(r.status_code, 400)
+        self.assertEqual(r.json()['errors'], {'1': {'data': ['Expected 2 columns; got 3']}})
+        self.assertFalse(Measurement.objects.exists())
+
+    def test_not_an_object(self):
+        r = self.post([[1, 2]])
+
+        self.assertEqual(r.status_code, 400)
+        self.assertFalse(Measurement.objects.exists())
+
+    @override_settings(MEASUREMENTS_MAX_BATCH_SIZE=3)
+    def test_too_many_measurements(self):
+        r = self.post({'data': [[1, 2]] * 4})
+
+        self.assertEqual(r.status_code, 400)
+        self.assertEqual(r.json()['errors'], {'non_field_errors': ['Ensure this field has no more than 3 elements.']})
+        self.assertFalse(Measurement.objects.exists())
+
+    def test_incorrect_api_key(self):
+        self.client.credentials(HTTP_API_KEY='x' * len(API_KEY))
+        r = self.post({'data': [[1, 2]]})
+
+        self.assertEqual(r.status_code, 403)
+        self.assertFalse(Measurement.objects.exists())
+
+
+class MeasurementBufferTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user('user', password='password')
+        cls.device = create_device(user, ['a', 'b'])
+        cls.failing_device = create_device(user, ['a', 'b'], OTHER_API_KEY)
+
+    def test_failing_device(self):
+        # Flushed explicitly
+        buffer = MeasurementBuffer(max_size=1000, max_delay=60_000)
+        buffer.add(self.device, [Measurement(device=self.device, date_added=timezone.now(), data=[1, 2])])
+        buffer.add(self.failing_device, [Measurement(device=self.failing_device, date_added=timezone.now(), data=[3, 4])])
+        buffer.add(self.device, [Measurement(device=self.device, date_added=timezone.now(), data=[5, 6])])
+
+        def save(device, measurements):
+            if device.pk == self.failing_device.pk:
+                raise ValueError('Invalid measurement')
+            return save_measurements(device, measurements)
+
+        with mock.patch('measurements.buffer.save_measurements', save), self.assertLogs('measurements.buffer', 'ERROR'):
+            self.assertEqual(buffer.flush(), 2)
+
+        self.assertEqual(sorted(m.data for m in Measurement.objects.filter(device=self.device)), [[1, 2], [5, 6]])
+        self.assertFalse(Measurement.objects.filter(device=self.failing_device).exists())
+        self.failing_device.refresh_from_db()
+        self.assertEqual(self.failing_device.num_measurements, 0)
+
+
+class AsyncMeasurementBatcherTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user('user', password='password')
+        cls.device = create_device(user, ['a', 'b'])
+        cls.other_device = create_device(user, ['a', 'b'], OTHER_API_KEY)
+
+    @mock.patch('measurements.batcher.close_old_connections', mock.Mock())
+    def test_failing_request(self):
+        def save(device, measurements):
+            if any(m.data == ['bad', 'bad'] for m in measurements):
+                raise ValueError('Invalid measurement')
+            return save_measurements(device, measurements)
+
+        pending = [
+            (device, [Measurement(device=device, date_added=timezone.now(), data=data)], None)
+            for device, data in [
+                (self.device, [1, 2]),
+                (self.device, ['bad', 'bad']),
+                (self.other_device, [3, 4]),
+                (self.device, [5, 6]),
+            ]
+        ]
+        with mock.patch('measurements.batcher.save_measurements', save):
+            errors = AsyncMeasurementBatcher._save(pending)
+
+        self.assertEqual([type(e) if e is not None else None for e in errors], [None, ValueError, None, None])
+        self.assertEqual(sorted(m.data for m in Measurement.objects.all()), [[1, 2], [3, 4], [5, 6]])
+        self.device.refresh_from_db()
+        self.assertEqual(self.device.num_measurements, 2)
+
+    def test_full_batch(self):
+        # A single request with MAX_SIZE measurements doesn't wait for MAX_DELAY
+        batcher = AsyncMeasurementBatcher(max_size=2, max_delay=60_000)
+        measurements = [Measurement(device=self.device, date_added=timezone.now(), data=[idx, idx]) for idx in range(2)]
+
+        with mock.patch.object(AsyncMeasurementBatcher, '_save', side_effect=lambda pending: [None] * len(pending)) as save:
+            saved = asyncio.run(asyncio.wait_for(batcher.save(self.device, measurements), 5))
+
+        self.assertIs(saved, measurements)
+        save.assert_called_once()
+
+
+class MeasurementAsyncViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user('user', password='password')
+        cls.device = create_device(user, ['a', 'b'])
+
+    @mock.patch('measurements.api.views.measurement_batcher')
+    def test_wsgi(self, batcher):
+        # The test client is a WSGI handler, under which measurements aren't batched
+        r = self.client.post('/api/measurements/async/batch/', {'data': [[1, 2], [3, 4]]}, content_type='application/json', HTTP_API_KEY=API_KEY)
+
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(r.json(), {'status': 'ok', 'num_created': 2})
+        self.assertEqual(Measurement.objects.filter(device=self.device).count(), 2)
+        batcher.save.assert_not_called()
+
+    def test_invalid(self):
+        r = self.client.post('/api/measurements/async/batch/', {'data': [[1, 2], 5]}, content_type='application/json', HTTP_API_KEY=API_KEY)
+
+        self.assertEqual(r.status_code, 400)
+        self.assertFalse(Measurement.objects.exists())
@@ -4,7 +4,11 @@ from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
 from django.views import View
 
+from runs.cache import invalidate_runs
+
+from .functions import change_counters, refresh_measurement_dates
 from .models import Measurement
+from .signals import measurements_deleted
 
 
 class MeasurementDeleteView(View):
@@ -22,4 +26,16 @@ class MeasurementDeleteView(View):
             measurement = self.get_object()
             measurement.delete()
 
+            device, run = measurement.device, measurement.run
+            if run is None:
+                change_counters(device, num_measurements=-1, num_unassigned_measurements=-1)
+            else:
+                change_counters(device, num_measurements=-1)
+                change_counters(run, num_measurements=-1)
+                refresh_measurement_dates(run)
+                invalidate_runs([run.pk])
+            refresh_measurement_dates(device)
+
+            measurements_deleted.send(sender=Measurement, device=measurement.device, date_from=measurement.date_added, date_to=measurement.date_added)
+
         return JsonResponse({'status': 'ok'})
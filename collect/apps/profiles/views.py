@@ -1,4 +1,4 @@
-from django.db.models import Count, Q
+from django.db.models import Count
 from django.urls import reverse_lazy
 from django.views.generic import TemplateView
 
@@ -12,9 +12,7 @@ def get_devices_context_data(user):
         user
         .device_set
         .annotate(
-            num_runs=Count('run_set', distinct=True),
-            num_measurements=Count('measurement_set', distinct=True),
-            num_unassigned_measurements=Count('measurement_set', filter=Q(measurement_set__run__isnull=True), distinct=True),
+            num_runs=Count('run_set'),
         )
         .order_by('sequence_id')
     )
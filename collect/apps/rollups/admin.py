@@ -0,0 +1,26 @@
+from django.contrib import admin
+
+from .models import Rollup
+
+
+@admin.register(Rollup)
+class RollupAdmin(admin.ModelAdmin):
+    list_display = (
+        'device',
+        'resolution',
+        'date_from',
+        'count',
+    )
+    list_display_links = list_display
+    list_filter = (
+        'device__user',
+        'device',
+        'resolution',
+    )
+    ordering = ('date_from',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class RollupsConfig(AppConfig):
+    name = 'rollups'
+
+    def ready(self):
+        from . import signals
@@ -0,0 +1,142 @@
+from datetime import datetime, timedelta, timezone
+
+from django.db import transaction
+from django.db.models import Q
+
+from devices.models import Device
+from measurements.segments import iter_measurements
+
+from .models import Rollup
+
+
+def get_bucket_start(dt, resolution):
+    """Get start of the bucket of the given resolution containing `dt`; buckets are aligned to the unix epoch.
+
+    Parameters:
+        dt: aware datetime
+        resolution: int
+            Bucket size in seconds
+
+    Returns: aware datetime
+    """
+    e = dt.timestamp()
+    return datetime.fromtimestamp(e - e % resolution, timezone.utc)
+
+
+def _lock_device(device):
+    # Serialises updates of rollups of the given device
+    list(Device.objects.select_for_update().filter(pk=device.pk).values_list('pk'))
+
+
+def _aggregate(device, rows):
+    rollups = {}
+    for date_added, data in rows:
+        for resolution in Rollup.RESOLUTIONS:
+            key = (resolution, get_bucket_start(date_added, resolution))
+            rollup = rollups.get(key)
+            if rollup is None:
+                rollup = rollups[key] = Rollup(device=device, resolution=resolution, date_from=key[1])
+            rollup.add(date_added, data)
+
+    return rollups
+
+
+def update_rollups(device, rows):
+    """Add new measurements to the rollups of the given device.
+
+    Parameters:
+        device: Device
+        rows: iterable of (date_added, data) tuples
+    """
+    rollups = _aggregate(device, rows)
+    if not rollups:
+        return
+
+    with transaction.atomic():
+        _lock_device(device)
+
+        # One range per resolution rather than one condition per bucket, so that the query stays small for large batches
+        q = Q()
+        for resolution in Rollup.RESOLUTIONS:
+            dates = [date_from for r, date_from in rollups if r == resolution]
+            q |= Q(resolution=resolution, date_from__gte=min(dates), date_from__lte=max(dates))
+        existing = {
+            (r.resolution, r.date_from): r
+            for r in device.rollup_set.filter(q)
+            if (r.resolution, r.date_from) in rollups
+        }
+
+        to_create, to_update = [], []
+        for key, rollup in rollups.items():
+            if key in existing:
+                existing[key].merge(rollup)
+                to_update.append(existing[key])
+            else:
+                to_create.append(rollup)
+
+        Rollup.objects.bulk_create(to_create)
+        Rollup.objects.bulk_update(to_update, Rollup.AGGREGATE_FIELDS)
+
+
+def rebuild_rollups(device, date_from=None, date_to=None):
+    """Recalculate rollups of the given device from its measurements taken within [date_from, date_to].
+
+    The range is extended to whole buckets of the largest resolution. Measurements are processed one such bucket at
+    a time, so that only rollups of a single bucket are kept in memory.
+
+    Parameters:
+        device: Device
+        date_from, date_to: aware datetime or None
+            Beginning/end of the range; None for no limit
+
+    Returns: int
+        Number of rollups created
+    """
+    max_resolution = max(Rollup.RESOLUTIONS)
+
+    rollups_qs = device.rollup_set.all()
+    if date_from is not None:
+        date_from = get_bucket_start(date_from, max_resolution)
+        rollups_qs = rollups_qs.filter(date_from__gte=date_from)
+    if date_to is not None:
+        date_to = get_bucket_start(date_to, max_resolution) + timedelta(seconds=max_resolution)
+        rollups_qs = rollups_qs.filter(date_from__lt=date_to)
+
+    num_created = 0
+    with transaction.atomic():
+        _lock_device(device)
+
+        rollups_qs.delete()
+
+        bucket, rows = None, []
+        for row in iter_measurements(device, date_from, date_to):
+            row_bucket = get_bucket_start(row[0], max_resolution)
+            if row_bucket != bucket:
+                num_created += len(Rollup.objects.bulk_create(_aggregate(device, rows).values()))
+                bucket, rows = row_bucket, []
+            rows.append(row)
+        num_created += len(Rollup.objects.bulk_create(_aggregate(device, rows).values()))
+
+    return num_created
+
+
+def get_rollups(device, resolution, date_from, date_to):
+    """Get rollups of buckets lying entirely within [date_from, date_to).
+
+    Parameters:
+        device: Device
+        resolution: int
+        date_from, date_to: aware datetime
+
+    Returns: QuerySet of Rollup
+    """
+    return (
+        device
+        .rollup_set
+        .filter(
+            resolution=resolution,
+            date_from__gte=date_from,
+            date_from__lte=date_to - timedelta(seconds=resolution),
+        )
+        .order_by('date_from')
+    )
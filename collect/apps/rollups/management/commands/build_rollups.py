@@ -0,0 +1,29 @@
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from devices.models import Device
+from rollups.functions import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recalculate rollups from measurements, e.g. to backfill them after enabling ROLLUPS_ENABLED'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--device-id', type=int, action='append', help='Device id; all devices if not given')
+        parser.add_argument('--date-from', type=self._parse_date, help='yyyy-mm-dd HH:MM (local time)')
+        parser.add_argument('--date-to', type=self._parse_date, help='yyyy-mm-dd HH:MM (local time)')
+
+    @staticmethod
+    def _parse_date(s):
+        return settings.LOCAL_TIMEZONE.localize(datetime.strptime(s, '%Y-%m-%d %H:%M'))
+
+    def handle(self, *args, **options):
+        devices = Device.objects.order_by('pk')
+        if options['device_id']:
+            devices = devices.filter(pk__in=options['device_id'])
+
+        for device in devices:
+            num_created = rebuild_rollups(device, options['date_from'], options['date_to'])
+            self.stdout.write(f'{device}: {num_created} rollups')
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.16 on 2026-10-18 17:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('devices', '0006_alter_device_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Rollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.IntegerField()),
+                ('date_from', models.DateTimeField()),
+                ('count', models.IntegerField(default=0)),
+                ('first_date', models.DateTimeField(null=True)),
+                ('last_date', models.DateTimeField(null=True)),
+                ('data_first', models.JSONField(null=True)),
+                ('data_last', models.JSONField(null=True)),
+                ('data_min', models.JSONField(null=True)),
+                ('data_max', models.JSONField(null=True)),
+                ('data_sum', models.JSONField(null=True)),
+                ('data_count', models.JSONField(null=True)),
+                ('device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollup_set', to='devices.device')),
+            ],
+            options={
+                'unique_together': {('device', 'resolution', 'date_from')},
+            },
+        ),
+    ]
@@ -0,0 +1,115 @@
+from django.db import models
+from django.db.models import JSONField
+
+from devices.models import Device
+from measurements.functions import to_number
+
+
+class Rollup(models.Model):
+    """Aggregate of the measurements of a device taken within [date_from, date_from + resolution).
+
+    Per-column values are stored as lists, like `Measurement.data`; missing (None) and non-numeric values are skipped.
+    """
+    RESOLUTIONS = (
+        60,
+        3600,
+        86400,
+    )  # s
+
+    AGGREGATE_FIELDS = (
+        'count',
+        'first_date',
+        'last_date',
+        'data_first',
+        'data_last',
+        'data_min',
+        'data_max',
+        'data_sum',
+        'data_count',
+    )
+
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, related_name='rollup_set')
+    resolution = models.IntegerField()
+    date_from = models.DateTimeField()
+    count = models.IntegerField(default=0)
+    first_date = models.DateTimeField(null=True)
+    last_date = models.DateTimeField(null=True)
+    data_first = JSONField(null=True)
+    data_last = JSONField(null=True)
+    data_min = JSONField(null=True)
+    data_max = JSONField(null=True)
+    data_sum = JSONField(null=True)
+    data_count = JSONField(null=True)
+
+    class Meta:
+        unique_together = (
+            ('device', 'resolution', 'date_from'),
+        )
+
+    @property
+    def data_mean(self):
+        return [s / c if c else None for s, c in zip(self.data_sum, self.data_count)]
+
+    def add(self, date_added, data):
+        """Add measurement to the aggregate.
+
+        Parameters:
+            date_added: aware datetime
+            data: list of float
+        """
+        if not self.count:
+            self.data_min, self.data_max = [None] * len(data), [None] * len(data)
+            self.data_sum, self.data_count = [0.] * len(data), [0] * len(data)
+
+        self.count += 1
+
+        if self.first_date is None or date_added < self.first_date:
+            self.first_date, self.data_first = date_added, data
+        if self.last_date is None or date_added >= self.last_date:
+            self.last_date, self.data_last = date_added, data
+
+        for idx, value in enumerate(data):
+            value = to_number(value)
+            if value is None:
+                continue
+
+            if self.data_min[idx] is None or value < self.data_min[idx]:
+                self.data_min[idx] = value
+            if self.data_max[idx] is None or value > self.data_max[idx]:
+                self.data_max[idx] = value
+            self.data_sum[idx] += value
+            self.data_count[idx] += 1
+
+    def merge(self, other):
+        """Add all measurements aggregated by `other` to this aggregate.
+
+        Parameters:
+            other: Rollup
+                Rollup of the same bucket
+        """
+        if not other.count:
+            return
+        if not self.count:
+            for field in self.AGGREGATE_FIELDS:
+                setattr(self, field, getattr(other, field))
+            return
+
+        self.count += other.count
+
+        if other.first_date < self.first_date:
+            self.first_date, self.data_first = other.first_date, other.data_first
+        if other.last_date >= self.last_date:
+            self.last_date, self.data_last = other.last_date, other.data_last
+
+        self.data_min = [min(v for v in values if v is not None) if any(v is not None for v in values) else None for values in zip(self.data_min, other.data_min)]
+        self.data_max = [max(v for v in values if v is not None) if any(v is not None for v in values) else None for values in zip(self.data_max, other.data_max)]
+        self.data_sum = [a + b for a, b in zip(self.data_sum, other.data_sum)]
+        self.data_count = [a + b for a, b in zip(self.data_count, other.data_count)]
+
+    def __str__(self):
+        return 'Rollup for device {}, {} s: {} ({} measurements)'.format(
+            self.device,
+            self.resolution,
+            self.date_from,
+            self.count,
+        )
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.dispatch import receiver
+
+from measurements.signals import measurements_created, measurements_deleted
+
+from .functions import rebuild_rollups, update_rollups
+
+
+@receiver(measurements_created)
+def update_rollups_on_create(sender, device, measurements, **kwargs):
+    if not settings.ROLLUPS_ENABLED:
+        return
+
+    # Within the transaction saving the measurements (see `measurements.functions.save_measurements`), so that rollups
+    # never miss saved measurements
+    update_rollups(device, [(m.date_added, m.data) for m in measurements])
+
+
+@receiver(measurements_deleted)
+def rebuild_rollups_on_delete(sender, device, date_from, date_to, **kwargs):
+    if not settings.ROLLUPS_ENABLED:
+        return
+
+    rebuild_rollups(device, date_from, date_to)
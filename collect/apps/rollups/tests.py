@@ -0,0 +1,55 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from devices.functions import calculate_hash
+from devices.models import Device
+from measurements.models import Measurement
+
+from .models import Rollup
+
+
+API_KEY = 'abcdefghijklmnopqrstuvwxyz0123'
+
+
+@override_settings(ROLLUPS_ENABLED=True, MEASUREMENTS_STORAGE='json')
+class RollupIngestTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user('user', password='password')
+        salt = 's' * 10
+        cls.device = Device.objects.create(
+            user=user,
+            name='device',
+            columns=['a', 'b', 'c'],
+            token=API_KEY[:6],
+            salt=salt,
+            api_key_hash=calculate_hash(API_KEY, salt),
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_API_KEY=API_KEY)
+
+    def test_mixed_types(self):
+        r = self.client.post('/api/measurements/batch/', {'data': [[1.0, 'x', None], [3, {'a': 1}, '2.5']]}, format='json')
+
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(Measurement.objects.filter(device=self.device).count(), 2)
+
+        rollup = Rollup.objects.get(device=self.device, resolution=Rollup.RESOLUTIONS[-1])
+        self.assertEqual(rollup.count, 2)
+        self.assertEqual(rollup.data_min, [1.0, None, 2.5])
+        self.assertEqual(rollup.data_max, [3.0, None, 2.5])
+        self.assertEqual(rollup.data_count, [2, 0, 1])
+        self.assertEqual(rollup.data_last, [3, {'a': 1}, '2.5'])
+
+    def test_merge(self):
+        for data in ([1, 'x', 2], [5, 6, 'y']):
+            r = self.client.post('/api/measurements/', {'data': data}, format='json')
+            self.assertEqual(r.status_code, 201)
+
+        rollup = Rollup.objects.get(device=self.device, resolution=Rollup.RESOLUTIONS[-1])
+        self.assertEqual(rollup.count, 2)
+        self.assertEqual(rollup.data_mean, [3.0, 6.0, 2.0])
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class RunsConfig(AppConfig):
+    name = 'runs'
+
+    def ready(self):
+        from . import signals
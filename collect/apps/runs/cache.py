@@ -0,0 +1,128 @@
+"""Cache of data of finalised runs and conditional responses of run pages.
+
+Runs that don't need updating (see `Run.needs_updating`) change only when their measurements are deleted, packed or
+unpacked, when the run is trimmed or finalised, or when its device is edited; all of these call `invalidate_runs`, which
+increments `Run.version` (as does adding measurements older than the run's last one, see
+`measurements.functions.add_to_counters`).
+The version, together with the run's counters (which change when measurements are added), identifies the run's data,
+so:
+- plot/map data of a run are cached in RUN_CACHE['CACHE_ALIAS'] under keys containing it, and stale entries expire
+  after RUN_CACHE['TTL'] seconds;
+- responses get ETag and Last-Modified headers, so that browsers revalidating the run page or data get 304 responses
+  after a single query of the run.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import caches
+from django.db.models import F
+from django.db.models.functions import Now
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .models import Run
+
+
+# Increment when the run page or the format of run data change, so that responses cached by browsers aren't reused
+FORMAT_VERSION = 1
+
+
+def invalidate_runs(run_ids):
+    """Mark data of the given runs as changed.
+
+    Parameters:
+        run_ids: iterable of int
+    """
+    run_ids = [pk for pk in run_ids if pk is not None]
+    if run_ids:
+        Run.objects.filter(pk__in=run_ids).update(version=F('version') + 1, date_modified=Now())
+
+
+def is_cacheable(run):
+    return not run.needs_updating
+
+
+def _get_run_key(run):
+    last_date = run.last_measurement_date.isoformat() if run.last_measurement_date else ''
+    return f'{FORMAT_VERSION}:{run.pk}:{run.version}:{run.num_measurements}:{last_date}'
+
+
+def get_etag(request, run, *parts):
+    """Get ETag of a response with data of the given run.
+
+    Parameters:
+        request: HttpRequest
+        run: Run
+        parts: str
+            Request parameters the response depends on
+
+    Returns: str
+    """
+    # Pages contain the user's CSRF token, which changes on login
+    csrf_token = request.META.get('CSRF_COOKIE', '')
+    key = ':'.join([_get_run_key(run), str(request.user.pk), csrf_token, *parts])
+    return quote_etag(hashlib.sha256(key.encode()).hexdigest()[:32])
+
+
+def get_last_modified(run):
+    dates = [run.date_modified, run.last_measurement_date]
+    return max(date for date in dates if date is not None)
+
+
+def conditional_response(request, run, get_response, *parts):
+    """Return 304 Not Modified if the client already has the current response; otherwise get it and add ETag and
+    Last-Modified headers. Responses of runs that need updating are returned as they are.
+
+    Parameters:
+        request: HttpRequest
+        run: Run
+        get_response: callable returning HttpResponse
+        parts: str
+            See `get_etag`
+
+    Returns: HttpResponse
+    """
+    # Pending messages would be lost with a 304 response
+    if not is_cacheable(run) or len(messages.get_messages(request)):
+        return get_response()
+
+    etag, last_modified = get_etag(request, run, *parts), get_last_modified(run)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified.timestamp())
+    if response is None:
+        response = get_response()
+        if response.status_code != 200:
+            return response
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+
+    # Browsers have to revalidate cached responses
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def get_cached(run, name, get_value, *parts):
+    """Get data of the given run from the cache, or calculate and cache them.
+
+    Parameters:
+        run: Run
+        name: str
+            Type of data
+        get_value: callable
+            Calculates the data
+        parts: str
+            Parameters the data depend on
+
+    Returns: object
+    """
+    cache_alias = settings.RUN_CACHE['CACHE_ALIAS']
+    if cache_alias is None or not is_cacheable(run):
+        return get_value()
+
+    cache = caches[cache_alias]
+    key = 'runs:' + hashlib.sha256(':'.join([name, _get_run_key(run), *parts]).encode()).hexdigest()
+    value = cache.get(key)
+    if value is None:
+        value = get_value()
+        cache.set(key, value, settings.RUN_CACHE['TTL'])
+    return value
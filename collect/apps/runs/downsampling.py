@@ -0,0 +1,225 @@
+"""Downsampling of plot data.
+
+Each function selects indices of the points to keep in a single series; series of all columns are downsampled
+separately and the union of their indices is kept, so that all columns still share the same time values.
+Missing values (None) are ignored.
+
+`downsample_arrays` is the equivalent of `downsample` for NumPy arrays, where missing values are NaN; it requires numpy.
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+METHODS = ('minmax', 'lttb')
+
+
+def min_max_indices(x, y, x_min, x_max, num_buckets):
+    """Split [x_min, x_max] into `num_buckets` equal buckets and select the minimum and maximum of each bucket.
+
+    Parameters:
+        x: list of float
+            Sorted
+        y: list of float or None
+        x_min, x_max: float
+        num_buckets: int
+
+    Returns: set of int
+    """
+    bucket_width = (x_max - x_min) / num_buckets if x_max > x_min else 1.
+    min_idx, max_idx = {}, {}
+
+    for idx, (xi, yi) in enumerate(zip(x, y)):
+        if yi is None:
+            continue
+
+        bucket = min(max(int((xi - x_min) / bucket_width), 0), num_buckets - 1)
+
+        if bucket not in min_idx or yi < y[min_idx[bucket]]:
+            min_idx[bucket] = idx
+        if bucket not in max_idx or yi > y[max_idx[bucket]]:
+            max_idx[bucket] = idx
+
+    return set(min_idx.values()) | set(max_idx.values())
+
+
+def lttb_indices(x, y, num_points):
+    """Select `num_points` points using Largest-Triangle-Three-Buckets algorithm.
+
+    See S. Steinarsson, Downsampling Time Series for Visual Representation, 2013.
+
+    Parameters:
+        x: list of float
+            Sorted
+        y: list of float or None
+        num_points: int
+
+    Returns: set of int
+    """
+    valid = [idx for idx, yi in enumerate(y) if yi is not None]
+    n = len(valid)
+    if num_points >= n or num_points < 3:
+        return set(valid)
+
+    xs, ys = [x[idx] for idx in valid], [y[idx] for idx in valid]
+
+    bucket_size = (n - 2) / (num_points - 2)
+    selected = [0]
+    a = 0
+    for i in range(num_points - 2):
+        # Average of the next bucket
+        avg_start, avg_end = int((i + 1) * bucket_size) + 1, min(int((i + 2) * bucket_size) + 1, n)
+        avg_x = sum(xs[avg_start:avg_end]) / (avg_end - avg_start)
+        avg_y = sum(ys[avg_start:avg_end]) / (avg_end - avg_start)
+
+        # Point of the current bucket making the largest triangle with the previously selected point and the average
+        ax, ay = xs[a], ys[a]
+        max_area, next_a = -1., None
+        for j in range(int(i * bucket_size) + 1, int((i + 1) * bucket_size) + 1):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > max_area:
+                max_area, next_a = area, j
+
+        selected.append(next_a)
+        a = next_a
+
+    selected.append(n - 1)
+
+    return {valid[idx] for idx in selected}
+
+
+def downsample(method, time, data, xlim, num_points):
+    """Select indices of points to keep.
+
+    Parameters:
+        method: str
+            One of METHODS
+        time: list of float
+            Sorted
+        data: list of list of float or None
+            One list per column
+        xlim: tuple of float
+            Plot x-axis limits
+        num_points: int
+            Target number of points per column
+
+    Returns: list of int
+        Sorted indices
+    """
+    if len(time) <= num_points:
+        return list(range(len(time)))
+
+    # First and last points are always kept so that the plotted lines span the whole data range
+    indices = {0, len(time) - 1}
+    for y in data:
+        if method == 'minmax':
+            indices |= min_max_indices(time, y, xlim[0], xlim[1], max(num_points // 2, 1))
+        elif method == 'lttb':
+            indices |= lttb_indices(time, y, num_points)
+        else:
+            raise ValueError(f'Unknown downsampling method: {method}')
+
+    return sorted(indices)
+
+
+def min_max_indices_array(x, y, x_min, x_max, num_buckets):
+    """Array version of `min_max_indices`.
+
+    Parameters:
+        x: ndarray of float
+            Sorted
+        y: ndarray of float
+
+    Returns: ndarray of int
+    """
+    valid = np.flatnonzero(~np.isnan(y))
+    if not len(valid):
+        return valid
+
+    xs, ys = x[valid], y[valid]
+
+    bucket_width = (x_max - x_min) / num_buckets if x_max > x_min else 1.
+    buckets = np.clip(((xs - x_min) / bucket_width).astype(np.int64), 0, num_buckets - 1)
+
+    # `x` is sorted, so buckets are contiguous
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    counts = np.diff(np.r_[starts, len(ys)])
+
+    indices = []
+    for reduce in (np.minimum, np.maximum):
+        # First of equal minima/maxima of each bucket, as in `min_max_indices`
+        extremes = np.repeat(reduce.reduceat(ys, starts), counts)
+        candidates = np.flatnonzero(ys == extremes)
+        _, first = np.unique(buckets[candidates], return_index=True)
+        indices.append(candidates[first])
+
+    return valid[np.concatenate(indices)]
+
+
+def lttb_indices_array(x, y, num_points):
+    """Array version of `lttb_indices`.
+
+    Parameters:
+        x: ndarray of float
+            Sorted
+        y: ndarray of float
+
+    Returns: ndarray of int
+    """
+    valid = np.flatnonzero(~np.isnan(y))
+    n = len(valid)
+    if num_points >= n or num_points < 3:
+        return valid
+
+    xs, ys = x[valid], y[valid]
+
+    bucket_size = (n - 2) / (num_points - 2)
+    selected = np.empty(num_points, np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(num_points - 2):
+        # Average of the next bucket
+        avg_start, avg_end = int((i + 1) * bucket_size) + 1, min(int((i + 2) * bucket_size) + 1, n)
+        avg_x, avg_y = xs[avg_start:avg_end].mean(), ys[avg_start:avg_end].mean()
+
+        # Point of the current bucket making the largest triangle with the previously selected point and the average
+        start, end = int(i * bucket_size) + 1, int((i + 1) * bucket_size) + 1
+        areas = np.abs((xs[a] - avg_x) * (ys[start:end] - ys[a]) - (xs[a] - xs[start:end]) * (avg_y - ys[a]))
+        a = start + int(np.argmax(areas))
+        selected[i+1] = a
+
+    return valid[selected]
+
+
+def downsample_arrays(method, time, data, xlim, num_points):
+    """Select indices of points to keep.
+
+    Parameters:
+        method: str
+            One of METHODS
+        time: ndarray of float, shape (num_points,)
+            Sorted
+        data: ndarray of float, shape (num_columns, num_points)
+        xlim: tuple of float
+            Plot x-axis limits
+        num_points: int
+            Target number of points per column
+
+    Returns: ndarray of int
+        Sorted indices
+    """
+    if len(time) <= num_points:
+        return np.arange(len(time))
+
+    # First and last points are always kept so that the plotted lines span the whole data range
+    indices = [np.array([0, len(time) - 1])]
+    for y in data:
+        if method == 'minmax':
+            indices.append(min_max_indices_array(time, y, xlim[0], xlim[1], max(num_points // 2, 1)))
+        elif method == 'lttb':
+            indices.append(lttb_indices_array(time, y, num_points))
+        else:
+            raise ValueError(f'Unknown downsampling method: {method}')
+
+    return np.unique(np.concatenate(indices))
@@ -0,0 +1,208 @@
+"""Export of run data in binary columnar formats.
+
+Formats:
+    npz: NumPy archive with arrays
+        columns: str, shape (num_columns,)
+        time: int64 microseconds since the unix epoch, shape (num_measurements,)
+        data: float64, shape (num_measurements, num_columns); missing values are NaN
+    arrow: Arrow IPC file with a 'date_added' timestamp[us, UTC] column followed by one float64 column per device column;
+        missing and non-numeric values are null
+    parquet: Parquet file with the same schema as arrow; each chunk of measurements is written as a separate row group
+
+For devices with a map, distances, speeds and bearings along the track (see `tracks.Track.add`) are added as arrays, or
+float64 columns, `track_distance`, `track_cumulative_distance`, `track_speed` and `track_bearing`; they require numpy.
+
+numpy is required for npz and pyarrow for arrow/parquet; formats whose dependencies are missing are not available.
+Files are written to a temporary file one chunk of MEASUREMENTS_CHUNK_SIZE measurements at a time.
+"""
+import itertools
+import math
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+
+from measurements.segments import iter_measurements
+
+from . import tracks
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pa = None
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# format -> (file extension, content type)
+FORMATS = {
+    'npz': ('npz', 'application/octet-stream'),
+    'arrow': ('arrow', 'application/vnd.apache.arrow.file'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+
+def get_available_formats():
+    """Get formats whose dependencies are installed.
+
+    Returns: list of str
+    """
+    formats = []
+    if np is not None:
+        formats.append('npz')
+    if pa is not None:
+        formats.extend(['arrow', 'parquet'])
+    return formats
+
+
+def to_arrays(rows, num_columns):
+    """Convert measurements to arrays, one chunk of MEASUREMENTS_CHUNK_SIZE measurements at a time; requires numpy.
+
+    Parameters:
+        rows: iterable of (date_added, data) tuples
+        num_columns: int
+
+    Returns: tuple
+        time: int64 microseconds since the unix epoch, shape (num_measurements,)
+        data: float64, shape (num_measurements, num_columns); missing and non-numeric values are NaN
+    """
+    time_chunks, data_chunks = [], []
+    rows = iter(rows)
+    while chunk := list(itertools.islice(rows, settings.MEASUREMENTS_CHUNK_SIZE)):
+        time_chunks.append(_to_epoch_us([d for d, _ in chunk]))
+        data_chunks.append(_to_float64([data for _, data in chunk]).reshape(len(chunk), num_columns))
+
+    if not time_chunks:
+        return np.empty(0, np.int64), np.empty((0, num_columns), np.float64)
+    return np.concatenate(time_chunks), np.concatenate(data_chunks)
+
+
+def _to_float64(values):
+    try:
+        return np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        # Values of measurements stored as json can be of any type
+        return np.array([[_to_float(v) for v in data] for data in values], dtype=np.float64)
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _to_epoch_us(dates):
+    tzinfo = dates[0].tzinfo
+    if tzinfo.utcoffset(None) == timedelta(0) and all(d.tzinfo is tzinfo for d in dates):
+        # Subtracting dates with the same tzinfo ignores it, which avoids slow utcoffset() calls of pytz timezones
+        epoch = EPOCH.replace(tzinfo=tzinfo)
+        seconds = np.fromiter(((d - epoch).total_seconds() for d in dates), np.float64, len(dates))
+    else:
+        seconds = np.fromiter((d.timestamp() for d in dates), np.float64, len(dates))
+
+    # Float seconds are exact to well below a microsecond for current dates
+    return np.rint(seconds * 1e6).astype(np.int64)
+
+
+def _iter_chunks(run):
+    rows = iter_measurements(run)
+    while chunk := list(itertools.islice(rows, settings.MEASUREMENTS_CHUNK_SIZE)):
+        yield chunk
+
+
+def _has_track(run):
+    return run.device.has_map and np is not None
+
+
+def _write_npz(run, f):
+    time, data = to_arrays(iter_measurements(run), len(run.device.columns))
+
+    track = {}
+    if _has_track(run):
+        lat_idx, lon_idx = tracks.get_position_columns(run.device)
+        track = tracks.Track().add(time, data[:, lat_idx], data[:, lon_idx])
+
+    np.savez(
+        f,
+        columns=np.array(run.device.columns, dtype=str),
+        time=time,
+        data=data,
+        **{f'track_{name}': values for name, values in track.items()},
+    )
+
+
+def _get_arrow_schema(run):
+    track_columns = [f'track_{name}' for name in tracks.TRACK_FIELDS] if _has_track(run) else []
+    return pa.schema(
+        [pa.field('date_added', pa.timestamp('us', tz='UTC'))]
+        + [pa.field(column, pa.float64()) for column in run.device.columns + track_columns]
+    )
+
+
+def _iter_record_batches(run, schema):
+    if _has_track(run):
+        track = tracks.Track()
+        lat_idx, lon_idx = tracks.get_position_columns(run.device)
+
+    for chunk in _iter_chunks(run):
+        arrays = [pa.array([d for d, _ in chunk], schema.field(0).type)]
+        for idx in range(len(run.device.columns)):
+            # Values converted as in `to_arrays`; NaN is stored as null
+            arrays.append(pa.array([_to_float(data[idx]) for _, data in chunk], pa.float64(), from_pandas=True))
+
+        if _has_track(run):
+            time, data = to_arrays(chunk, len(run.device.columns))
+            values = track.add(time, data[:, lat_idx], data[:, lon_idx])
+            arrays.extend(pa.array(values[name], pa.float64()) for name in tracks.TRACK_FIELDS)
+
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _write_arrow(run, f):
+    schema = _get_arrow_schema(run)
+    with pa.ipc.new_file(f, schema) as writer:
+        for batch in _iter_record_batches(run, schema):
+            writer.write_batch(batch)
+
+
+def _write_parquet(run, f):
+    schema = _get_arrow_schema(run)
+    with pa.parquet.ParquetWriter(f, schema) as writer:
+        for batch in _iter_record_batches(run, schema):
+            writer.write_batch(batch)
+
+
+def export_run(run, format_):
+    """Write data of the given run to a temporary file.
+
+    Parameters:
+        run: Run
+        format_: str
+            One of `get_available_formats()`
+
+    Returns: file object
+        Positioned at the beginning; closing it removes the file
+    """
+    writers = {
+        'npz': _write_npz,
+        'arrow': _write_arrow,
+        'parquet': _write_parquet,
+    }
+
+    f = tempfile.TemporaryFile()
+    try:
+        writers[format_](run, f)
+    except BaseException:
+        f.close()
+        raise
+
+    f.seek(0)
+    return f
@@ -1,22 +1,25 @@
-from math import acos, cos, radians, sin
+from math import asin, cos, radians, sin, sqrt
+
+from django.conf import settings
 
 
 def distance(lat1, lon1, lat2, lon2):
-    """Calculate great circle distance between two points.
+    """Calculate great circle distance between two points using the haversine formula, which, unlike the spherical law
+    of cosines, is accurate also for close or equal points (see `tracks.haversine` for arrays).
 
     Parameters:
-        lat1, lon1, lat2, lon2: float
+        lat1, lon1, lat2, lon2: float or None
             Position in degrees
 
-    Returns: int
-        Distance in meters
+    Returns: int or None
+        Distance in meters; None if any position is missing
     """
+    if None in (lat1, lon1, lat2, lon2):
+        return None
+
     lat1, lon1, lat2, lon2 = map(radians, (lat1, lon1, lat2, lon2))
-    return round(
-        6_371_000. * acos(
-            sin(lat1) * sin(lat2) + cos(lat1) * cos(lat2) * cos(lon1 - lon2)
-        )
-    )
+    a = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+    return round(2 * 6_371_000. * asin(sqrt(min(a, 1.))))
 
 
 def time_to_next_display(next_, this):
@@ -41,3 +44,31 @@ def time_to_next_display(next_, this):
     ret += f'{hour:02d}h ' if hour or day else ''
     ret += f'{min_:02d}m {sec:02d}s'
     return ret
+
+
+class LocalTimeFormatter:
+    """Format aware datetimes as '%Y-%m-%d %H:%M:%S' in the local time zone.
+
+    Converting each datetime with `astimezone` and `strftime` is slow; instead, the UTC offset is looked up once per
+    15-minute period (time zone transitions happen at multiples of 15 minutes) and applied to the naive datetime.
+    """
+    PERIOD = 900  # s
+
+    def __init__(self, tz=None):
+        self.tz = tz or settings.LOCAL_TIMEZONE
+        self._period = None
+        self._offset = None
+
+    def __call__(self, dt):
+        """
+        Parameters:
+            dt: aware datetime
+
+        Returns: str
+        """
+        period = dt.timestamp() // self.PERIOD
+        if period != self._period:
+            self._period = period
+            self._offset = dt.astimezone(self.tz).utcoffset() - dt.utcoffset()
+
+        return (dt.replace(tzinfo=None) + self._offset).isoformat(' ', 'seconds')
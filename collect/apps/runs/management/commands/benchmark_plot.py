@@ -0,0 +1,92 @@
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from devices.models import Device
+from runs import downsampling, export
+from runs.models import Run
+from runs.views import PlotContextData, np
+
+
+def legacy_data_context_data(plot, rows, start_idx, xlim_e):
+    """Plot data as prepared before NumPy was used and titles were formatted by the client."""
+    columns = plot.run.device.columns
+
+    time_dt, data = [], [[] for _ in range(len(columns))]
+    for date_added, values in rows:
+        time_dt.append(date_added.astimezone(settings.LOCAL_TIMEZONE))
+        for idx, value in enumerate(values):
+            data[idx].append(value)
+
+    time_e = [t.timestamp() for t in time_dt]
+
+    if plot.downsampling is None:
+        indices = range(len(time_e))
+    else:
+        indices = downsampling.downsample(plot.downsampling, time_e, data, xlim_e, plot.num_points)
+        time_dt = [time_dt[idx] for idx in indices]
+        time_e = [time_e[idx] for idx in indices]
+        data = [[column[idx] for idx in indices] for column in data]
+
+    titles = [
+        f'''#{start_idx+idx}: {t.strftime('%Y-%m-%d %H:%M:%S')}'''
+        for idx, t in zip(indices, time_dt)
+    ]
+
+    return {
+        'time': time_e,
+        'titles': titles,
+        'data': data,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark preparing plot data of synthetic measurements (already fetched from the database): time per '
+        'request for each implementation and downsampling method; the arrays implementation is timed excluding the '
+        'conversion of rows to arrays, which is reported separately. Nothing is saved in the database'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('-n', '--num-measurements', type=int, default=500_000)
+        parser.add_argument('-c', '--num-columns', type=int, default=2)
+        parser.add_argument('-w', '--width', type=int, default=1000, help='Plot width in pixels')
+
+    def handle(self, *args, **options):
+        if np is None:
+            raise CommandError('numpy is not installed')
+
+        num_measurements, num_columns = options['num_measurements'], options['num_columns']
+        num_points = options['width'] * settings.PLOT_POINTS_PER_PIXEL
+
+        date_from = timezone.now() - timedelta(seconds=num_measurements)
+        run = Run(device=Device(columns=[f'c{idx}' for idx in range(num_columns)]), date_from=date_from)
+        rows = [
+            (date_from + timedelta(seconds=idx), [random.random() for _ in range(num_columns)])
+            for idx in range(num_measurements)
+        ]
+        xlim_e = (date_from.timestamp(), date_from.timestamp() + num_measurements)
+
+        # Conversion of rows to arrays is the same for all methods
+        start = time.perf_counter()
+        time_us, data = export.to_arrays(rows, num_columns)
+        conversion_elapsed = time.perf_counter() - start
+        self.stdout.write(f'Conversion of rows to arrays: {conversion_elapsed * 1000:.1f} ms')
+
+        for method in (None, *downsampling.METHODS):
+            plot = PlotContextData(run, downsampling=method, num_points=num_points)
+            implementations = (
+                ('before', lambda: legacy_data_context_data(plot, rows, 1, xlim_e)),
+                ('lists', lambda: plot._get_data_context_data_lists(rows, 1, xlim_e)),
+                ('arrays', lambda: plot._get_arrays_context_data(time_us, data, 1, xlim_e)),
+            )
+            for name, func in implementations:
+                start = time.perf_counter()
+                ctx = func()
+                elapsed = time.perf_counter() - start
+
+                self.stdout.write(f'{method or "none":>6} {name:>6}: {elapsed * 1000:.1f} ms; {len(ctx["time"])} points')
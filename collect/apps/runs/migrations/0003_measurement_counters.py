@@ -0,0 +1,28 @@
+# Generated by Django 3.2.16 on 2026-10-18 17:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('runs', '0002_alter_run_date_from'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='run',
+            name='first_measurement_date',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='run',
+            name='last_measurement_date',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='run',
+            name='num_measurements',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:12
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('runs', '0003_measurement_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='run',
+            name='date_modified',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='run',
+            name='version',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
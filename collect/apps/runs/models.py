@@ -2,7 +2,7 @@ from datetime import datetime, timedelta
 
 from django.conf import settings
 from django.db import models
-from django.utils.functional import cached_property
+from django.utils import timezone
 
 from devices.models import Device
 
@@ -13,6 +13,19 @@ class Run(models.Model):
     date_from = models.DateTimeField()
     date_to = models.DateTimeField(null=True, blank=True)
 
+    # Denormalised counters, see measurements.functions
+    num_measurements = models.IntegerField(default=0, editable=False)
+    first_measurement_date = models.DateTimeField(null=True, editable=False)
+    last_measurement_date = models.DateTimeField(null=True, editable=False)
+
+    COUNTER_FIELDS = ('num_measurements', 'first_measurement_date', 'last_measurement_date')
+
+    # Incremented when data of the run change other than by adding measurements, see runs.cache
+    version = models.IntegerField(default=0, editable=False)
+    date_modified = models.DateTimeField(default=timezone.now, editable=False)
+
+    VERSION_FIELDS = ('version', 'date_modified')
+
     def get_date_from_display(self):
         return f'{self.date_from.astimezone(settings.LOCAL_TIMEZONE):%Y-%m-%d %H:%M}'
 
@@ -25,37 +38,39 @@ class Run(models.Model):
 
         return f'{self.get_date_from_display()} &mdash; {self.get_date_to_display()}'
 
-    @cached_property
-    def num_measurements(self):
-        return self.measurement_set.count()
+    def get_measurement_set(self):
+        """Get measurements of the run, bounded by its dates so that partitions of the measurements table outside the
+        run can be skipped (see measurements.partitioning).
 
-    def can_be_trimmed(self, measurements=None):
-        """Is there any data gap at the beginning or end of the run timerange?
+        Returns: QuerySet of Measurement
+        """
+        qs = self.measurement_set.filter(date_added__gte=self.date_from)
+        if self.date_to:
+            qs = qs.filter(date_added__lt=self.date_to)
+        return qs
 
-        Parameters:
-            measurements: list of Measurement or None
+    def can_be_trimmed(self):
+        """Is there any data gap at the beginning or end of the run timerange?
 
         Returns: bool
         """
-        if not self.date_to:
+        if not self.date_to or not self.num_measurements:
             return False
 
-        if measurements is None:
-            qs = self.measurement_set.order_by('date_added')
-            if not qs:
-                return False
-            first, last = qs[0], qs.reverse()[0]
-        else:
-            if not measurements:
-                return False
-            first, last = measurements[0], measurements[-1]
-
-        first_dt, last_dt = first.date_added, last.date_added
+        first_dt, last_dt = self.first_measurement_date, self.last_measurement_date
         first_minute_dt = first_dt.replace(second=0, microsecond=0)
         last_minute_dt = last_dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
 
         return first_minute_dt != self.date_from or last_minute_dt != self.date_to
 
+    def save(self, *args, **kwargs):
+        if self.pk is not None and kwargs.get('update_fields') is None:
+            # Counters and versions are changed only by queryset updates, so that saving an instance loaded before new measurements were added doesn't overwrite them
+            excluded = self.COUNTER_FIELDS + self.VERSION_FIELDS
+            kwargs['update_fields'] = [f.name for f in self._meta.concrete_fields if not f.primary_key and f.name not in excluded]
+
+        super().save(*args, **kwargs)
+
     @property
     def needs_updating(self):
         return not self.date_to or datetime.now(settings.LOCAL_TIMEZONE) <= self.date_to
@@ -0,0 +1,147 @@
+"""Notifications about new measurements of runs, used by live run pages to wait for new data.
+
+Brokers (RUN_NOTIFICATIONS['BROKER']):
+    'local': notifications are delivered only within the process that saved the measurements, so it is suitable
+        only when measurements are received by the same process that serves the run pages
+    'postgres': notifications are sent with PostgreSQL NOTIFY and received by a LISTEN thread started in each process
+        on first use
+    None: disabled; run pages poll for new data
+"""
+import asyncio
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+
+import psycopg2
+from django.conf import settings
+from django.db import connection
+
+
+logger = logging.getLogger(__name__)
+
+
+class LocalBroker:
+
+    def __init__(self):
+        self._waiters = defaultdict(set)  # run_id -> {(event loop, asyncio.Event)}
+        self._lock = threading.Lock()
+
+    def publish(self, run_ids):
+        """Notify waiters of the given runs; can be called from any thread.
+
+        Parameters:
+            run_ids: iterable of int
+        """
+        self._dispatch(run_ids)
+
+    async def wait(self, run_id, timeout, check=None):
+        """Wait for a notification about the given run.
+
+        Parameters:
+            run_id: int
+            timeout: float
+                s
+            check: coroutine function or None
+                Called after the waiter is registered; if it returns True, there is no need to wait, e.g. because
+                new measurements were added before the waiter was registered
+
+        Returns: bool
+            Whether a notification was received (or `check` returned True)
+        """
+        self._start()
+
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._waiters[run_id].add(waiter)
+
+        try:
+            if check is not None and await check():
+                return True
+
+            try:
+                await asyncio.wait_for(waiter[1].wait(), timeout)
+            except asyncio.TimeoutError:
+                return False
+
+            return True
+
+        finally:
+            with self._lock:
+                self._waiters[run_id].discard(waiter)
+                if not self._waiters[run_id]:
+                    del self._waiters[run_id]
+
+    def _start(self):
+        # Start receiving notifications published by other processes
+        pass
+
+    def _dispatch(self, run_ids):
+        with self._lock:
+            waiters = [waiter for run_id in run_ids for waiter in self._waiters.get(run_id, ())]
+
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+
+
+class PostgresBroker(LocalBroker):
+    CHANNEL = 'run_measurements'
+
+    def __init__(self):
+        super().__init__()
+        self._thread = None
+
+    def publish(self, run_ids):
+        with connection.cursor() as cursor:
+            for run_id in run_ids:
+                cursor.execute('SELECT pg_notify(%s, %s)', [self.CHANNEL, str(run_id)])
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._listen, name='run-notifications', daemon=True)
+            self._thread.start()
+
+    def _listen(self):
+        while True:
+            try:
+                self._listen_once()
+            except Exception:
+                logger.exception('Listening for run notifications failed; reconnecting')
+                time.sleep(5)
+
+    def _listen_once(self):
+        params = connection.get_connection_params()
+        conn = psycopg2.connect(**params)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f'LISTEN {self.CHANNEL}')
+
+            while True:
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    continue
+
+                conn.poll()
+                run_ids = {int(notify.payload) for notify in conn.notifies}
+                conn.notifies.clear()
+                self._dispatch(run_ids)
+
+        finally:
+            conn.close()
+
+
+def _get_broker():
+    broker = settings.RUN_NOTIFICATIONS['BROKER']
+    if broker is None:
+        return None
+    return {
+        'local': LocalBroker,
+        'postgres': PostgresBroker,
+    }[broker]()
+
+
+broker = _get_broker()
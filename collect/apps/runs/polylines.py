@@ -0,0 +1,260 @@
+"""Simplification and encoding of tracks shown on maps.
+
+Tracks are simplified by the Douglas-Peucker algorithm so that the simplified line deviates from the measured positions
+by at most MAP_SIMPLIFICATION['TOLERANCE'] pixels at the zoom level of the map, and sent as encoded polylines (Google's
+Encoded Polyline Algorithm Format). The whole track is simplified as if it spanned MAP_SIMPLIFICATION['WIDTH'] pixels;
+when the map is zoomed in, positions in the visible bounding box are fetched again with a smaller tolerance.
+
+`simplify_indices_array` is the equivalent of `simplify_indices` for NumPy arrays; it is used if numpy is installed.
+"""
+from math import cos, hypot, isfinite, radians
+
+from django.conf import settings
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+EARTH_RADIUS = 6_371_000.  # m
+
+# Size of a pixel at the equator at zoom level 0 of Web Mercator maps
+METERS_PER_PIXEL_AT_ZOOM_0 = 156_543.03392
+
+MAX_ZOOM = 22
+
+
+def project(lat, lon, lat0):
+    """Project positions onto a plane using the equirectangular projection, which is accurate enough for distances
+    within a map view.
+
+    Parameters:
+        lat, lon: list of float
+            Degrees
+        lat0: float
+            Latitude of the centre of the projection, degrees
+
+    Returns: tuple
+        x, y: list of float
+            Meters
+    """
+    scale = radians(1.) * EARTH_RADIUS
+    scale_x = scale * cos(radians(lat0))
+    return [lon_i * scale_x for lon_i in lon], [lat_i * scale for lat_i in lat]
+
+
+def _segment_distance(x, y, x1, y1, x2, y2):
+    """Calculate the distance between point (x, y) and segment (x1, y1)-(x2, y2)."""
+    dx, dy = x2 - x1, y2 - y1
+    norm2 = dx * dx + dy * dy
+    t = min(max(((x - x1) * dx + (y - y1) * dy) / norm2, 0.), 1.) if norm2 > 0 else 0.
+    return hypot(x - x1 - t * dx, y - y1 - t * dy)
+
+
+def simplify_indices(x, y, tolerance):
+    """Select points of a line using the Douglas-Peucker algorithm.
+
+    Distances to segments (rather than lines) are used, so that parts of a track going back and forth are kept.
+
+    Parameters:
+        x, y: list of float
+        tolerance: float
+            Maximum distance of a removed point from the simplified line
+
+    Returns: list of int
+        Sorted indices; the first and last points are always kept
+    """
+    n = len(x)
+    if n <= 2:
+        return list(range(n))
+
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+
+        max_dist, max_idx = -1., None
+        for idx in range(first + 1, last):
+            dist = _segment_distance(x[idx], y[idx], x[first], y[first], x[last], y[last])
+            if dist > max_dist:
+                max_dist, max_idx = dist, idx
+
+        if max_idx is not None and max_dist > tolerance:
+            keep[max_idx] = True
+            stack.append((first, max_idx))
+            stack.append((max_idx, last))
+
+    return [idx for idx, k in enumerate(keep) if k]
+
+
+def simplify_indices_array(x, y, tolerance):
+    """Array version of `simplify_indices`.
+
+    Parameters:
+        x, y: ndarray of float
+
+    Returns: ndarray of int
+    """
+    n = len(x)
+    if n <= 2:
+        return np.arange(n)
+
+    keep = np.zeros(n, bool)
+    keep[0] = keep[-1] = True
+
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+
+        dx, dy = x[last] - x[first], y[last] - y[first]
+        px, py = x[first+1:last] - x[first], y[first+1:last] - y[first]
+        norm2 = dx * dx + dy * dy
+        t = np.clip((px * dx + py * dy) / norm2, 0., 1.) if norm2 > 0 else 0.
+        dist = np.hypot(px - t * dx, py - t * dy)
+
+        # First of equal maxima, as in `simplify_indices`
+        idx = int(np.argmax(dist))
+        if dist[idx] > tolerance:
+            max_idx = first + 1 + idx
+            keep[max_idx] = True
+            stack.append((first, max_idx))
+            stack.append((max_idx, last))
+
+    return np.flatnonzero(keep)
+
+
+def encode_polyline(lat, lon):
+    """Encode positions using Google's Encoded Polyline Algorithm Format (precision of 1e-5 degrees).
+
+    Parameters:
+        lat, lon: list of float
+            Degrees
+
+    Returns: str
+    """
+    chars = []
+    prev_lat = prev_lon = 0
+    for lat_i, lon_i in zip(lat, lon):
+        lat_i, lon_i = round(lat_i * 1e5), round(lon_i * 1e5)
+        for value in (lat_i - prev_lat, lon_i - prev_lon):
+            value = ~(value << 1) if value < 0 else value << 1
+            while value >= 0x20:
+                chars.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            chars.append(chr(value + 63))
+        prev_lat, prev_lon = lat_i, lon_i
+
+    return ''.join(chars)
+
+
+def get_tolerance(lat, lon, zoom=None):
+    """Get simplification tolerance for the given positions.
+
+    Parameters:
+        lat, lon: list of float
+            Degrees
+        zoom: int or None
+            Zoom level of the map; None to fit all positions into MAP_SIMPLIFICATION['WIDTH'] pixels
+
+    Returns: float
+        Meters
+    """
+    if not lat:
+        return 0.
+
+    lat0 = (min(lat) + max(lat)) / 2
+    if zoom is not None:
+        meters_per_pixel = METERS_PER_PIXEL_AT_ZOOM_0 * cos(radians(lat0)) / 2 ** zoom
+    else:
+        x, y = project([min(lat), max(lat)], [min(lon), max(lon)], lat0)
+        meters_per_pixel = max(x[1] - x[0], y[1] - y[0]) / settings.MAP_SIMPLIFICATION['WIDTH']
+
+    return meters_per_pixel * settings.MAP_SIMPLIFICATION['TOLERANCE']
+
+
+def parse_bbox(value):
+    """Parse a bounding box given as 'south,west,north,east' (degrees).
+
+    Returns: tuple of float
+
+    Raises:
+        ValueError: if the value is invalid
+    """
+    bbox = tuple(float(v) for v in value.split(','))
+    if len(bbox) != 4 or not all(map(isfinite, bbox)):
+        raise ValueError(f'Invalid bounding box: {value}')
+    return bbox
+
+
+def _is_in_bbox(lat, lon, bbox):
+    south, west, north, east = bbox
+    if not south <= lat <= north:
+        return False
+    # Boxes crossing the antimeridian have west > east
+    return west <= lon <= east if west <= east else (lon >= west or lon <= east)
+
+
+def get_paths(points, tolerance, bbox=None):
+    """Get simplified and encoded paths of the given points.
+
+    Parameters:
+        points: list of (display index, date_added, lat, lon) tuples
+            Only measurements with a position
+        tolerance: float or None
+            Meters; None to keep all points
+        bbox: (south, west, north, east) tuple or None
+            Keep only points inside the bounding box (degrees) and their neighbours, which may split the track into
+            several paths
+
+    Returns: list of dict
+        polyline: str
+            Encoded positions of the kept points
+        indices: list of int
+            Display indices of the kept points
+        times: list of int
+            Seconds since the unix epoch of the kept points
+    """
+    if bbox is not None:
+        inside = [_is_in_bbox(lat, lon, bbox) for _, _, lat, lon in points]
+        selected = [
+            inside[idx] or (idx > 0 and inside[idx-1]) or (idx < len(points) - 1 and inside[idx+1])
+            for idx in range(len(points))
+        ]
+        pieces, piece = [], []
+        for point, is_selected in zip(points, selected):
+            if is_selected:
+                piece.append(point)
+            elif piece:
+                pieces.append(piece)
+                piece = []
+        if piece:
+            pieces.append(piece)
+    else:
+        pieces = [points] if points else []
+
+    paths = []
+    for piece in pieces:
+        lat = [point[2] for point in piece]
+        lon = [point[3] for point in piece]
+
+        if tolerance is not None:
+            x, y = project(lat, lon, (min(lat) + max(lat)) / 2)
+            if np is not None:
+                kept = simplify_indices_array(np.array(x), np.array(y), tolerance).tolist()
+            else:
+                kept = simplify_indices(x, y, tolerance)
+            piece = [piece[idx] for idx in kept]
+            lat, lon = [lat[idx] for idx in kept], [lon[idx] for idx in kept]
+
+        paths.append({
+            'polyline': encode_polyline(lat, lon),
+            'indices': [point[0] for point in piece],
+            'times': [int(point[1].timestamp()) for point in piece],
+        })
+
+    return paths
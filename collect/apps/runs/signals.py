@@ -0,0 +1,27 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from devices.models import Device
+from measurements.signals import measurements_created
+
+from . import cache, notifications
+
+
+@receiver(measurements_created)
+def notify_about_new_measurements(sender, device, measurements, **kwargs):
+    if notifications.broker is None:
+        return
+
+    run_ids = {m.run_id for m in measurements if m.run_id is not None}
+    if run_ids:
+        transaction.on_commit(lambda: notifications.broker.publish(run_ids))
+
+
+@receiver(post_save, sender=Device)
+def invalidate_cached_runs(sender, instance, created, update_fields=None, **kwargs):
+    # Run pages and data show the device's name and columns
+    if created or (update_fields is not None and set(update_fields) <= set(Device.COUNTER_FIELDS)):
+        return
+
+    cache.invalidate_runs(instance.run_set.values_list('pk', flat=True))
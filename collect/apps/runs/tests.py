@@ -0,0 +1,129 @@
+import io
+import unittest
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from devices.functions import calculate_hash
+from devices.models import Device
+from measurements.functions import reconcile_counters
+from measurements.models import Measurement
+
+from . import export
+from .models import Run
+
+
+API_KEY = 'abcdefghijklmnopqrstuvwxyz0123'
+
+# Values of measurements stored as json, of the second column
+MIXED_VALUES = [1.5, None, 'x', '2.5', {'a': 1}]
+
+
+class MixedValuesTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = user = get_user_model().objects.create_user('user', password='password')
+        salt = 's' * 10
+        device = Device.objects.create(
+            user=user,
+            name='device',
+            columns=['a', 'b'],
+            token=API_KEY[:6],
+            salt=salt,
+            api_key_hash=calculate_hash(API_KEY, salt),
+        )
+
+        now = timezone.now()
+        cls.mixed_run = Run.objects.create(device=device, name='run', date_from=now - timedelta(hours=1))
+        Measurement.objects.bulk_create([
+            Measurement(device=device, run=cls.mixed_run, date_added=now - timedelta(minutes=30, seconds=-idx), data=[idx, value])
+            for idx, value in enumerate(MIXED_VALUES)
+        ])
+        reconcile_counters(cls.mixed_run)
+
+
+class ExportTest(MixedValuesTestCase):
+
+    @unittest.skipIf(export.pa is None, 'pyarrow is not installed')
+    def test_arrow_mixed_types(self):
+        with export.export_run(self.mixed_run, 'arrow') as f:
+            table = export.pa.ipc.open_file(f).read_all()
+
+        self.assertEqual(table.column('a').to_pylist(), [0., 1., 2., 3., 4.])
+        self.assertEqual(table.column('b').to_pylist(), [1.5, None, None, 2.5, None])
+
+    @unittest.skipIf(export.pa is None, 'pyarrow is not installed')
+    def test_parquet_mixed_types(self):
+        with export.export_run(self.mixed_run, 'parquet') as f:
+            table = export.pa.parquet.read_table(io.BytesIO(f.read()))
+
+        self.assertEqual(table.column('b').to_pylist(), [1.5, None, None, 2.5, None])
+
+
+class RunDataViewTest(MixedValuesTestCase):
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def get_plot_data(self, downsample='none'):
+        r = self.client.get(reverse('runs:get-data', kwargs={'r_id': self.mixed_run.pk}), {'cursor': '', 'downsample': downsample})
+        self.assertEqual(r.status_code, 200)
+        return r.json()['plot_ctx']['data']
+
+    @unittest.skipIf(export.np is None, 'numpy is not installed')
+    def test_mixed_types(self):
+        self.assertEqual(self.get_plot_data(), [[0., 1., 2., 3., 4.], [1.5, None, None, 2.5, None]])
+
+    def test_mixed_types_without_numpy(self):
+        with mock.patch('runs.views.np', None):
+            self.assertEqual(self.get_plot_data(), [[0., 1., 2., 3., 4.], [1.5, None, None, 2.5, None]])
+            self.assertEqual(len(self.get_plot_data('minmax')), 2)
+
+
+class RunCacheTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('user', password='password')
+        salt = 's' * 10
+        cls.device = Device.objects.create(
+            user=cls.user,
+            name='device',
+            columns=['a', 'b'],
+            token=API_KEY[:6],
+            salt=salt,
+            api_key_hash=calculate_hash(API_KEY, salt),
+        )
+
+        now = timezone.now()
+        cls.finalised_run = Run.objects.create(device=cls.device, name='run', date_from=now - timedelta(hours=2), date_to=now - timedelta(hours=1))
+        Measurement.objects.create(device=cls.device, run=cls.finalised_run, date_added=now - timedelta(minutes=90), data=[1, 2])
+        reconcile_counters(cls.finalised_run)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_device_edit_invalidates(self):
+        url = reverse('runs:get-data', kwargs={'r_id': self.finalised_run.pk})
+        r = self.client.get(url, {'cursor': ''})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(self.client.get(url, {'cursor': ''}, HTTP_IF_NONE_MATCH=r['ETag']).status_code, 304)
+
+        self.device.name = 'renamed'
+        self.device.save()
+
+        self.assertEqual(self.client.get(url, {'cursor': ''}, HTTP_IF_NONE_MATCH=r['ETag']).status_code, 200)
+
+    def test_saving_counters_doesnt_invalidate(self):
+        version = self.finalised_run.version
+
+        self.device.num_measurements = 10
+        self.device.save(update_fields=['num_measurements'])
+
+        self.finalised_run.refresh_from_db()
+        self.assertEqual(self.finalised_run.version, version)
@@ -0,0 +1,161 @@
+"""Distances, speeds and bearings along GPS tracks of runs of devices with 'lat'/'lon' columns; requires numpy.
+
+Segments connect consecutive measurements with a position; measurements with a missing latitude or longitude are
+skipped. Values of each measurement refer to the segment ending at it, so they are NaN for the first measurement with
+a position. All values are calculated on arrays, so long runs are processed without per-measurement Python code.
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+EARTH_RADIUS = 6_371_000.  # m
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Calculate great circle distances between points using the haversine formula, which is accurate also for
+    close points.
+
+    Parameters:
+        lat1, lon1, lat2, lon2: ndarray of float
+            Positions in degrees
+
+    Returns: ndarray of float
+        Distances in meters
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0., 1.)))
+
+
+def bearing(lat1, lon1, lat2, lon2):
+    """Calculate initial bearings of great circle paths between points.
+
+    Parameters:
+        lat1, lon1, lat2, lon2: ndarray of float
+            Positions in degrees
+
+    Returns: ndarray of float
+        Bearings in degrees clockwise from north, in [0, 360)
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    y = np.sin(lon2 - lon1) * np.cos(lat2)
+    x = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(lon2 - lon1)
+    return np.degrees(np.arctan2(y, x)) % 360.
+
+
+# Names of the arrays returned by `Track.add`
+TRACK_FIELDS = ('distance', 'cumulative_distance', 'speed', 'bearing')
+
+
+class Track:
+    """Track of a run processed one chunk of measurements at a time."""
+
+    def __init__(self):
+        self.distance = 0.  # m
+        self.max_speed = None  # m/s
+        self.first_time = None  # us
+        self._last = None  # (time, lat, lon) of the last measurement with a position
+
+    def add(self, time_us, lat, lon):
+        """Calculate segments ending at the given measurements, which follow the ones added before.
+
+        Parameters:
+            time_us: ndarray of int
+                Microseconds since the unix epoch
+            lat, lon: ndarray of float
+                Degrees; NaN if missing
+
+        Returns: dict
+            distance: ndarray of float
+                Length of the segment, m
+            cumulative_distance: ndarray of float
+                Length of the track up to the measurement, m
+            speed: ndarray of float
+                Average speed over the segment, m/s; NaN if both measurements have the same time
+            bearing: ndarray of float
+                Bearing of the segment, degrees
+        """
+        ret = {name: np.full(len(time_us), np.nan) for name in TRACK_FIELDS}
+
+        valid = np.flatnonzero(~np.isnan(lat) & ~np.isnan(lon))
+        if not len(valid):
+            return ret
+
+        # Positions with the last position of the previous chunk prepended
+        time_s, lat, lon = time_us[valid] / 1e6, lat[valid], lon[valid]
+        if self._last is None:
+            self.first_time = time_us[valid[0]]
+            prev = (time_s[:1], lat[:1], lon[:1])
+        else:
+            prev = tuple(np.array([value]) for value in self._last)
+        time_s, lat, lon = (np.concatenate([p, v]) for p, v in zip(prev, (time_s, lat, lon)))
+
+        distance = haversine(lat[:-1], lon[:-1], lat[1:], lon[1:])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            speed = np.where(time_s[1:] > time_s[:-1], distance / (time_s[1:] - time_s[:-1]), np.nan)
+        if self._last is None:
+            # The first position doesn't end any segment
+            distance[0], speed[0] = np.nan, np.nan
+
+        ret['distance'][valid] = distance
+        ret['cumulative_distance'][valid] = self.distance + np.nancumsum(distance)
+        ret['speed'][valid] = speed
+        ret['bearing'][valid] = np.where(np.isnan(distance), np.nan, bearing(lat[:-1], lon[:-1], lat[1:], lon[1:]))
+
+        self.distance += np.nansum(distance)
+        if not np.isnan(speed).all():
+            self.max_speed = max(self.max_speed or 0., float(np.nanmax(speed)))
+        self._last = (time_s[-1], lat[-1], lon[-1])
+
+        return ret
+
+    def get_stats(self):
+        """Get statistics of the measurements added so far.
+
+        Returns: dict or None
+            distance: float
+                m
+            duration: float
+                s
+            average_speed, max_speed: float or None
+                m/s
+            None if there were no positions
+        """
+        if self._last is None:
+            return None
+
+        duration = self._last[0] - self.first_time / 1e6
+        return {
+            'distance': float(self.distance),
+            'duration': float(duration),
+            'average_speed': float(self.distance / duration) if duration > 0 else None,
+            'max_speed': self.max_speed,
+        }
+
+
+def get_position_columns(device):
+    """Get indices of the latitude and longitude columns of the given device.
+
+    Returns: tuple of int
+    """
+    return device.columns.index('lat'), device.columns.index('lon')
+
+
+def get_track_stats(device, time_us, data):
+    """Calculate statistics of the whole track.
+
+    Parameters:
+        device: Device
+        time_us, data: ndarray
+            See `export.to_arrays`
+
+    Returns: dict or None
+        See `Track.get_stats`
+    """
+    lat_idx, lon_idx = get_position_columns(device)
+
+    track = Track()
+    track.add(time_us, data[:, lat_idx], data[:, lon_idx])
+    return track.get_stats()
@@ -12,7 +12,11 @@ urlpatterns = [
     path('<int:r_id>/download/', login_required(views.RunDownloadDataView.as_view()), name='download'),
     path('<int:r_id>/delete-run-detach-data/', login_required(views.RunDeleteRunDetachDataView.as_view()), name='delete-run-detach-data'),
     path('<int:r_id>/delete-run-and-data/', login_required(views.RunDeleteRunAndDataView.as_view()), name='delete-run-and-data'),
+    path('<int:r_id>/get-data/', login_required(views.RunDataView.as_view()), name='get-data'),
+    path('<int:r_id>/get-map-data/', login_required(views.RunMapDataView.as_view()), name='get-map-data'),
     path('<int:r_id>/get-newest-data/', login_required(views.RunNewestDataView.as_view()), name='get-newest-data'),
+    # Async view; login is checked by the view, as login_required doesn't support async views
+    path('<int:r_id>/wait-for-new-data/', views.wait_for_new_data_view, name='wait-for-new-data'),
     path('<int:r_id>/get-new-xticks/', login_required(views.RunNewXticksView.as_view()), name='get-new-xticks'),
 
     path('<int:r_id>/pagination-measurements/<int:page>/', login_required(views.PaginationMeasurementsView.as_view()), name='pagination-measurements'),
@@ -1,44 +1,63 @@
 import csv
+import io
 import itertools
 import math
 import re
 from abc import ABC, abstractmethod
 from datetime import datetime, timedelta, timezone
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib import messages
 from django.core.exceptions import PermissionDenied, SuspiciousOperation
-from django.core.paginator import Paginator
 from django.db import transaction
+from django.db.models import Q, Sum
 from django.db.models.functions import Now
-from django.http import HttpResponse, JsonResponse
-from django.shortcuts import get_object_or_404, redirect, render
+from django.http import FileResponse, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.middleware.csrf import get_token
+from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse, reverse_lazy
 from django.utils.safestring import mark_safe
 from django.views import View
 from django.views.generic import CreateView, DetailView, TemplateView
 
 from devices.models import Device
-
-from .functions import distance, time_to_next_display
+from lib.pagination import KeysetPaginator, decode_cursor, encode_cursor, get_pagination_parameters
+from measurements.functions import change_counters, iter_data, refresh_measurement_dates, to_number
+from measurements.segments import count_measurements, count_packed_measurements, get_date_span_in_bbox, iter_measurements, unpack_segments
+from measurements.models import Measurement
+from measurements.signals import measurements_deleted
+from rollups.functions import get_rollups
+from rollups.models import Rollup
+
+from . import cache, downsampling, export, notifications, polylines, tracks
+from .functions import LocalTimeFormatter, distance, time_to_next_display
 from .models import Run
 
-
-EARLIEST_DATE = datetime(2000, 1, 1, tzinfo=settings.LOCAL_TIMEZONE)
-
-
-def get_measurements_context_data(run, page, measurements=None):
-    if measurements is None:
-        measurements = (
-            run
-            .measurement_set
-            .order_by('-date_added')
-        )
-
-    measurements_paginator = Paginator(measurements, settings.MEASUREMENTS_PAGINATE_BY)
-    measurements_page = measurements_paginator.get_page(page)
-
-    if not measurements_paginator.count:
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def get_measurements_context_data(run, page, **kwargs):
+    """Get measurements table data.
+
+    Parameters:
+        run: Run
+        page: int
+        kwargs:
+            Cursor parameters of `KeysetPaginator.get_page`
+    """
+    # Measurements packed into segments aren't listed
+    measurements_paginator = KeysetPaginator(
+        run.get_measurement_set(),
+        settings.MEASUREMENTS_PAGINATE_BY,
+        run.num_measurements - count_packed_measurements(run),
+    )
+    measurements_page = measurements_paginator.get_page(page, **kwargs)
+
+    if not measurements_page:
         return {
             'measurements_page': measurements_page,
             'measurements_l': [],
@@ -48,36 +67,19 @@ def get_measurements_context_data(run, page, measurements=None):
         }
 
     # Display index of the first record in the measurements table
-    start_idx = measurements_paginator.count - measurements_page.start_index() + 1
-
-    # Index of the first/last record in the `measurements` queryset/list
-    idx1, idx2 = measurements_page.start_index() - 1, measurements_page.end_index() - 1
-    if page == 1:
-        s_idx, e_idx = idx1 + 1, idx2 + 1
-    else:
-        s_idx, e_idx = idx1, idx2 + 1
+    start_idx = run.num_measurements - (measurements_page.number - 1) * settings.MEASUREMENTS_PAGINATE_BY
 
     time_to_next = [
-        time_to_next_display(next_.date_added, this.date_added)
-        for this, next_ in zip(
-            measurements[s_idx:e_idx],
-            measurements[s_idx-1:e_idx-1],
-        )
+        time_to_next_display(next_.date_added, this.date_added) if next_ is not None else '-'
+        for this, next_ in zip(measurements_page, measurements_page.next_objects)
     ]
-    if page == 1:
-        time_to_next.insert(0, '-')
 
     if run.device.has_map:
         lat_idx, lon_idx = run.device.columns.index('lat'), run.device.columns.index('lon')
         dist_to_next = [
-            distance(this.data[lat_idx], this.data[lon_idx], next_.data[lat_idx], next_.data[lon_idx])
-            for this, next_ in zip(
-                measurements[s_idx:e_idx],
-                measurements[s_idx-1:e_idx-1],
-            )
+            distance(this.data[lat_idx], this.data[lon_idx], next_.data[lat_idx], next_.data[lon_idx]) if next_ is not None else '-'
+            for this, next_ in zip(measurements_page, measurements_page.next_objects)
         ]
-        if page == 1:
-            dist_to_next.insert(0, '-')
     else:
         dist_to_next = itertools.repeat(None)
 
@@ -95,32 +97,111 @@ def get_measurements_context_data(run, page, measurements=None):
     }
 
 
-def get_map_context_data(run, queryset=None, start_idx=None):
-    lat_idx, lon_idx = run.device.columns.index('lat'), run.device.columns.index('lon')
+def get_new_measurements_context_data(run, rows, previous_row):
+    """Get rows to be added to the top of the measurements table.
 
-    if queryset is None:
-        queryset = (
-            run
-            .measurement_set
-            .order_by('date_added')
-        )
-        start_idx = 1
+    Parameters:
+        run: Run
+        rows: list of (id, date_added, data) tuples
+            New measurements, oldest first
+        previous_row: (id, date_added, data) tuple or None
+            Measurement preceding the new ones, i.e. the current first row of the table
 
-    locations = [
-        (
-            idx,
-            m.data[lat_idx],
-            m.data[lon_idx],
-            m.date_added.astimezone(settings.LOCAL_TIMEZONE).strftime('%Y-%m-%d %H:%M:%S'),
-        )
-        for idx, m in enumerate(queryset, start_idx)
-    ]
+    Returns: dict
+        rows: list of lists
+            cursor, display index, date, values, time to next, distance to next, delete url; newest first
+        previous_time_to_next, previous_dist_to_next: str or None
+            New values of the current first row of the table
+    """
+    columns = run.device.columns
+    if run.device.has_map:
+        lat_idx, lon_idx = columns.index('lat'), columns.index('lon')
+        get_dist = lambda this, next_: distance(this[2][lat_idx], this[2][lon_idx], next_[2][lat_idx], next_[2][lon_idx])
+    else:
+        get_dist = lambda this, next_: None
+
+    format_date = LocalTimeFormatter()
+    start_idx = run.num_measurements - len(rows) + 1
+
+    table_rows = []
+    for idx, (this, next_) in enumerate(zip(rows, rows[1:] + [None])):
+        m_id, date_added, data = this
+        table_rows.append([
+            encode_cursor(date_added, m_id),
+            start_idx + idx,
+            format_date(date_added),
+            [str(value) for value in data],
+            time_to_next_display(next_[1], date_added) if next_ is not None else '-',
+            get_dist(this, next_) if next_ is not None else '-',
+            reverse('measurements:delete', kwargs={'m_id': m_id}),
+        ])
+    table_rows.reverse()
+
+    if previous_row is not None and rows:
+        previous_time_to_next = time_to_next_display(rows[0][1], previous_row[1])
+        previous_dist_to_next = get_dist(previous_row, rows[0])
+    else:
+        previous_time_to_next = previous_dist_to_next = None
 
     return {
-        'locations_l': locations,
+        'rows': table_rows,
+        'previous_time_to_next': previous_time_to_next,
+        'previous_dist_to_next': previous_dist_to_next,
+    }
+
+
+def get_map_points(run, rows, start_idx):
+    """Get positions of the given measurements.
+
+    Parameters:
+        run: Run
+        rows: iterable of (date_added, data) tuples
+        start_idx: int
+            Display index of the first measurement in `rows`
 
-        'MAPS_API_KEY': settings.MAPS_API_KEY,
+    Returns: list of (display index, date_added, lat, lon) tuples
+        Measurements without a position are skipped
+    """
+    lat_idx, lon_idx = tracks.get_position_columns(run.device)
+    return [
+        (idx, date_added, data[lat_idx], data[lon_idx])
+        for idx, (date_added, data) in enumerate(rows, start_idx)
+        if data[lat_idx] is not None and data[lon_idx] is not None
+    ]
+
+
+def get_map_context_data(run, rows=None, start_idx=None, with_stats=False, simplify=False):
+    """Get map data.
+
+    Parameters:
+        run: Run
+        rows: iterable of (date_added, data) tuples or None
+            Measurements to process; all measurements of the run if None
+        start_idx: int or None
+            Display index of the first measurement in `rows`
+        with_stats: bool
+            Add statistics of the track of `rows` (see `tracks.Track.get_stats`); None if numpy isn't installed
+        simplify: bool
+            Simplify the track to be shown as a whole (see `polylines`)
+    """
+    if rows is None:
+        rows = iter_measurements(run)
+        start_idx = 1
+
+    if with_stats:
+        rows = list(rows)
+
+    points = get_map_points(run, rows, start_idx)
+    tolerance = polylines.get_tolerance([p[2] for p in points], [p[3] for p in points]) if simplify else None
+
+    ctx = {
+        'paths': polylines.get_paths(points, tolerance),
+        'timezone': settings.LOCAL_TIMEZONE.zone,
     }
+    if with_stats:
+        ctx['track_stats'] = tracks.get_track_stats(run.device, *export.to_arrays(rows, len(run.device.columns))) if np is not None else None
+
+    return ctx
 
 
 class PlotContextData:
@@ -131,31 +212,34 @@ class PlotContextData:
     ]
     MAX_NUM_XTICKS = 7
 
-    def __init__(self, run, *args, **kwargs):
+    def __init__(self, run, *args, downsampling=None, num_points=None, **kwargs):
+        """
+        Parameters:
+            run: Run
+            downsampling: str or None
+                Downsampling method (one of `downsampling.METHODS`); no downsampling if None
+            num_points: int or None
+                Target number of points per column if downsampling
+        """
         self.run = run
+        self.downsampling = downsampling
+        self.num_points = num_points
         super().__init__(*args, **kwargs)
 
-    def get_plot_context_data(self, measurements=None, start_idx=None):
+    def get_plot_context_data(self, rows=None, start_idx=None, cursor=None):
+        """Get plot data.
+
+        Parameters:
+            rows: iterable of (date_added, data) tuples or None
+                Measurements to process; all measurements of the run (up to `cursor` if given) if None
+            start_idx: int or None
+                Display index of the first measurement in `rows`
+            cursor: (date_added, id) tuple or None
+                Last measurement to process
+        """
         run = self.run
         device = run.device
         columns = device.columns
-        if measurements is None:
-            measurements = (
-                run
-                .measurement_set
-                .order_by('date_added')
-            )
-            start_idx = 1
-
-        # Process measurements
-        time_dt, data = [], [[] for _ in range(len(columns))]
-        for measurement in measurements:
-            time_dt.append(measurement.date_added.astimezone(settings.LOCAL_TIMEZONE))
-            for idx, value in enumerate(measurement.data):
-                data[idx].append(value)
-
-        # Convert to unix timestamp
-        time_e = [t.timestamp() for t in time_dt]
 
         # Calculate x-axis limits
         xlim_dt = self._calculate_xaxis_limits()
@@ -164,23 +248,177 @@ class PlotContextData:
         xticks_e, xticks_dt = self._calculate_xticks(*xlim_dt)
         xticklabels = self._calculate_xticklabels(xticks_dt)
 
-        titles = [
-            f'''#{start_idx+idx}: {t.strftime('%Y-%m-%d %H:%M:%S')}'''
-            for idx, t in enumerate(time_dt)
-        ]
+        # Process measurements
+        if rows is not None:
+            data_ctx = self._get_data_context_data(rows, start_idx, xlim_e)
+        elif (resolution := self._get_rollup_resolution(xlim_e)) is not None:
+            date_to = min(xlim_dt[1], cursor[0]) if cursor is not None else xlim_dt[1]
+            data_ctx = self._get_rollup_data_context_data(resolution, run.date_from, date_to, xlim_e)
+        else:
+            data_ctx = self._get_data_context_data(iter_measurements(run, cursor=cursor), 1, xlim_e)
 
         # Return data
         return {
             'labels': columns,
-            'time': time_e,
-            'titles': titles,
-            'data': data,
+            **data_ctx,
+            'timezone': settings.LOCAL_TIMEZONE.zone,
             'xlimits': xlim_e,
             'xticks': xticks_e,
             'xticklabels': xticklabels,
             'new_xticks_url': reverse('runs:get-new-xticks', kwargs={'r_id': run.pk}),
         }
 
+    def get_zoom_context_data(self, xlim_e):
+        """Get x-axis ticks and data to be plotted after zooming to the given limits.
+
+        Besides the measurements within the limits, the closest measurement on each side is returned too, so that the
+        plotted lines reach the plot edges.
+        """
+        run = self.run
+
+        ctx = self.get_xticks_context_data(xlim_e)
+        xlim_dt = tuple(datetime.fromtimestamp(e, settings.LOCAL_TIMEZONE) for e in ctx['xlimits'])
+
+        resolution = self._get_rollup_resolution(ctx['xlimits'])
+        if resolution is not None:
+            run_xlim_dt = self._calculate_xaxis_limits()
+            date_from, date_to = max(xlim_dt[0], run_xlim_dt[0]), min(xlim_dt[1], run_xlim_dt[1])
+            data_ctx = self._get_rollup_data_context_data(resolution, date_from, date_to, ctx['xlimits'])
+
+            return {
+                **ctx,
+                **data_ctx,
+            }
+
+        num_before = count_measurements(run, xlim_dt[0])
+        before = list(itertools.islice(iter_measurements(run, date_to=xlim_dt[0], reverse=True), 1))
+        after = list(itertools.islice(iter_measurements(run, date_from=xlim_dt[1]), 1))
+        rows = itertools.chain(
+            before,
+            iter_measurements(run, date_from=xlim_dt[0], date_to=xlim_dt[1]),
+            after,
+        )
+
+        start_idx = num_before if before else num_before + 1
+        data_ctx = self._get_data_context_data(rows, start_idx, ctx['xlimits'])
+
+        return {
+            **ctx,
+            **data_ctx,
+        }
+
+    def _get_rollup_resolution(self, xlim_e):
+        """Get the coarsest rollup resolution that still gives enough points for the given x-axis limits.
+
+        Returns: int or None
+            None if rollups shouldn't be used
+        """
+        if not settings.ROLLUPS_ENABLED or self.downsampling is None:
+            return None
+
+        for resolution in sorted(Rollup.RESOLUTIONS, reverse=True):
+            if (xlim_e[1] - xlim_e[0]) / resolution >= self.num_points:
+                return resolution
+
+        return None
+
+    def _get_rollup_data_context_data(self, resolution, date_from, date_to, xlim_e):
+        """Get data from rollups of buckets lying entirely within [date_from, date_to).
+
+        Buckets are narrower than a pixel; with 'minmax' downsampling minimum and maximum of each bucket are plotted,
+        otherwise the mean.
+        """
+        columns = self.run.device.columns
+
+        time_e, data, points = [], [[] for _ in range(len(columns))], []
+        for rollup in get_rollups(self.run.device, resolution, date_from, date_to):
+            if self.downsampling == 'minmax':
+                bucket_points = ((0, rollup.data_min, 'min'), (resolution / 2, rollup.data_max, 'max'))
+            else:
+                bucket_points = ((resolution / 2, rollup.data_mean, 'mean'),)
+
+            for offset, values, name in bucket_points:
+                time_e.append(rollup.date_from.timestamp() + offset)
+                for idx, value in enumerate(values):
+                    data[idx].append(value)
+                points.append((rollup, name))
+
+        # Downsample
+        indices = downsampling.downsample(self.downsampling, time_e, data, xlim_e, self.num_points)
+        time_e = [time_e[idx] for idx in indices]
+        data = [[column[idx] for idx in indices] for column in data]
+
+        titles = []
+        for idx in indices:
+            rollup, name = points[idx]
+            bucket_from_dt = rollup.date_from.astimezone(settings.LOCAL_TIMEZONE)
+            bucket_to_dt = bucket_from_dt + timedelta(seconds=resolution)
+            titles.append(f'{bucket_from_dt:%Y-%m-%d %H:%M} \u2014 {bucket_to_dt:%Y-%m-%d %H:%M}: {name} of {rollup.count} measurements')
+
+        return {
+            'time': time_e,
+            'titles': titles,
+            'data': data,
+        }
+
+    def _get_data_context_data(self, rows, start_idx, xlim_e):
+        """Get data of measurements.
+
+        Titles of points are display indices of the measurements; the client formats them together with the times.
+        """
+        if np is not None:
+            return self._get_data_context_data_arrays(rows, start_idx, xlim_e)
+        return self._get_data_context_data_lists(rows, start_idx, xlim_e)
+
+    def _get_data_context_data_lists(self, rows, start_idx, xlim_e):
+        columns = self.run.device.columns
+
+        time_e, data = [], [[] for _ in range(len(columns))]
+        for date_added, values in rows:
+            time_e.append(date_added.timestamp())
+            for idx, value in enumerate(values):
+                # As in `export.to_arrays`, non-numeric values are missing
+                data[idx].append(to_number(value))
+
+        # Downsample
+        if self.downsampling is None:
+            indices = range(len(time_e))
+        else:
+            indices = downsampling.downsample(self.downsampling, time_e, data, xlim_e, self.num_points)
+            time_e = [time_e[idx] for idx in indices]
+            data = [[column[idx] for idx in indices] for column in data]
+
+        return {
+            'time': time_e,
+            'titles': [start_idx + idx for idx in indices],
+            'data': data,
+        }
+
+    def _get_data_context_data_arrays(self, rows, start_idx, xlim_e):
+        time_us, data = export.to_arrays(rows, len(self.run.device.columns))
+        return self._get_arrays_context_data(time_us, data, start_idx, xlim_e)
+
+    def _get_arrays_context_data(self, time_us, data, start_idx, xlim_e):
+        """
+        Parameters:
+            time_us, data: ndarray
+                See `export.to_arrays`
+        """
+        time_e, data = time_us / 1e6, data.T
+
+        # Downsample
+        if self.downsampling is None:
+            indices = np.arange(len(time_e))
+        else:
+            indices = downsampling.downsample_arrays(self.downsampling, time_e, data, xlim_e, self.num_points)
+            time_e, data = time_e[indices], data[:, indices]
+
+        return {
+            'time': time_e.tolist(),
+            'titles': (indices + start_idx).tolist(),
+            'data': [np.where(np.isnan(column), None, column).tolist() for column in data],
+        }
+
     def get_plot_xaxis_context_data(self):
         run = self.run
 
@@ -272,15 +510,52 @@ class PlotContextData:
         return following_minute
 
 
-def get_newest_data_context_data(run, last_record_dt):
-    last_record_e = last_record_dt.timestamp() if last_record_dt else None
+def get_downsampling_parameters(request):
+    """Get PlotContextData downsampling parameters from request's `downsample` and `width` (plot width in pixels)
+    parameters."""
+    method = request.GET.get('downsample')
+    if method not in downsampling.METHODS:
+        return {}
+
+    try:
+        width = min(max(int(request.GET['width']), 100), 10_000)
+    except (KeyError, ValueError):
+        width = 1000
+
+    return {
+        'downsampling': method,
+        'num_points': width * settings.PLOT_POINTS_PER_PIXEL,
+    }
+
 
+def get_newest_data_context_data(run, measurements_page, csrf_token):
     return {
         'needs_updating': run.needs_updating,
         'url': reverse('runs:get-newest-data', kwargs={'r_id': run.pk}),
         'has_plot': run.device.has_plot,
         'has_map': run.device.has_map,
-        'last_record_time': last_record_e,
+        'cursor': measurements_page.previous_cursor,
+        # Changes when measurements older than the cursor are added, see RunNewestDataView
+        'version': run.version,
+        'paginate_by': settings.MEASUREMENTS_PAGINATE_BY,
+        'next_page_url': reverse('runs:pagination-measurements', kwargs={'r_id': run.pk, 'page': 2}),
+        'wait_url': reverse('runs:wait-for-new-data', kwargs={'r_id': run.pk}) if notifications.broker is not None else None,
+        'csrf_token': csrf_token,
+    }
+
+
+def get_data_context_data(run, measurements_page, downsample):
+    """Get settings for loading plot/map data; only measurements up to the first row of the measurements table are
+    loaded, the newer ones are loaded by get-newest-data requests. If the table is empty, e.g. all measurements are
+    packed into segments, measurements up to the run's last measurement are loaded."""
+    cursor = measurements_page.previous_cursor
+    if cursor is None and run.last_measurement_date is not None:
+        cursor = encode_cursor(run.last_measurement_date, 0)
+
+    return {
+        'url': reverse('runs:get-data', kwargs={'r_id': run.pk}),
+        'cursor': cursor,
+        'downsample': downsample,
     }
 
 
@@ -290,37 +565,106 @@ class RunView(DetailView):
     def get_object(self, queryset=None):
         return get_object_or_404(Run.objects, device__user=self.request.user, pk=self.kwargs['r_id'])
 
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
+
+        # Repeat views of finalised runs get 304 responses, see runs.cache
+        get_response = lambda: self.render_to_response(self.get_context_data(object=self.object))
+        return cache.conditional_response(request, self.object, get_response, request.META.get('QUERY_STRING', ''))
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        measurements = list(
-            self.object
-            .measurement_set
-            .order_by('date_added')
-        )
-        measurements_rev = list(reversed(measurements))
-
-        context['can_be_trimmed'] = self.object.can_be_trimmed(measurements)
-        context['num_measurements'] = len(measurements)
+        # Plot and map data are loaded by a separate request, see RunDataView
+        m_context = get_measurements_context_data(self.object, 1)
 
-        m_context = get_measurements_context_data(self.object, 1, measurements_rev)
+        context['can_be_trimmed'] = self.object.can_be_trimmed()
+        context['num_measurements'] = self.object.num_measurements
+        context['download_formats'] = ['csv'] + export.get_available_formats()
 
         context.update(**m_context)
 
-        if self.object.device.has_plot:
-            plot_data = PlotContextData(self.object).get_plot_context_data(measurements, 1)
-            context['plot_data'] = plot_data
-
         if self.object.device.has_map:
-            map_context = get_map_context_data(self.object, measurements, 1)
-            context.update(**map_context)
+            context['MAPS_API_KEY'] = settings.MAPS_API_KEY
 
-        last_record_dt = m_context['measurements_page'][0].date_added if m_context['measurements_page'] else EARLIEST_DATE
-        context['get_newest_data'] = get_newest_data_context_data(self.object, last_record_dt)
+        context['get_newest_data'] = get_newest_data_context_data(self.object, m_context['measurements_page'], get_token(self.request))
+        downsample = self.request.GET.get('downsample', settings.PLOT_DOWNSAMPLING)
+        context['get_data'] = get_data_context_data(self.object, m_context['measurements_page'], downsample)
 
         return context
 
 
+class RunDataView(View):
+
+    def get_object(self):
+        return get_object_or_404(Run.objects, device__user=self.request.user, pk=self.kwargs['r_id'])
+
+    def get(self, request, *args, **kwargs):
+        run = self.get_object()
+        query = request.META.get('QUERY_STRING', '')
+
+        # Data of finalised runs are cached, see runs.cache
+        get_data = lambda: self.get_data(run)
+        get_response = lambda: JsonResponse(cache.get_cached(run, 'data', get_data, query))
+        return cache.conditional_response(request, run, get_response, query)
+
+    def get_data(self, run):
+        # Complement of the measurements returned by RunNewestDataView; no upper bound if no cursor is given
+        cursor = self.request.GET.get('cursor')
+        cursor = decode_cursor(cursor) if cursor else None
+
+        data = {}
+        if run.device.has_plot:
+            data['plot_ctx'] = PlotContextData(run, **get_downsampling_parameters(self.request)).get_plot_context_data(cursor=cursor)
+
+        if run.device.has_map:
+            rows = iter_measurements(run, cursor=cursor)
+            data['map_ctx'] = {
+                **get_map_context_data(run, rows, 1, with_stats=True, simplify=True),
+                'map_data_url': reverse('runs:get-map-data', kwargs={'r_id': run.pk}),
+            }
+
+        return data
+
+
+class RunMapDataView(View):
+    """Track of the run in the visible part of the map, simplified for the map's zoom level."""
+
+    def get_object(self):
+        return get_object_or_404(Run.objects, device__user=self.request.user, pk=self.kwargs['r_id'])
+
+    def get(self, request, *args, **kwargs):
+        run = self.get_object()
+        if not run.device.has_map:
+            raise SuspiciousOperation('Device has no map')
+
+        try:
+            bbox = polylines.parse_bbox(request.GET['bbox'])
+            zoom = int(request.GET['zoom'])
+        except (KeyError, ValueError):
+            raise SuspiciousOperation('Invalid bbox or zoom')
+        if not 0 <= zoom <= polylines.MAX_ZOOM:
+            raise SuspiciousOperation('Invalid bbox or zoom')
+
+        get_response = lambda: JsonResponse({'paths': self.get_paths(run, bbox, zoom)})
+        return cache.conditional_response(request, run, get_response, request.META.get('QUERY_STRING', ''))
+
+    @staticmethod
+    def get_paths(run, bbox, zoom):
+        # Only measurements between the first and the last one in the bounding box are processed; the bounding box is
+        # found using the index of measurement positions
+        span = get_date_span_in_bbox(run, bbox)
+        if span is None:
+            return []
+        date_from, date_to = span[0], span[1] + timedelta(microseconds=1)
+
+        rows = iter_measurements(run, date_from=date_from, date_to=date_to)
+        points = get_map_points(run, rows, count_measurements(run, date_from) + 1)
+        tolerance = polylines.get_tolerance([bbox[0], bbox[2]], [bbox[1], bbox[3]], zoom)
+
+        return polylines.get_paths(points, tolerance, bbox)
+
+
 class RunFinaliseView(View):
 
     def get_object(self):
@@ -342,6 +686,7 @@ class RunFinaliseView(View):
         run.refresh_from_db()
         run.date_to = run.date_to.replace(second=0, microsecond=0) + timedelta(minutes=1)
         run.save()
+        cache.invalidate_runs([run.pk])
 
         messages.success(self.request, f'Run {run.name} finalised')
 
@@ -359,16 +704,10 @@ class RunTrimView(View):
     def post(self, *args, **kwargs):
         run = self.object = self.get_object()
 
-        qs = (
-            run
-            .measurement_set
-            .order_by('date_added')
-        )
-        if not qs:
+        if not run.num_measurements:
             raise SuspiciousOperation('No measurements anymore')
 
-        first, last = qs[0], qs.reverse()[0]
-        first_dt, last_dt = first.date_added, last.date_added
+        first_dt, last_dt = run.first_measurement_date, run.last_measurement_date
         first_minute_dt = first_dt.replace(second=0, microsecond=0)
         last_minute_dt = last_dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
 
@@ -376,6 +715,7 @@ class RunTrimView(View):
         run.date_from = first_minute_dt
         run.date_to = last_minute_dt
         run.save()
+        cache.invalidate_runs([run.pk])
 
         first_minute_s = first_minute_dt.astimezone(settings.LOCAL_TIMEZONE).strftime('%Y-%m-%d %H:%M')
         last_minute_s = last_minute_dt.astimezone(settings.LOCAL_TIMEZONE).strftime('%Y-%m-%d %H:%M')
@@ -390,30 +730,55 @@ class RunDownloadDataView(View):
     def get_object(self):
         return get_object_or_404(Run.objects, device__user=self.request.user, pk=self.kwargs['r_id'])
 
-    def get(self, *args, **kwargs):
-        run = self.get_object()
-        device = run.device
-        qs = (
-            run
-            .measurement_set
-            .order_by('date_added')
-        )
-        clean_device_name = re.sub('[^\w]', '_', run.device.name)
-        clean_run_name = re.sub('[^\w]', '_', run.name)
+    @staticmethod
+    def iter_csv(run):
+        """Iterate over the CSV file contents in chunks of MEASUREMENTS_CHUNK_SIZE rows.
 
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="data-{clean_device_name}-{clean_run_name}.csv"'
+        Returns: iterator of str
+        """
+        rows = iter_measurements(run)
+        format_date = LocalTimeFormatter()
 
-        writer = csv.writer(response)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
 
         # Write header
-        writer.writerow(['Date added'] + device.columns)
+        writer.writerow(['Date added'] + run.device.columns)
 
         # Write data
-        for m in qs:
-            writer.writerow([m.date_added.astimezone(settings.LOCAL_TIMEZONE).strftime('%Y-%m-%d %H:%M:%S')] + m.data)
+        while True:
+            chunk = list(itertools.islice(rows, settings.MEASUREMENTS_CHUNK_SIZE))
+            writer.writerows([format_date(date_added)] + data for date_added, data in chunk)
+
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+            if len(chunk) < settings.MEASUREMENTS_CHUNK_SIZE:
+                break
 
-        return response
+    def get(self, *args, **kwargs):
+        run = self.get_object()
+        clean_device_name = re.sub('[^\w]', '_', run.device.name)
+        clean_run_name = re.sub('[^\w]', '_', run.name)
+        filename = f'data-{clean_device_name}-{clean_run_name}'
+
+        format_ = self.request.GET.get('format', 'csv')
+        if format_ == 'csv':
+            response = StreamingHttpResponse(self.iter_csv(run), content_type='text/csv')
+            response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+            return response
+
+        if format_ not in export.get_available_formats():
+            raise SuspiciousOperation(f'Unsupported format: {format_}')
+
+        extension, content_type = export.FORMATS[format_]
+        return FileResponse(
+            export.export_run(run, format_),
+            as_attachment=True,
+            filename=f'{filename}.{extension}',
+            content_type=content_type,
+        )
 
 
 class RunDeleteRunDetachDataView(View):
@@ -431,10 +796,12 @@ class RunDeleteRunDetachDataView(View):
             # Detach measurements
             num_detached = (
                 run
-                .measurement_set
-                .all()
+                .get_measurement_set()
                 .update(run=None)
             )
+            num_detached += count_packed_measurements(run)
+            run.segment_set.all().update(run=None)
+            change_counters(run.device, num_unassigned_measurements=num_detached)
 
             # Delete run
             run.delete()
@@ -459,10 +826,16 @@ class RunDeleteRunAndDataView(View):
             # Delete measurements
             num_deleted, _ = (
                 run
-                .measurement_set
-                .all()
+                .get_measurement_set()
                 .delete()
             )
+            num_deleted += count_packed_measurements(run)
+            run.segment_set.all().delete()
+
+            change_counters(run.device, num_measurements=-num_deleted)
+            refresh_measurement_dates(run.device)
+
+            measurements_deleted.send(sender=Measurement, device=run.device, date_from=run.date_from, date_to=run.date_to or datetime.now(settings.LOCAL_TIMEZONE))
 
             # Delete run
             run.delete()
@@ -480,22 +853,28 @@ class RunNewestDataView(View):
     def get(self, request, *args, **kwargs):
         run = self.get_object()
 
-        try:
-            last_record_e = int(float(request.GET['last_record_time'])) + 1
-        except KeyError:
-            return JsonResponse({'status': 'error'}, status=500)
-
-        last_record = datetime.fromtimestamp(last_record_e, settings.LOCAL_TIMEZONE)
+        # Measurements with device-supplied times may be added before the cursor, which changes the run's version (see
+        # `measurements.functions.add_to_counters`); the page can't insert them, so it has to be reloaded
+        version = request.GET.get('version')
+        if version is not None and version != str(run.version):
+            return JsonResponse({'any_new': True, 'reload': True})
 
-        # Get all new measurements
-        new_measurements = list(
+        # Get all measurements newer than the cursor
+        qs = (
             run
-            .measurement_set
-            .filter(date_added__gte=last_record)
-            .order_by('date_added')
+            .get_measurement_set()
+            .order_by('date_added', 'id')
         )
+        cursor = request.GET.get('cursor')
+        if cursor:
+            # Row at the cursor is fetched as well, as the neighbour of the oldest new measurement
+            date_added, pk = decode_cursor(cursor)
+            qs = qs.filter(Q(date_added__gt=date_added) | Q(date_added=date_added, id__gte=pk))
+        rows = list(iter_data(qs, fields=('id',)))
+
+        previous_row = rows.pop(0) if cursor and rows and rows[0][0] == pk else None
 
-        any_new = bool(len(new_measurements))
+        any_new = bool(len(rows))
         if not any_new:
             data = {
                 'any_new': any_new,
@@ -506,32 +885,68 @@ class RunNewestDataView(View):
             return JsonResponse(data)
 
         # Process new measurements
-        last_record_e = new_measurements[-1].date_added.timestamp()
-
-        m_context = get_measurements_context_data(run, 1)
-        m_context['run'] = run
-        response = render(request, 'runs/run_measurements.html', m_context)
-
-        num_measurements = run.measurement_set.count()
+        num_measurements = run.num_measurements
+        new_measurements = [(date_added, data) for _, date_added, data in rows]
 
         data = {
             'any_new': any_new,
             'num_measurements': num_measurements,
-            'last_record_time': last_record_e,
-            'measurements_table_html': response.content.decode(),
+            'cursor': encode_cursor(rows[-1][1], rows[-1][0]),
+            'table_ctx': get_new_measurements_context_data(run, rows, previous_row),
         }
 
         if run.device.has_map:
-            ctx = get_map_context_data(run, queryset=new_measurements, start_idx=num_measurements-len(new_measurements)+1)
+            ctx = get_map_context_data(run, rows=new_measurements, start_idx=num_measurements-len(new_measurements)+1)
             data['map_ctx'] = ctx
 
         if run.device.has_plot:
-            ctx = PlotContextData(run).get_plot_context_data(measurements=new_measurements, start_idx=num_measurements-len(new_measurements)+1)
+            ctx = PlotContextData(run).get_plot_context_data(rows=new_measurements, start_idx=num_measurements-len(new_measurements)+1)
             data['plot_ctx'] = ctx
 
         return JsonResponse(data)
 
 
+async def wait_for_new_data_view(request, r_id):
+    """Wait until measurements newer than the given cursor are added to the run (long poll).
+
+    Async, so that waiting doesn't block a worker thread when running under ASGI; a function as class-based views
+    can't be async in this django version.
+    """
+    def get_object():
+        if not request.user.is_authenticated:
+            raise PermissionDenied('Login required')
+        return get_object_or_404(Run.objects.select_related('device'), device__user=request.user, pk=r_id)
+
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+
+    run = await sync_to_async(get_object)()
+    if notifications.broker is None:
+        raise SuspiciousOperation('Run notifications are disabled')
+
+    cursor = request.GET.get('cursor')
+    cursor_dt = decode_cursor(cursor)[0] if cursor else None
+    version = request.GET.get('version')
+
+    async def check():
+        # Measurements added before the waiter was registered, including ones older than the cursor (see
+        # RunNewestDataView)
+        await sync_to_async(run.refresh_from_db)(fields=['last_measurement_date', 'version'])
+        if version is not None and version != str(run.version):
+            return True
+        return run.last_measurement_date is not None and (cursor_dt is None or run.last_measurement_date > cursor_dt)
+
+    any_new = await notifications.broker.wait(run.pk, settings.RUN_NOTIFICATIONS['TIMEOUT'], check)
+
+    data = {
+        'any_new': any_new,
+    }
+    if not any_new and run.device.has_plot:
+        data['plot_ctx'] = PlotContextData(run).get_plot_xaxis_context_data()
+
+    return JsonResponse(data)
+
+
 class RunNewXticksView(View):
 
     def get_object(self):
@@ -546,9 +961,14 @@ class RunNewXticksView(View):
             return JsonResponse({'status': 'error'}, status=500)
 
         if len(xlimits) != 2:
-            JsonResponse({'status': 'error'}, status=500)
+            return JsonResponse({'status': 'error'}, status=500)
 
-        data = PlotContextData(run).get_xticks_context_data(xlimits)
+        # When downsampling, data are re-fetched at higher resolution for the new limits
+        downsampling_parameters = get_downsampling_parameters(request)
+        if downsampling_parameters:
+            data = PlotContextData(run, **downsampling_parameters).get_zoom_context_data(xlimits)
+        else:
+            data = PlotContextData(run).get_xticks_context_data(xlimits)
 
         return JsonResponse(data)
 
@@ -567,7 +987,7 @@ class PaginationMeasurementsView(TemplateView):
         context = super().get_context_data(**kwargs)
         context['run'] = run
 
-        m_context = get_measurements_context_data(run, page)
+        m_context = get_measurements_context_data(run, page, **get_pagination_parameters(self.request))
         context.update(m_context)
 
         return context
@@ -619,10 +1039,26 @@ class RunAddView(ABC, CreateView):
 
         # Move selected measurements to the newly created run
         run = self.object
+        if device.use_segments:
+            # Segments extending beyond the run are restored, to be packed again per run
+            segments_qs = device.segment_set.filter(run__isnull=True, last_date__gte=date_from)
+            extending = Q(first_date__lt=date_from)
+            if date_to:
+                segments_qs = segments_qs.filter(first_date__lt=date_to)
+                extending |= Q(last_date__gte=date_to)
+            unpack_segments(segments_qs.filter(extending))
+            num_assigned_packed = segments_qs.aggregate(num=Sum('count'))['num'] or 0
+            segments_qs.update(run=run)
+        else:
+            num_assigned_packed = 0
+
         qs = device.measurement_set.filter(date_added__gte=date_from)
         if date_to:
             qs = qs.filter(date_added__lt=date_to)
-        num_assigned = qs.update(run=run)
+        num_assigned = qs.update(run=run) + num_assigned_packed
+        change_counters(run, num_measurements=num_assigned)
+        refresh_measurement_dates(run)
+        change_counters(device, num_unassigned_measurements=-num_assigned)
 
         msg = f'Run "{name}" added. {num_assigned} measurements assigned.<br/>'
         messages.success(self.request, mark_safe(msg))
@@ -47,6 +47,7 @@ INSTALLED_APPS = [
     'devices',
     'runs',
     'measurements',
+    'rollups',
 ]
 
 MIDDLEWARE = [
@@ -153,3 +154,124 @@ LOCAL_TIMEZONE = pytz.timezone('Europe/Warsaw')
 # Pagination
 MEASUREMENTS_PAGINATE_BY = 20
 
+# Number of measurements fetched from the database at once when iterating over large querysets
+MEASUREMENTS_CHUNK_SIZE = 2000
+
+# Storage of new measurements' values: 'json' or 'packed' (float64 array, see measurements.storage); already saved
+# measurements can be converted by `manage.py pack_measurements`
+MEASUREMENTS_STORAGE = 'json'
+
+
+# Partitioning
+# Partition the measurements table by month (PostgreSQL only), see measurements.partitioning; the table is converted by
+# migration measurements.0010 or `manage.py partition_measurements`, which also creates partitions of the following
+# months and should be run periodically, e.g. monthly
+MEASUREMENTS_PARTITIONING = {
+    'ENABLED': False,
+    # Number of partitions kept ready for the months following the current one
+    'MONTHS_AHEAD': 3,
+    # Detach partitions older than the given number of months, leaving them as standalone tables to be archived; None
+    # to keep all
+    'DETACH_AFTER_MONTHS': None,
+}
+
+
+# Segments
+# Length of the time windows whose measurements are packed into a single row for devices with `use_segments`, see
+# measurements.segments; closed windows are packed by `manage.py pack_segments`, which should be run periodically
+MEASUREMENT_SEGMENT_WINDOW = 3600  # s
+
+
+# Plot
+# Default method of downsampling plot data: 'minmax' (minimum and maximum of each column in each bucket),
+# 'lttb' (Largest-Triangle-Three-Buckets) or 'none'; can be changed by run page's `downsample` parameter
+PLOT_DOWNSAMPLING = 'minmax'
+# Target number of points per column per pixel of the plot width
+PLOT_POINTS_PER_PIXEL = 1
+
+
+# Map
+# Simplification of tracks shown on maps, see runs.polylines
+MAP_SIMPLIFICATION = {
+    # Maximum distance between the shown track and measured positions
+    'TOLERANCE': 1,  # px
+    # Width of the map assumed when the whole track is shown
+    'WIDTH': 1000,  # px
+}
+# Maximum number of measurements returned by a bounding box query of a device with a map
+MAP_MAX_BBOX_MEASUREMENTS = 10_000
+
+
+# Rollups
+# Maintain rollups (per-device aggregates of measurements) and use them in plots of long time ranges; after enabling
+# it, rollups of already collected measurements have to be created by `manage.py build_rollups`
+ROLLUPS_ENABLED = False
+
+
+# Measurements API
+MEASUREMENTS_MAX_BATCH_SIZE = 1000
+
+# Times of measurements given by devices can be ahead of the server's clock by at most the given time
+MEASUREMENTS_MAX_CLOCK_SKEW = 60  # s
+
+# Batches of measurements saved together by async API views, see measurements.batcher; requires running under ASGI
+# (asgi.py), as under WSGI each request of an async view runs in its own event loop and saves its measurements directly
+MEASUREMENTS_ASYNC_BATCH = {
+    # Save a batch when it has the given number of measurements or its first ones have waited the given time
+    'MAX_SIZE': 1000,
+    'MAX_DELAY': 20,  # ms
+}
+
+# Write-behind buffer of the measurements API, see measurements.buffer; measurements are saved in batches by
+# a background thread of each process instead of one transaction per request
+MEASUREMENTS_BUFFER = {
+    'ENABLED': False,
+    # Save buffered measurements when there are the given number of them or the oldest one has waited the given time
+    'MAX_SIZE': 1000,
+    'MAX_DELAY': 200,  # ms
+    # Directory of journals of buffered measurements, replayed if a process exits before saving them; None to keep
+    # buffered measurements only in memory
+    'JOURNAL_DIR': None,
+    # fsync journals before responding, so that received measurements survive a crash of the machine
+    'FSYNC': True,
+    # Log flush statistics (including latency between receiving and saving measurements) every given number of
+    # flushes; None to disable
+    'STATS_LOG_INTERVAL': 100,
+}
+
+# Server receiving measurements in a compact protocol over UDP and TCP (`manage.py ingest_server`), see
+# measurements.ingest; measurements are saved in batches as in async API views
+INGEST_SERVER = {
+    'HOST': '0.0.0.0',
+    # 0 to disable
+    'UDP_PORT': 5700,
+    'TCP_PORT': 5700,
+}
+
+
+# Cache of devices authenticated by API keys
+DEVICE_AUTH_CACHE = {
+    'MAX_SIZE': 10_000,
+    'TTL': 60,  # s
+    # Alias of a django cache shared between processes, e.g. 'default'; None to use only process-local cache
+    'CACHE_ALIAS': None,
+    # Log hit/miss counters every given number of lookups; None to disable
+    'STATS_LOG_INTERVAL': 10_000,
+}
+
+
+# Notifications about new measurements used by live run pages
+RUN_NOTIFICATIONS = {
+    # 'local' (only within the process that received the measurements), 'postgres' (LISTEN/NOTIFY) or None to poll
+    'BROKER': None,
+    # Maximum time a run page waits for new measurements in a single request
+    'TIMEOUT': 50,  # s
+}
+
+
+# Cache of plot/map data of finalised runs, see runs.cache
+RUN_CACHE = {
+    # Alias of a django cache, e.g. 'default'; None to disable caching (responses still get ETags)
+    'CACHE_ALIAS': 'default',
+    'TTL': 7 * 24 * 3600,  # s
+}
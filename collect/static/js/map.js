@@ -1,35 +1,153 @@
-
 var map_div;
 var map;
-var points = [];
-var path;
+var map_settings;
+var overview;  /* Whole track, simplified by the server for the initial zoom */
+var overview_zoom;
+var detail = null;  /* Paths in the visible part of the map, or null if the overview is shown */
+var detail_request_id = 0;
+var lines = [];
 var markers = [];
-var show_checkbox;
+var start_marker;
+var end_marker;
 var info_window;
 
 
-function append_to_points(locations) {
-    for (var i = 0; i < locations.length; i++)
-        points.push({
-            lat: locations[i][1],
-            lng: locations[i][2],
-        });
+function decode_paths(paths) {
+    return paths.map(path => ({
+        points: google.maps.geometry.encoding.decodePath(path.polyline),
+        indices: path.indices,
+        times: path.times,
+    }));
+}
+
+
+function append_to_path(path, new_path) {
+    path.points.push(...new_path.points);
+    path.indices.push(...new_path.indices);
+    path.times.push(...new_path.times);
+}
+
+
+function create_marker(path, i) {
+    var marker = new google.maps.Marker({
+        position: path.points[i],
+        info_window_content: "#" + path.indices[i] + ": " + map_settings.time_format.format(new Date(path.times[i] * 1000)),
+        map: null,
+    });
+    marker.addListener("click", function() {
+        info_window.setContent(this.info_window_content);
+        info_window.open(map, this);
+    });
+    return marker;
+}
+
+
+function show_paths(paths) {
+    for (var line of lines)
+        line.setMap(null);
+    for (var marker of markers)
+        marker.setMap(null);
+
+    lines = paths.map(path => new google.maps.Polyline({
+        path: path.points,
+        strokeColor: "#000000",
+        strokeOpacity: 1.0,
+        strokeWeight: 1,
+        map: map,
+    }));
+
+    markers = [];
+    for (var path of paths)
+        for (var i = 0; i < path.points.length; i++)
+            markers.push(create_marker(path, i));
+    show_markers();
+}
+
+
+function show_markers() {
+    var show_checkbox = document.getElementById("map-checkbox");
+    var new_map = show_checkbox && show_checkbox.checked ? map : null;
+    for (var marker of markers)
+        marker.setMap(new_map);
+}
+
+
+function update_start_end_markers() {
+    var n = overview.points.length;
+    if (start_marker)
+        start_marker.setMap(null);
+    if (end_marker)
+        end_marker.setMap(null);
+
+    start_marker = n >= 1 ? create_marker(overview, 0) : null;
+    end_marker = n >= 2 ? create_marker(overview, n-1) : null;
+    if (start_marker) {
+        start_marker.setLabel("S");
+        start_marker.setMap(map);
+    }
+    if (end_marker) {
+        end_marker.setLabel("E");
+        end_marker.setMap(map);
+    }
+}
+
+
+function get_padded_bbox(bounds) {
+    /* Bounds extended by half of their size on each side, so that lines leaving the visible area are drawn too; as
+       south,west,north,east, where west > east if the box crosses the antimeridian */
+    var ne = bounds.getNorthEast();
+    var sw = bounds.getSouthWest();
+
+    var lat_pad = (ne.lat() - sw.lat()) / 2;
+    var south = Math.max(sw.lat() - lat_pad, -90);
+    var north = Math.min(ne.lat() + lat_pad, 90);
+
+    var lng_span = ne.lng() - sw.lng();
+    if (lng_span < 0)
+        lng_span += 360;
+    if (lng_span * 2 >= 360)
+        return [south, -180, north, 180];
+    var west = sw.lng() - lng_span / 2;
+    var east = ne.lng() + lng_span / 2;
+    if (west < -180)
+        west += 360;
+    if (east > 180)
+        east -= 360;
+
+    return [south, west, north, east];
 }
 
 
-function append_to_markers(locations, points, current_num_points) {
-    for (var i = 0; i < locations.length; i++) {
-        var marker = new google.maps.Marker({
-            position: points[current_num_points + i],
-            info_window_content: "#" + locations[i][0] + ": " + locations[i][3],
-            map: null,
-        })
-        marker.addListener("click", function() {
-            info_window.setContent(this.info_window_content);
-            info_window.open(map, this);
-        });
-        markers.push(marker);
+function load_detail() {
+    /* Tracks are simplified for the initial zoom; positions in the visible part of the map are fetched again when
+       zoomed in */
+    var request_id = ++detail_request_id;
+    var bounds = map.getBounds();
+    if (!bounds || map.getZoom() <= overview_zoom) {
+        if (detail !== null) {
+            detail = null;
+            show_paths([overview]);
+        }
+        return;
     }
+
+    $.ajax({
+        type: "GET",
+        url: map_settings.map_data_url,
+        data: {
+            bbox: get_padded_bbox(bounds).join(","),
+            zoom: map.getZoom(),
+        },
+        dataType: "json",
+
+        success: function(data) {
+            /* Ignore responses to outdated requests */
+            if (request_id != detail_request_id)
+                return;
+            detail = decode_paths(data.paths);
+            show_paths(detail);
+        },
+    });
 }
 
 
@@ -73,42 +191,72 @@ function calculate_map_zoom(bounds, map_height, map_width) {
 
 
 function init_map() {
-    /* Locations */
-    var locations = JSON.parse(document.getElementById("id-locations-l").textContent);
+    /* Locations are loaded separately from the page */
+    var settings = JSON.parse(document.getElementById("id-get-data").textContent);
+
+    $.ajax({
+        type: "GET",
+        url: settings.url,
+        data: {
+            cursor: settings.cursor,
+        },
+        dataType: "json",
+
+        success: function(data) {
+            create_map(data.map_ctx);
+            show_track_stats(data.map_ctx.track_stats);
+        },
+
+        error: function(data) {
+            alert("Request failed (error " + data.status + ": " + data.statusText + "); please reload page");
+        },
+    });
+}
+
+
+function show_track_stats(stats) {
+    /* Statistics aren't available without numpy on the server */
+    if (!stats)
+        return;
+
+    var format = (value, digits) => value.toLocaleString("en-US", {minimumFractionDigits: digits, maximumFractionDigits: digits});
+    $(".track-distance").text(format(stats.distance / 1000, 2) + " km");
+    $(".track-average-speed").text(stats.average_speed === null ? "-" : format(stats.average_speed * 3.6, 1) + " km/h");
+    $(".track-max-speed").text(stats.max_speed === null ? "-" : format(stats.max_speed * 3.6, 1) + " km/h");
+    $(".track-stats").removeClass("display-none");
+}
+
+
+function create_map(map_ctx) {
+    map_settings = {
+        map_data_url: map_ctx.map_data_url,
+        time_format: new Intl.DateTimeFormat("sv-SE", {
+            timeZone: map_ctx.timezone,
+            year: "numeric", month: "2-digit", day: "2-digit",
+            hour: "2-digit", minute: "2-digit", second: "2-digit",
+        }),
+    };
 
     /* Points */
-    append_to_points(locations);
+    overview = {points: [], indices: [], times: []};
+    for (var path of decode_paths(map_ctx.paths))
+        append_to_path(overview, path);
 
     /* Map */
     map_div = document.getElementById("map");
-    var map_bounds = points.length > 0 ? calculate_map_bounds(points) : null;
+    var map_bounds = overview.points.length > 0 ? calculate_map_bounds(overview.points) : null;
+    overview_zoom = map_bounds ? calculate_map_zoom(map_bounds, map_div.clientHeight, map_div.clientWidth) : 0;
     map = new google.maps.Map(map_div, {
         center: map_bounds ? map_bounds.getCenter() : new google.maps.LatLng(0, 0),
-        zoom: map_bounds ? calculate_map_zoom(map_bounds, map_div.clientHeight, map_div.clientWidth) : 0,
-    });
-
-    /* Path */
-    path = new google.maps.Polyline({
-        path: points,
-        strokeColor: "#000000",
-        strokeOpacity: 1.0,
-        strokeWeight: 1,
-        map: map,
+        zoom: overview_zoom,
     });
 
     /* Info window */
     info_window = new google.maps.InfoWindow();
 
-    /* Markers */
-    append_to_markers(locations, points, 0);
-    if (markers.length >= 1) {
-        markers[0].setLabel("S");
-        markers[0].setMap(map);
-    }
-    if (markers.length >= 2) {
-        markers[markers.length-1].setMap(map);
-        markers[markers.length-1].setLabel("E");
-    }
+    /* Path and markers */
+    show_paths([overview]);
+    update_start_end_markers();
 
     /* Show markers panel */
     var map_panel = document.createElement("div");
@@ -136,52 +284,31 @@ function init_map() {
         if (event.target != show_checkbox)
             show_checkbox.checked = !show_checkbox.checked;
 
-        var new_map = show_checkbox.checked ? map : null;
-        for (var i = 1; i < markers.length-1; i++)
-            markers[i].setMap(new_map);
+        show_markers();
         info_window.close();
     });
 
     map_panel.appendChild(map_panel_inner);
 
     map.controls[google.maps.ControlPosition.TOP_CENTER].push(map_panel);
-}
 
+    map.addListener("idle", load_detail);
+}
 
-function update_map(locations) {
-    var current_num_points = points.length;
 
-    append_to_points(locations);
+function update_map(map_ctx) {
+    /* New measurements aren't simplified */
+    for (var path of decode_paths(map_ctx.paths))
+        append_to_path(overview, path);
 
     /* Update center and zoom */
-    var map_bounds = calculate_map_bounds(points);
+    var map_bounds = calculate_map_bounds(overview.points);
+    overview_zoom = calculate_map_zoom(map_bounds, map_div.clientHeight, map_div.clientWidth);
     map.setCenter(map_bounds.getCenter());
-    map.setZoom(calculate_map_zoom(map_bounds, map_div.clientHeight, map_div.clientWidth));
-
-    /* Update path */
-    path.setPath(points);
+    map.setZoom(overview_zoom);
 
-    append_to_markers(locations, points, current_num_points);
-
-    /* Update markers */
-    /* Add start marker if we didn't have one */
-    if (current_num_points == 0 && markers.length >= 1) {
-        markers[0].setLabel("S");
-        markers[0].setMap(map);
-    }
-    /* Remove previous end marker */
-    if (current_num_points >= 2) {
-        markers[current_num_points-1].setLabel();
-    }
-    /* Add end marker */
-    if (markers.length >= 2) {
-        markers[markers.length-1].setLabel("E");
-        markers[markers.length-1].setMap(map);
-    }
-
-    var show_checkbox = document.getElementById("map-checkbox");
-    var new_map = show_checkbox.checked ? map : null;
-    for (var i = 1; i < markers.length-1; i++)
-        markers[i].setMap(new_map);
+    /* Update path and markers; detail, if shown, is reloaded when the map becomes idle */
+    if (detail === null)
+        show_paths([overview]);
+    update_start_end_markers();
 }
-
@@ -1,18 +1,64 @@
 
 var config;
 var plot;
+var plot_settings;
 
 
 const COLOURS = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b", "#e377c2", "#7f7f7f", "#bcbd22", "#17becf"];
 
 
 $(document).ready(function() {
-	var plot_obj = document.getElementById("id-plot-data");
-	if (plot_obj === null)
+	if (document.getElementById("measurements_plot") === null)
 		return;
 
-	var data = JSON.parse(plot_obj.textContent);
+	/* Plot data are loaded separately from the page */
+	plot_settings = JSON.parse(document.getElementById("id-get-data").textContent);
 
+	$.ajax({
+		type: "GET",
+		url: plot_settings.url,
+		data: {
+			cursor: plot_settings.cursor,
+			...get_downsampling_request_data(),
+		},
+		dataType: "json",
+
+		success: function(data) {
+			init_plot(data.plot_ctx);
+		},
+
+		error: function(data) {
+			alert("Request failed (error " + data.status + ": " + data.statusText + "); please reload page");
+		},
+	});
+});
+
+
+function get_downsampling_request_data() {
+	/* Data are downsampled to the plot width */
+	return {
+		downsample: plot_settings.downsample,
+		width: $("#measurements_plot").parent().width(),
+	};
+}
+
+
+function get_title(title, time, time_format) {
+	/* Titles of measurements are their display indices; titles of aggregated data are given as strings */
+	if (typeof title === "string")
+		return title;
+	return "#" + title + ": " + time_format.format(new Date(time * 1000));
+}
+
+
+function replace_plot_data(datasets_data, titles) {
+	for (var idx = 0; idx < config.data.datasets.length; idx++)
+		config.data.datasets[idx].data = datasets_data[idx];
+	config.data.titles = titles;
+}
+
+
+function init_plot(data) {
 	/* Prepare datasets */
 	var datasets = [];
 	for (var ds_idx = 0; ds_idx < data.labels.length; ds_idx++) {
@@ -41,6 +87,12 @@ $(document).ready(function() {
 			labels: data.time,
 			datasets: datasets,
 			titles: data.titles,
+			/* "sv-SE" formats dates as yyyy-mm-dd HH:MM:SS */
+			time_format: new Intl.DateTimeFormat("sv-SE", {
+				timeZone: data.timezone,
+				year: "numeric", month: "2-digit", day: "2-digit",
+				hour: "2-digit", minute: "2-digit", second: "2-digit",
+			}),
 			xlimits: data.xlimits,
 			xticks: data.xticks,
 			xticklabels: data.xticklabels,
@@ -71,7 +123,7 @@ $(document).ready(function() {
 					boxPadding: 5,
 					callbacks: {
 						title: function(context) {
-							return config.data.titles[context[0].dataIndex];
+							return get_title(config.data.titles[context[0].dataIndex], context[0].raw.x, config.data.time_format);
 						},
 					},
 				},
@@ -86,6 +138,8 @@ $(document).ready(function() {
 								xlimits: config.data.xlimits,
 								xticks: config.data.xticks,
 								xticklabels: config.data.xticklabels,
+								datasets_data: config.data.datasets.map(ds => ds.data),
+								titles: config.data.titles,
 							});
 						},
 						onZoomComplete: function({chart}) {
@@ -96,9 +150,10 @@ $(document).ready(function() {
 
 							var request_data = {
 								xlimits: new_xlimits,
+								...get_downsampling_request_data(),
 							};
 
-							/* Send AJAX request to get xticks and labels for the new xlimits */
+							/* Send AJAX request to get xticks and labels (and data if downsampled) for the new xlimits */
 							$.ajax({
 								type: "GET",
 								url: data.new_xticks_url,
@@ -112,6 +167,12 @@ $(document).ready(function() {
 									config.data.xticks = data.xticks;
 									config.data.xticklabels = data.xticklabels;
 
+									/* Data at higher resolution */
+									if (data.time !== undefined) {
+										var datasets_data = data.data.map(column => column.map((y, time_idx) => ({x: data.time[time_idx], y: y})));
+										replace_plot_data(datasets_data, data.titles);
+									}
+
 									chart.update();
 								},
 
@@ -168,6 +229,7 @@ $(document).ready(function() {
 		config.data.xlimits = zoom.xlimits;
 		config.data.xticks = zoom.xticks;
 		config.data.xticklabels = zoom.xticklabels;
+		replace_plot_data(zoom.datasets_data, zoom.titles);
 
 		plot.update();
 	});
@@ -186,23 +248,35 @@ $(document).ready(function() {
 		config.data.xlimits = zoom.xlimits;
 		config.data.xticks = zoom.xticks;
 		config.data.xticklabels = zoom.xticklabels;
+		replace_plot_data(zoom.datasets_data, zoom.titles);
 
 		plot.update();
 	});
-
-});
+}
 
 
 function update_plot(ctx) {
-	/* Update data */
-	for (t of ctx.titles)
-			config.data.titles.push(t);
+	/* Update data; data saved in zoom history might have been replaced by data downsampled for the zoomed limits,
+	   so they are updated as well */
+	var all_titles = [config.data.titles];
+	var all_datasets_data = [config.data.datasets.map(ds => ds.data)];
+	for (zoom of config.data.zoom_history) {
+		if (!all_titles.includes(zoom.titles))
+			all_titles.push(zoom.titles);
+		if (!all_datasets_data.some(datasets_data => datasets_data[0] === zoom.datasets_data[0]))
+			all_datasets_data.push(zoom.datasets_data);
+	}
+
+	for (titles of all_titles)
+		for (t of ctx.titles)
+			titles.push(t);
 
-	for (var idx = 0; idx < config.data.datasets.length; idx++) {
-			var dataset_data = config.data.datasets[idx].data;
+	for (datasets_data of all_datasets_data)
+		for (var idx = 0; idx < datasets_data.length; idx++) {
+			var dataset_data = datasets_data[idx];
 			for (var time_idx = 0; time_idx < ctx.time.length; time_idx++)
-					dataset_data.push({x: ctx.time[time_idx], y: ctx.data[idx][time_idx]});
-	}
+				dataset_data.push({x: ctx.time[time_idx], y: ctx.data[idx][time_idx]});
+		}
 
 	/* Update x axis */
 	config.data.xlimits = ctx.xlimits;
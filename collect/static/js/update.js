@@ -1,8 +1,29 @@
+var cursor;
 
-var last_record_time;
 
+function create_measurements_table_row(row, settings) {
+    var [row_cursor, idx, date, values, time_to_next, dist_to_next, delete_url] = row;
 
-function update_measurements_table(table_html) {
+    var tr = $("<tr>").attr("data-cursor", row_cursor);
+    tr.append($("<td>").addClass("horizontal-align-right").text(idx));
+    tr.append($("<td>").text(date));
+    for (value of values)
+        tr.append($("<td>").text(value));
+    tr.append($("<td>").addClass("td-time-to-next").text(time_to_next));
+    if (settings.has_map)
+        tr.append($("<td>").addClass("td-dist-to-next").text((dist_to_next ?? "-").toLocaleString("en-US")));
+
+    var a = $("<a>")
+        .addClass("measurement-delete-link")
+        .attr({"data-url": delete_url, "data-csrftoken": settings.csrf_token, href: "#"})
+        .text("Delete");
+    tr.append($("<td>").append(a));
+
+    return tr;
+}
+
+
+function update_measurements_table(table_ctx, settings) {
     var div = $(".div-measurements-table");
     var ul = div.find("ul.pagination-top");
     var li = ul.find("li.active").first();
@@ -11,13 +32,43 @@ function update_measurements_table(table_html) {
     if (selected_page != 1)
         return;
 
-    div.html(table_html);
+    var table = div.find("table.table-ajax");
+    var header = table.find("tr").first();
+
+    /* Previous first row is now followed by the new rows */
+    var previous_first = header.next("tr");
+    if (table_ctx.previous_time_to_next !== null) {
+        previous_first.find("td.td-time-to-next").text(table_ctx.previous_time_to_next);
+        if (settings.has_map)
+            previous_first.find("td.td-dist-to-next").text((table_ctx.previous_dist_to_next ?? "-").toLocaleString("en-US"));
+    }
+
+    /* Add new rows at the top */
+    header.after(table_ctx.rows.map(row => create_measurements_table_row(row, settings)));
+
+    /* Remove rows that are now on the next page */
+    var rows = table.find("tr").slice(1);
+    if (rows.length <= settings.paginate_by)
+        return;
+    rows.slice(settings.paginate_by).remove();
+
+    var next_url = settings.next_page_url + "?after=" + rows.eq(settings.paginate_by - 1).data("cursor");
+    var next_a = $("<a>").addClass("a-paginator").attr({href: "#", "data-url": next_url}).text("Next");
+    div.find("li.li-next").removeClass("disabled").empty().append(next_a);
 }
 
 
-function update_data(settings) {
+function update_data(settings, on_complete) {
+    /* Wait until plot/map data are loaded */
+    if ((settings.has_plot && plot === undefined) || (settings.has_map && map === undefined)) {
+        if (on_complete !== undefined)
+            setTimeout(on_complete, 1000);
+        return;
+    }
+
     var request_data = {
-        last_record_time: last_record_time,
+        cursor: cursor,
+        version: settings.version,
     };
 
     $.ajax({
@@ -27,6 +78,12 @@ function update_data(settings) {
         dataType: "json",
 
         success: function(data) {
+            /* Measurements were added before the ones shown */
+            if (data.reload) {
+                window.location.reload();
+                return;
+            }
+
             if (!data.any_new) {
                 /* Update only plot's x-axis limits */
                 if (settings.has_plot)
@@ -34,30 +91,67 @@ function update_data(settings) {
                 return;
             }
 
-            last_record_time = data.last_record_time;
+            cursor = data.cursor;
 
             /* Update number measurements */
-            $(".num-measurements").html(data.num_measurements);
+            $(".num-measurements").html(data.num_measurements.toLocaleString("en-US"));
 
             /* Update measurements table */
-            update_measurements_table(data.measurements_table_html);
+            update_measurements_table(data.table_ctx, settings);
 
             /* Update map */
             if (settings.has_map)
-                update_map(data.map_ctx.locations_l);
+                update_map(data.map_ctx);
 
             /* Update plot */
             if (settings.has_plot)
                 update_plot(data.plot_ctx);
         },
+
+        complete: on_complete,
+    });
+}
+
+
+function wait_for_new_data(settings) {
+    /* Long poll; returns as soon as new measurements are added, or after a timeout */
+    $.ajax({
+        type: "GET",
+        url: settings.wait_url,
+        data: {
+            cursor: cursor,
+            version: settings.version,
+        },
+        dataType: "json",
+
+        success: function(data) {
+            if (data.any_new) {
+                update_data(settings, function() { wait_for_new_data(settings); });
+                return;
+            }
+
+            /* Update only plot's x-axis limits */
+            if (settings.has_plot && plot !== undefined)
+                update_plot_xaxis(data.plot_ctx);
+            wait_for_new_data(settings);
+        },
+
+        error: function() {
+            setTimeout(wait_for_new_data, 60000, settings);
+        },
     });
 }
 
 
 $(document).ready(function() {
     var settings = JSON.parse(document.getElementById("id-get-newest-data").textContent);
-    last_record_time = settings.last_record_time;
+    cursor = settings.cursor;
+
+    if (!settings.needs_updating)
+        return;
 
-    if (settings.needs_updating)
+    if (settings.wait_url)
+        wait_for_new_data(settings);
+    else
         setInterval(update_data, 60000, settings);
 });